@@ -1,15 +1,27 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, session, g, Response, abort,
+                   send_file, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, func, inspect
+from sqlalchemy.orm import joinedload, make_transient_to_detached
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import json
 import os
+import logging
 import secrets
-from utils import ProofPrintSimulator, TEMPLATE_MAPPING
+import time
+from utils import (ProofPrintSimulator, TEMPLATE_MAPPING, template_version, template_registry, base_render_cache,
+                   PrintLogArchiver,
+                   provision_users,
+                   TTLCache, LRUCache, PrintLogExporter,
+                   create_student_source, StudentSearchIndex, metrics, logging_setup, RenderProfiler,
+                   create_output_store, LAYOUT_FORMAT, load_layout, RenderCoalescer, RenderResult, render_key)
+from utils.profiling import is_valid_profile_id
+from utils.log_export import EXPORT_FORMATS
 import base64
 from io import BytesIO
 from config import config
@@ -24,6 +36,15 @@ app = Flask(__name__)
 config_name = os.environ.get('FLASK_ENV', 'development')
 app.config.from_object(config.get(config_name, config['default']))
 
+# 日志 - 经队列异步写出，每条日志附带请求ID
+logging_setup.setup_logging(
+    level=app.config['LOG_LEVEL'],
+    fmt=app.config['LOG_FORMAT'],
+    sample_rate=app.config['LOG_SAMPLE_RATE'],
+    log_file=app.config['LOG_FILE'] or None
+)
+logger = logging.getLogger(__name__)
+
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -41,20 +62,135 @@ class User(UserMixin, db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     
     print_logs = db.relationship('PrintLog', backref='user', lazy=True)
+    creator = db.relationship('User', remote_side=[id], lazy=True)
 
 class PrintLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    student_code = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    student_code = db.Column(db.String(50), nullable=False, index=True)
     student_name = db.Column(db.String(100), nullable=False)
     biz_type = db.Column(db.Integer, nullable=False)
     biz_name = db.Column(db.String(50), nullable=False)
-    print_time = db.Column(db.DateTime, default=datetime.utcnow)
+    print_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     print_data = db.Column(db.Text, nullable=False)
 
+    @property
+    def reprint_of(self):
+        """补打记录引用的原始记录ID，普通打印记录返回None"""
+        return reprint_reference(self.print_data)
+
+def reprint_reference(print_data):
+    """补打记录的print_data只保存对原始记录的引用，如 {"reprint_of": 123}"""
+    if print_data and print_data.startswith('{"reprint_of"'):
+        try:
+            return json.loads(print_data).get('reprint_of')
+        except ValueError:
+            return None
+    return None
+
+# 打印日志归档器 - 超过保留期限的记录迁移到归档存储
+log_archiver = PrintLogArchiver(
+    db, PrintLog,
+    archive_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['PRINT_LOG_ARCHIVE_DIR']),
+    mode=app.config['PRINT_LOG_ARCHIVE_MODE']
+)
+
+# 学员数据源 - 由STUDENT_SOURCE配置选择，默认使用内置示例数据
+student_source = create_student_source(app.config)
+
+# 学员搜索索引 - 支持编码前缀、姓名和拼音首字母的模糊查询，后台定期从数据源重建
+student_index = StudentSearchIndex()
+student_index.start_auto_refresh(student_source, app.config['STUDENT_INDEX_REFRESH_INTERVAL'])
+
+# 渲染剖析器 - 管理员可对单次打印请求开启性能剖析
+render_profiler = RenderProfiler(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['PROFILE_DIR']),
+    keep=app.config['PROFILE_KEEP']
+)
+
+# 打印输出存储 - 默认不保存渲染结果，开启OUTPUT_ARCHIVE_ENABLED后由后台线程归档并限制容量
+output_store = create_output_store(dict(
+    app.config,
+    OUTPUT_DIR=os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['OUTPUT_DIR'])
+))
+
+# 渲染请求合并 - 同时请求同一张凭证时只渲染一次，同一节点上的多个进程通过锁文件合并
+render_coalescer = RenderCoalescer(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['RENDER_LOCK_DIR'])
+    if app.config['RENDER_LOCK_DIR'] else None,
+    wait_timeout=app.config['RENDER_COALESCE_TIMEOUT']
+)
+
+# 模板注册表 - 各学校的模板目录（同名模板覆盖默认模板）和已解析模板的缓存容量
+template_registry.configure(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), app.config['TEMPLATE_SCHOOLS_DIR'])
+    if app.config['TEMPLATE_SCHOOLS_DIR'] else None,
+    maxsize=app.config['TEMPLATE_CACHE_SIZE']
+)
+# 基础渲染缓存 - 不含打印时间的页面图像，同一张凭证再次打印时只重新绘制打印时间
+base_render_cache.max_bytes = app.config['RENDER_BASE_CACHE_MB'] * 1024 * 1024
+
+# 打印日志导出器 - 分段流式读取在线表，导出内存占用与记录条数无关
+log_exporter = PrintLogExporter(db, PrintLog, User, batch_size=app.config['PRINT_LOG_EXPORT_BATCH_SIZE'])
+
+# 模板布局缓存 - (学校ID, BizType, 模板版本) -> 布局JSON文本，模板更新后自动失效
+layout_cache = LRUCache(maxsize=64)
+
+# 登录用户缓存 - 缓存登录状态所需的字段值，避免每个请求都查询数据库
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+# 缓存的用户字段，不含密码哈希等敏感字段；未缓存的字段在访问时才从数据库加载
+USER_CACHE_FIELDS = ('id', 'username', 'role', 'is_enabled')
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    state = user_cache.get(user_id)
+    if state is None:
+        user = User.query.get(user_id)
+        if user is not None:
+            user_cache.set(user_id, {name: getattr(user, name) for name in USER_CACHE_FIELDS})
+        return user
+
+    # 由缓存的字段值重建实例，并以load=False合并到当前会话（不查询数据库），
+    # 之后对current_user的修改仍会正常提交
+    user = User(**state)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def invalidate_user_cache(user_id):
+    """
+    用户状态或密码变更后清除缓存，下次请求重新从数据库加载
+
+    只清除当前进程的缓存，多进程部署时其他进程最多在USER_CACHE_TTL秒后看到变更
+    """
+    user_cache.invalidate(user_id)
+
+# 请求指标
+HTTP_REQUESTS_TOTAL = metrics.REGISTRY.counter(
+    'http_requests_total', 'HTTP请求数', ('endpoint', 'method', 'status')
+)
+HTTP_REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    'http_request_duration_seconds', 'HTTP请求耗时（秒）', ('endpoint', 'method')
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # 沿用上游代理传入的请求ID，便于跨服务关联日志
+    g.request_id = logging_setup.start_request(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    # 以路由端点而非URL作为标签，避免日志ID等路径参数造成标签数量膨胀
+    endpoint = request.endpoint or 'unknown'
+    if start is not None and endpoint != 'metrics_endpoint':
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
 
 # 权限装饰器
 def admin_required(f):
@@ -113,7 +249,9 @@ def dashboard():
             'total_users': User.query.count(),
             'active_users': User.query.filter_by(is_enabled=True).count(),
             'total_prints': PrintLog.query.count(),
-            'recent_prints': PrintLog.query.order_by(PrintLog.print_time.desc()).limit(5).all()
+            'recent_prints': PrintLog.query.options(joinedload(PrintLog.user))
+                             .order_by(PrintLog.print_time.desc()).limit(5).all(),
+            'recent_profiles': render_profiler.list(limit=5)
         }
     
     return render_template('dashboard.html', user_print_count=user_print_count, stats=stats)
@@ -122,8 +260,32 @@ def dashboard():
 @login_required
 @admin_required
 def users():
-    users = User.query.all()
-    return render_template('users.html', users=users)
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
+
+    # 创建者通过自连接一并查出，避免模板中逐行查找
+    users = User.query.options(joinedload(User.creator)).order_by(User.id).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+
+    # 当前页用户的打印次数，一次分组统计
+    user_ids = [user.id for user in users.items]
+    print_counts = dict(
+        db.session.query(PrintLog.user_id, func.count(PrintLog.id))
+        .filter(PrintLog.user_id.in_(user_ids))
+        .group_by(PrintLog.user_id)
+        .all()
+    ) if user_ids else {}
+
+    # 全部用户的统计，一次聚合查询
+    total, enabled, admins = db.session.query(
+        func.count(User.id),
+        func.coalesce(func.sum(case((User.is_enabled.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((User.role == 'admin', 1), else_=0)), 0)
+    ).one()
+    user_stats = {'total': total, 'enabled': enabled, 'admins': admins, 'users': total - admins}
+
+    return render_template('users.html', users=users, print_counts=print_counts, user_stats=user_stats)
 
 @app.route('/create_user', methods=['GET', 'POST'])
 @login_required
@@ -145,31 +307,14 @@ def create_user():
         if passwords:
             password_list = [p.strip() for p in passwords.split('\n') if p.strip()]
         
-        created_users = []
-        errors = []
-        
-        for i, username in enumerate(username_list):
-            if User.query.filter_by(username=username).first():
-                errors.append(f'用户名 {username} 已存在')
-                continue
-            
-            # 如果提供了密码列表，使用对应的密码，否则使用默认密码
-            if i < len(password_list):
-                password = password_list[i]
-            else:
-                password = '123456'  # 默认密码
-            
-            user = User(
-                username=username,
-                password_hash=generate_password_hash(password),
-                role=role,
-                created_by=current_user.id
-            )
-            db.session.add(user)
-            created_users.append({'username': username, 'password': password})
+        # 用户名和密码按行对应，未提供密码时使用默认密码
+        entries = [
+            (username, password_list[i] if i < len(password_list) else None)
+            for i, username in enumerate(username_list)
+        ]
         
         try:
-            db.session.commit()
+            created_users, errors = provision_users(db, User, entries, role=role, created_by=current_user.id)
             if created_users:
                 flash(f'成功创建 {len(created_users)} 个用户', 'success')
             if errors:
@@ -192,6 +337,7 @@ def toggle_user(user_id):
     else:
         user.is_enabled = not user.is_enabled
         db.session.commit()
+        invalidate_user_cache(user.id)
         status = '启用' if user.is_enabled else '禁用'
         flash(f'已{status}用户 {user.username}', 'success')
     return redirect(url_for('users'))
@@ -209,78 +355,152 @@ def search_student():
     if not student_code:
         return jsonify({'error': '请输入学员编码'}), 400
     
-    # 模拟数据 - 后续需要替换为实际的数据库查询
-    mock_data = {
-        'NC6080119755': {
-            'student_name': '王淳懿',
-            'gender': '未知',
-            'reports': [
-                {
-                    'biz_type': 6,
-                    'biz_name': '学员账户充值提现凭证',
-                    'data': {
-                        "nSchoolId": 35,
-                        "sSchoolName": "南昌学校",
-                        "sTelePhone": "400-175-9898",
-                        "sOperator": current_user.username,
-                        "dtCreate": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "Title": "提现凭证",
-                        "PrintNumber": 1,
-                        "YNVIEWPrint": 1,
-                        "PrintDocument": "",
-                        "sStudentCode": student_code,
-                        "sStudentName": "王淳懿",
-                        "sGender": "未知",
-                        "sPay": "提现金额：¥1499.00",
-                        "dSumBalance": "余额：¥0.00",
-                        "sPayType": "提现方式：现金支付¥1499.00",
-                        "dtCreateDate": "2025-06-04 09:04:30",
-                        "sProofName": "提现凭证",
-                        "sBizType": "提现",
-                        "nBizId": 126560050,
-                        "sRegZoneName": "客服行政"
-                    }
-                },
-            ]
-        },
-        'NC6080119756': {
-            'student_name': '张三',
-            'gender': '男',
-            'reports': [
-                {
-                    'biz_type': 6,
-                    'biz_name': '学员账户充值提现凭证',
-                    'data': {
-                        "nSchoolId": 35,
-                        "sSchoolName": "南昌学校",
-                        "sTelePhone": "400-175-9898",
-                        "sOperator": current_user.username,
-                        "dtCreate": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "Title": "提现凭证",
-                        "PrintNumber": 1,
-                        "YNVIEWPrint": 1,
-                        "PrintDocument": "",
-                        "sStudentCode": student_code,
-                        "sStudentName": "张三",
-                        "sGender": "男",
-                        "sPay": "报名费用：¥3999.00",
-                        "dSumBalance": "余额：¥0.00",
-                        "sPayType": "支付方式：支付宝¥3999.00",
-                        "dtCreateDate": "2025-06-04 10:30:20",
-                        "sProofName": "学员账户充值提现凭证",
-                        "sBizType": "提现",
-                        "nBizId": 126560002,
-                        "sRegZoneName": "客服行政"
-                    }
-                }
-            ]
-        }
-    }
+    student = student_source.get_student(student_code)
+    if student is None:
+        return jsonify({'error': '未找到该学员的信息'}), 404
+    
+    # 索引重建之间新增的学员，在首次查到时增量加入搜索索引
+    student_index.upsert(student_code, student['student_name'])
+    
+    # 操作员和创建时间与当前请求相关，不属于学员数据；
+    # 创建时间即凭证上的打印时间，渲染时在叠加层中绘制，不影响基础渲染的缓存
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for report in student['reports']:
+        report['data']['sOperator'] = current_user.username
+        report['data']['dtCreate'] = now
     
-    if student_code in mock_data:
-        return jsonify(mock_data[student_code])
+    return jsonify(student)
+
+@app.route('/autocomplete_student')
+@login_required
+def autocomplete_student():
+    """根据部分学员编码、姓名或拼音首字母联想学员"""
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({'results': student_index.search(query, limit=limit)})
+
+@app.route('/templates/<int:biz_type>/layout')
+@login_required
+def template_layout(biz_type):
+    """
+    模板的编译布局（JSON），打印页面据此在浏览器中绘制预览，只有真正打印时才由服务器渲染
+
+    ?school_id= 指定学校，学校有自己的模板时返回学校模板的布局
+    """
+    school_id = request.args.get('school_id') or str(app.config['DEFAULT_SCHOOL_ID'])
+    version = template_version(biz_type, school_id)
+    if version is None:
+        return jsonify({'error': '不支持的凭证类型'}), 404
+
+    cache_key = (school_id, biz_type, version)
+    body = layout_cache.get(cache_key)
+    if body is None:
+        layout = load_layout(biz_type, school_id)
+        if layout is None:
+            return jsonify({'error': '不支持的凭证类型'}), 404
+        body = json.dumps(layout, ensure_ascii=False)
+        layout_cache.set(cache_key, body)
+
+    # 浏览器每次用ETag确认模板或布局格式是否更新，未更新时返回304
+    response = Response(body, content_type='application/json; charset=utf-8')
+    response.set_etag(f"{school_id}-{biz_type}-{version}-{LAYOUT_FORMAT}")
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def local_time(utc_time):
+    """数据库中的UTC时间（如print_time）对应的服务器本地时间"""
+    return utc_time.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+def utc_time(local):
+    """服务器本地时间对应的UTC时间，用于和数据库中的print_time比较"""
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+def run_render(message, profile_id=None, meta=None, printed_at=None):
+    """
+    执行一次渲染，返回RenderResult，失败时返回None
+
+    printed_at为凭证上的打印时间（UTC），为空时为当前时间；使用的打印时间（精确到秒）随结果返回，
+    写入打印记录后，补打时用它重新渲染出相同的凭证
+    """
+    printed_at = printed_at or datetime.utcnow().replace(microsecond=0)
+    printed_local = local_time(printed_at)
+    simulator = ProofPrintSimulator(output_store=output_store, color_mode=app.config['RENDER_COLOR_MODE'],
+                                    clock=lambda: printed_local)
+    if profile_id:
+        output = render_profiler.run(profile_id, simulator.process_print_request, message, meta=meta)
     else:
-        return jsonify({'error': '未找到该学员的信息'}), 404
+        output = simulator.process_print_request(message)
+    if not output or not simulator.last_image:
+        return None
+    return RenderResult(output, simulator.last_pages, simulator.last_cache_hit, simulator.last_document, printed_at)
+
+def school_of(student_data):
+    """打印数据所属的学校ID（nSchoolId），没有时为默认学校"""
+    school_id = student_data.get('nSchoolId')
+    return app.config['DEFAULT_SCHOOL_ID'] if school_id in (None, '') else school_id
+
+def render_print(biz_type, student_data, printed_at=None):
+    """
+    渲染凭证，返回 (RenderResult, 剖析ID)，渲染失败时RenderResult为None
+
+    printed_at为凭证上的打印时间（UTC），为空时为当前时间，补打时为原始记录的打印时间；
+    使用打印数据所属学校的模板（学校没有该模板时使用默认模板）；
+    同时请求同一张凭证（打印数据相同）时只渲染一次，共用渲染结果；
+    管理员可通过 ?profile=1 或请求头 X-Profile: 1 对本次渲染进行性能剖析，剖析的渲染不与其他请求合并
+    """
+    # 创建打印消息
+    school_id = school_of(student_data)
+    message = {
+        "PrintType": "proofprintnew",
+        "Info": {
+            "Params": {
+                "BizType": biz_type,
+                "JsonString": json.dumps(student_data),
+                "DefaultPrinter": "",
+                "DefaultPrintNumber": 1,
+                "CopyLayout": app.config['COPY_LAYOUT'],
+                "NeedPreview": True,
+                "SchoolId": school_id,
+                "CurrencySymbol": "¥"
+            }
+        }
+    }
+
+    if (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1') \
+            and current_user.role == 'admin':
+        # 剖析ID总是新生成，请求ID由客户端传入，重复时会覆盖已有的剖析结果
+        profile_id = logging_setup.new_request_id()
+        return run_render(message, profile_id, meta={
+            'request_id': g.request_id,
+            'username': current_user.username,
+            'biz_type': biz_type,
+            'student_code': student_data.get('sStudentCode', '')
+        }, printed_at=printed_at), profile_id
+
+    key = render_key(biz_type, template_version(biz_type, school_id), student_data, printed_at=printed_at)
+    return render_coalescer.render(key, lambda: run_render(message, printed_at=printed_at)), None
+
+def write_print_log(biz_type, student_code, student_name, print_data, cache_hit, print_time=None):
+    """写入打印记录，print_time为凭证上的打印时间（UTC），为空时为当前时间"""
+    print_log = PrintLog(
+        user_id=current_user.id,
+        student_code=student_code,
+        student_name=student_name,
+        biz_type=biz_type,
+        biz_name=TEMPLATE_MAPPING.get(biz_type, '未知类型').replace('.mrt', ''),
+        print_data=print_data
+    )
+    if print_time is not None:
+        print_log.print_time = print_time
+    log_start = time.perf_counter()
+    db.session.add(print_log)
+    db.session.commit()
+    metrics.RENDER_STAGE_SECONDS.observe(
+        time.perf_counter() - log_start, stage='log_write', biz_type=biz_type,
+        cache='hit' if cache_hit else 'miss'
+    )
+    return print_log
 
 @app.route('/generate_print', methods=['POST'])
 @login_required
@@ -293,66 +513,122 @@ def generate_print():
         if not biz_type or not student_data:
             return jsonify({'error': '缺少必要参数'}), 400
         
-        # 创建打印消息
-        message = {
-            "PrintType": "proofprintnew",
-            "Info": {
-                "Params": {
-                    "BizType": biz_type,
-                    "JsonString": json.dumps(student_data),
-                    "DefaultPrinter": "",
-                    "DefaultPrintNumber": 1,
-                    "NeedPreview": True,
-                    "SchoolId": 35,
-                    "CurrencySymbol": "¥"
-                }
-            }
-        }
-        
         # 生成打印图像
-        simulator = ProofPrintSimulator()
-        image_path = simulator.process_print_request(message)
+        rendered, profile_id = render_print(biz_type, student_data)
         
-        if image_path and os.path.exists(image_path):
-            # 将图像转换为base64
-            with open(image_path, 'rb') as img_file:
-                img_data = base64.b64encode(img_file.read()).decode()
+        if rendered:
+            # 将图像转换为base64（直接使用内存中的渲染结果，是否归档由输出存储处理）
+            img_data = base64.b64encode(rendered.pages[0]).decode()
             
             # 获取文件名
-            filename = os.path.basename(image_path)
+            filename = os.path.basename(rendered.output)
             
             # 记录打印日志
-            print_log = PrintLog(
-                user_id=current_user.id,
-                student_code=student_data.get('sStudentCode', ''),
-                student_name=student_data.get('sStudentName', ''),
-                biz_type=biz_type,
-                biz_name=TEMPLATE_MAPPING.get(biz_type, '未知类型').replace('.mrt', ''),
-                print_data=json.dumps(student_data, ensure_ascii=False)
+            print_log = write_print_log(
+                biz_type,
+                student_data.get('sStudentCode', ''),
+                student_data.get('sStudentName', ''),
+                json.dumps(student_data, ensure_ascii=False),
+                rendered.cache_hit,
+                # 与凭证上的打印时间一致，补打时据此重新渲染
+                print_time=rendered.printed_at
             )
-            db.session.add(print_log)
-            db.session.commit()
             
-            # 清理临时文件
-            try:
-                os.remove(image_path)
-                json_file = image_path.replace('.png', '.json')
-                if os.path.exists(json_file):
-                    os.remove(json_file)
-            except:
-                pass
-            
-            return jsonify({
+            result = {
                 'success': True,
                 'image': img_data,
-                'filename': filename
-            })
+                'filename': filename,
+                'log_id': print_log.id
+            }
+            # 数据行较多时凭证有多页，image为第一页
+            if len(rendered.pages) > 1:
+                result['pages'] = [base64.b64encode(page).decode() for page in rendered.pages]
+            # 多联打印时filename为PDF文件名，下载内容为多联PDF，image和pages为一联的预览
+            if rendered.document:
+                result['document'] = base64.b64encode(rendered.document).decode()
+            if profile_id:
+                result['profile_id'] = profile_id
+                result['profile_url'] = url_for('view_profile', profile_id=profile_id)
+            return jsonify(result)
         else:
             return jsonify({'error': '打印处理失败'}), 500
             
     except Exception as e:
+        logger.exception("生成打印失败")
         return jsonify({'error': f'生成打印失败：{str(e)}'}), 500
 
+def load_print_record(log_id):
+    """按ID获取打印记录，在线表中没有时查找归档，返回字典或None"""
+    log = db.session.get(PrintLog, log_id)
+    if log is None:
+        record = log_archiver.get(log_id)
+        if record is not None and isinstance(record.get('print_time'), str):
+            record['print_time'] = datetime.strptime(record['print_time'], '%Y-%m-%d %H:%M:%S')
+        return record
+    return {
+        'id': log.id,
+        'user_id': log.user_id,
+        'student_code': log.student_code,
+        'student_name': log.student_name,
+        'biz_type': log.biz_type,
+        'print_data': log.print_data,
+        'print_time': log.print_time
+    }
+
+@app.route('/reprint/<int:log_id>', methods=['POST'])
+@login_required
+def reprint(log_id):
+    """按打印记录补打，使用记录中保存的打印数据，无需重新上传"""
+    try:
+        record = load_print_record(log_id)
+        # 普通用户只能补打自己的记录
+        if not record or (current_user.role != 'admin' and record['user_id'] != current_user.id):
+            return jsonify({'error': '未找到该打印记录'}), 404
+
+        # 补打记录只保存引用，沿引用找到原始记录
+        for _ in range(10):
+            original_id = reprint_reference(record['print_data'])
+            if original_id is None:
+                break
+            record = load_print_record(original_id)
+            if record is None:
+                return jsonify({'error': '原始打印记录已不存在'}), 404
+
+        biz_type = record['biz_type']
+        student_data = json.loads(record['print_data'])
+        # 补打凭证的打印时间始终为原始记录的打印时间；模板未更新时基础渲染缓存命中，只重新绘制打印时间
+        rendered, profile_id = render_print(biz_type, student_data, record.get('print_time'))
+        if not rendered:
+            return jsonify({'error': '打印处理失败'}), 500
+        pages, document = rendered.pages, rendered.document
+
+        # 补打记录不重复保存打印数据
+        print_log = write_print_log(
+            biz_type, record['student_code'], record['student_name'],
+            json.dumps({'reprint_of': record['id']}), rendered.cache_hit
+        )
+
+        result = {
+            'success': True,
+            'image': base64.b64encode(pages[0]).decode(),
+            'filename': os.path.basename(rendered.output),
+            'log_id': print_log.id,
+            'reprint_of': record['id'],
+            'cached': rendered.cache_hit
+        }
+        if len(pages) > 1:
+            result['pages'] = [base64.b64encode(page).decode() for page in pages]
+        if document:
+            result['document'] = base64.b64encode(document).decode()
+        if profile_id:
+            result['profile_id'] = profile_id
+            result['profile_url'] = url_for('view_profile', profile_id=profile_id)
+        return jsonify(result)
+
+    except Exception as e:
+        logger.exception("补打失败")
+        return jsonify({'error': f'补打失败：{str(e)}'}), 500
+
 @app.route('/print_logs')
 @login_required
 def print_logs():
@@ -361,7 +637,7 @@ def print_logs():
     
     if current_user.role == 'admin':
         # 管理员可以查看所有日志
-        logs = PrintLog.query.order_by(PrintLog.print_time.desc()).paginate(
+        logs = PrintLog.query.options(joinedload(PrintLog.user)).order_by(PrintLog.print_time.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
     else:
@@ -372,6 +648,114 @@ def print_logs():
     
     return render_template('print_logs.html', logs=logs)
 
+def parse_date_range():
+    """
+    解析查询参数中的start/end日期（YYYY-MM-DD，服务器本地日期），格式错误时抛出ValueError
+
+    返回UTC时间的[start, end)区间：end为结束日期次日零点（不包含），包含结束日期当天的全部记录
+    """
+    start = request.args.get('start', '').strip()
+    end = request.args.get('end', '').strip()
+    start = utc_time(datetime.strptime(start, '%Y-%m-%d')) if start else None
+    end = utc_time(datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)) if end else None
+    return start, end
+
+@app.route('/print_logs/export')
+@login_required
+def export_print_logs():
+    """以CSV或JSONL格式流式导出打印记录，可按日期范围、用户、凭证类型和学员编码筛选"""
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': '导出格式应为csv或jsonl'}), 400
+    try:
+        start, end = parse_date_range()
+    except ValueError:
+        return jsonify({'error': '日期格式应为YYYY-MM-DD'}), 400
+
+    # 普通用户只能导出自己的记录
+    user_id = request.args.get('user_id', type=int) if current_user.role == 'admin' else current_user.id
+
+    rows = log_exporter.iter_export(
+        fmt,
+        start=start,
+        end=end,
+        user_id=user_id,
+        biz_type=request.args.get('biz_type', type=int),
+        student_code=request.args.get('student_code', '').strip() or None
+    )
+    filename = f"print_logs_{datetime.now():%Y%m%d%H%M%S}.{fmt}"
+    logger.info("用户 %s 导出打印记录: %s", current_user.username, request.query_string.decode())
+    return Response(stream_with_context(rows), content_type=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/print_logs/archive')
+@login_required
+def search_archived_logs():
+    """检索已归档的打印记录"""
+    try:
+        start, end = parse_date_range()
+    except ValueError:
+        return jsonify({'error': '日期格式应为YYYY-MM-DD'}), 400
+
+    # 普通用户只能查看自己的记录
+    user_id = None if current_user.role == 'admin' else current_user.id
+
+    logs = log_archiver.search(
+        student_code=request.args.get('student_code', '').strip() or None,
+        user_id=user_id,
+        biz_type=request.args.get('biz_type', type=int),
+        start=start,
+        end=end,
+        limit=min(request.args.get('limit', 100, type=int), 1000)
+    )
+    return jsonify({'logs': logs, 'months': log_archiver.months()})
+
+@app.route('/print_logs/archive/<int:log_id>')
+@login_required
+def get_archived_log(log_id):
+    """按ID获取归档的打印记录，用于补打"""
+    record = log_archiver.get(log_id)
+    if not record or (current_user.role != 'admin' and record['user_id'] != current_user.id):
+        return jsonify({'error': '未找到该归档记录'}), 404
+    return jsonify(record)
+
+@app.route('/profiles/<profile_id>')
+@login_required
+@admin_required
+def view_profile(profile_id):
+    """查看渲染剖析结果的火焰图摘要"""
+    info = render_profiler.get(profile_id) if is_valid_profile_id(profile_id) else None
+    if info is None:
+        flash('剖析结果不存在或已被清理', 'error')
+        return redirect(url_for('dashboard'))
+    summary = render_profiler.summary(profile_id)
+    return render_template('profile.html', info=info, summary=summary)
+
+@app.route('/profiles/<profile_id>/download')
+@login_required
+@admin_required
+def download_profile(profile_id):
+    """下载pstats格式的剖析文件"""
+    if not is_valid_profile_id(profile_id) or render_profiler.get(profile_id) is None:
+        abort(404)
+    return send_file(render_profiler.prof_path(profile_id), as_attachment=True,
+                     download_name=f'render_{profile_id}.prof')
+
+@app.route('/output_store/usage')
+@login_required
+@admin_required
+def output_store_usage():
+    """打印输出目录的占用情况"""
+    return jsonify(output_store.usage())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus指标，配置METRICS_TOKEN后需携带 Authorization: Bearer <token>"""
+    token = app.config['METRICS_TOKEN']
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/change_password', methods=['GET', 'POST'])
 @login_required
 def change_password():
@@ -410,6 +794,7 @@ def change_password():
             # 更新密码
             current_user.password_hash = generate_password_hash(new_password)
             db.session.commit()
+            invalidate_user_cache(current_user.id)
             
             flash('密码修改成功！', 'success')
             return redirect(url_for('dashboard'))
@@ -432,11 +817,33 @@ def create_admin_user():
         )
         db.session.add(admin)
         db.session.commit()
-        print("默认管理员账户已创建 - 用户名: admin, 密码: admin123")
+        logger.info("默认管理员账户已创建 - 用户名: admin, 密码: admin123")
+
+def ensure_indexes():
+    """
+    为已存在的表补建模型中定义的索引，返回新建的索引名列表
+
+    db.create_all() 只创建不存在的表，不会给已有的表（如升级前创建的print_log）添加索引；
+    已有相同列（按顺序）的索引时跳过，例如MySQL为外键自动创建的索引
+    """
+    created = []
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {tuple(index['column_names']) for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if tuple(column.name for column in index.columns) in existing:
+                continue
+            logger.info("为表 %s 创建索引 %s（数据较多时可能需要一段时间）", table.name, index.name)
+            index.create(bind=db.engine)
+            created.append(index.name)
+    return created
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        ensure_indexes()
         create_admin_user()
     
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+打印日志归档脚本
+将超过保留期限的打印记录迁移到归档存储，建议通过计划任务每天执行一次
+"""
+
+import argparse
+import sys
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='归档过期的打印记录')
+    parser.add_argument('--days', type=int, default=None,
+                        help='在线表保留天数，默认使用 PRINT_LOG_RETENTION_DAYS 配置')
+    args = parser.parse_args()
+
+    from app import app, log_archiver, ensure_indexes
+
+    retention_days = args.days if args.days is not None else app.config['PRINT_LOG_RETENTION_DAYS']
+
+    print("=" * 50)
+    print("南昌新东方凭证打印系统 - 打印记录归档")
+    print("=" * 50)
+    print(f"归档方式: {log_archiver.mode}")
+    print(f"保留天数: {retention_days}")
+
+    try:
+        with app.app_context():
+            # 归档按print_time分批查询，升级前创建的表先补建索引，避免每批全表扫描
+            for name in ensure_indexes():
+                print(f"✅ 已创建索引 {name}")
+            summary = log_archiver.archive(retention_days)
+    except Exception as e:
+        print(f"❌ 归档失败: {str(e)}")
+        sys.exit(1)
+
+    if not summary:
+        print("没有需要归档的记录")
+        return
+
+    for month, count in sorted(summary.items()):
+        print(f"✅ {month}: 归档 {count} 条记录")
+    print(f"\n🎉 归档完成，共迁移 {sum(summary.values())} 条记录")
+
+if __name__ == "__main__":
+    main()
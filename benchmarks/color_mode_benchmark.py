@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+渲染颜色模式基准测试
+比较 RGB、L（灰度）、1（黑白）三种颜色模式在并发渲染时的表现：
+- 峰值内存（RSS）：每种模式在独立子进程中运行，预热模板缓存后以多个线程并发渲染，
+  记录预热后的峰值和并发渲染后的峰值，两者之差为并发渲染额外占用的内存
+- 单次渲染延迟、PNG编码耗时和输出大小
+- 与RGB渲染的差异：L模式与RGB转灰度后逐像素比较；1模式与RGB按128阈值二值化后比较
+  （页脚打印时间精确到秒，跨秒渲染时该区域会有差异）
+
+用法：
+    python benchmarks/color_mode_benchmark.py
+    python benchmarks/color_mode_benchmark.py --threads 16 -n 64 --biz-type 1 --output results.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from PIL import Image, ImageChops
+
+from benchmarks.render_benchmark import build_payload, peak_rss_bytes, percentile
+from utils.print_simulator import COLOR_MODES, TEMPLATE_DIR, TEMPLATE_MAPPING, ProofPrintSimulator, MrtParser
+from utils.output_store import NullOutputStore
+from utils.cache import SizedLRUCache
+
+
+def benchmark_mode(color_mode, biz_types, threads, iterations, seed=0):
+    """在当前进程中以指定颜色模式并发渲染，返回统计结果和每个模板的第一页PNG"""
+    payloads = {biz_type: build_payload(MrtParser(os.path.join(TEMPLATE_DIR, TEMPLATE_MAPPING[biz_type])), seed=seed)
+                for biz_type in biz_types}
+
+    def render(biz_type):
+        # 不使用基础渲染缓存，每次都完整渲染
+        simulator = ProofPrintSimulator(output_store=NullOutputStore(), color_mode=color_mode,
+                                        base_cache=SizedLRUCache(0, len))
+        start = time.perf_counter()
+        simulator.generate_print_output(TEMPLATE_MAPPING[biz_type], payloads[biz_type], '¥')
+        return biz_type, time.perf_counter() - start, simulator.last_timings['encode'], simulator.last_pages
+
+    # 预热：填充模板缓存和转换后的图像
+    samples = {biz_type: render(biz_type)[3][0] for biz_type in biz_types}
+    baseline = peak_rss_bytes()
+
+    jobs = [biz_types[i % len(biz_types)] for i in range(iterations)]
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(render, jobs))
+    peak = peak_rss_bytes()
+
+    latencies = [latency for _, latency, _, _ in results]
+    encodes = [encode for _, _, encode, _ in results]
+    sizes = [sum(len(page) for page in pages) for _, _, _, pages in results]
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    def mb(value):
+        return round(value / 1024 / 1024, 1) if value is not None else None
+
+    return {
+        'color_mode': color_mode,
+        'threads': threads,
+        'renders': len(results),
+        'latency_ms': {'mean': ms(sum(latencies) / len(latencies)), 'p50': ms(percentile(latencies, 50)),
+                       'p95': ms(percentile(latencies, 95))},
+        'encode_ms': ms(sum(encodes) / len(encodes)),
+        'output_bytes': int(sum(sizes) / len(sizes)),
+        'baseline_rss_mb': mb(baseline),
+        'peak_rss_mb': mb(peak),
+        'render_rss_mb': mb(peak - baseline) if peak is not None and baseline is not None else None,
+    }, samples
+
+
+def _run_isolated(args):
+    """在独立子进程中执行，使峰值内存只反映一种颜色模式"""
+    return benchmark_mode(*args)
+
+
+def image_difference(color_mode, png, reference_png):
+    """与RGB渲染结果的差异（不同像素占比，百分比）"""
+    reference = Image.open(io.BytesIO(reference_png)).convert('L')
+    image = Image.open(io.BytesIO(png)).convert('L')
+    if color_mode == '1':
+        reference = reference.point(lambda value: 255 if value >= 128 else 0)
+    elif color_mode == 'RGB':
+        return 0.0
+    histogram = ImageChops.difference(reference, image).histogram()
+    return round(sum(histogram[1:]) / (image.width * image.height) * 100, 3)
+
+
+def run(biz_types, threads, iterations, seed=0):
+    results = []
+    samples = {}
+    context = multiprocessing.get_context('spawn')
+    for color_mode in COLOR_MODES:
+        with context.Pool(1) as pool:
+            job = (color_mode, biz_types, threads, iterations, seed)
+            result, samples[color_mode] = pool.apply(_run_isolated, (job,))
+        results.append(result)
+
+    for result in results:
+        color_mode = result['color_mode']
+        result['diff_pct'] = {biz_type: image_difference(color_mode, png, samples['RGB'][biz_type])
+                              for biz_type, png in samples[color_mode].items()}
+    return results
+
+
+def _change(old, new):
+    return f"{(new - old) / old * 100:+.0f}%" if old else '-'
+
+
+def print_table(results):
+    header = (f"{'mode':<6}{'p50 ms':>9}{'p95 ms':>9}{'编码 ms':>9}{'KB':>8}{'峰值RSS MB':>12}"
+              f"{'渲染RSS MB':>12}{'相对RGB':>9}{'最大差异%':>11}")
+    print(header)
+    print('-' * len(header))
+    rgb = results[0]
+    for r in results:
+        print(f"{r['color_mode']:<6}{r['latency_ms']['p50']:>9.1f}{r['latency_ms']['p95']:>9.1f}{r['encode_ms']:>9.1f}"
+              f"{r['output_bytes'] / 1024:>8.0f}{r['peak_rss_mb'] or 0:>12.1f}{r['render_rss_mb'] or 0:>12.1f}"
+              f"{_change(rgb['render_rss_mb'] or 0, r['render_rss_mb'] or 0):>9}"
+              f"{max(r['diff_pct'].values()):>11.3f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='渲染颜色模式基准测试')
+    parser.add_argument('-n', '--iterations', type=int, default=32, help='每种颜色模式的并发渲染总次数')
+    parser.add_argument('--threads', type=int, default=8, help='并发渲染的线程数')
+    parser.add_argument('--biz-type', type=int, action='append', help='只测试指定的BizType，可重复')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    args = parser.parse_args()
+
+    results = run(args.biz_type or sorted(TEMPLATE_MAPPING), args.threads, args.iterations, args.seed)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'threads': args.threads, 'iterations': args.iterations, 'results': results}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板组件模型基准测试
+比较 __slots__ 组件类（utils.components）与原先每个组件一个字典的表示方式：
+- 内存：一个模板全部组件占用的字节数（sys.getsizeof 逐个对象累加，两种方式共用的文本等对象不计入；
+  不使用tracemalloc，因为解析时临时创建的元组、浮点数进入解释器的空闲列表后仍被计为占用）
+- 访问：按渲染循环的方式读取位置、尺寸、字体和对齐方式的耗时
+  （字典方式每次拆分 ClientRectangle 字符串并按键查找，组件类直接读取数值属性）
+
+用法：
+    python benchmarks/component_benchmark.py
+    python benchmarks/component_benchmark.py --biz-type 1 -n 2000 --output results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from utils.print_simulator import TEMPLATE_DIR, TEMPLATE_MAPPING, MrtParser, clear_template_cache
+from utils.components import FontSpec, TextComponent, ImageComponent, LineComponent
+
+PIXELS_PER_CM = 78.74
+
+
+def _rect_text(component):
+    """还原模板中的 ClientRectangle 文本，每次生成新的字符串（与解析XML时一样）"""
+    return ','.join(f"{value:g}" for value in (component.x, component.y, component.width, component.height))
+
+
+def build_dicts(components):
+    """按原先的字典格式构建组件"""
+    result = []
+    for c in components:
+        if c.type == 'Text':
+            result.append({
+                'type': 'Text', 'name': c.name, 'rect': _rect_text(c), 'text': c.text,
+                'data_type': c.data_type,
+                'font': {'name': c.font.name, 'size': c.font.size, 'bold': c.font.bold},
+                'alignment': c.alignment, 'text_format': c.text_format, 'expr': c.expr,
+            })
+        elif c.type == 'Image':
+            result.append({'type': 'Image', 'name': c.name, 'rect': _rect_text(c), 'image_data': c.image_data})
+        else:
+            result.append({'type': 'Line', 'name': c.name, 'rect': _rect_text(c), 'color': c.color})
+    return result
+
+
+def build_objects(components):
+    """构建组件对象，ClientRectangle 同样从新生成的字符串解析"""
+    result = []
+    for c in components:
+        if c.type == 'Text':
+            obj = TextComponent(c.name, _rect_text(c), c.text, c.data_type,
+                                FontSpec(c.font.name, c.font.size, c.font.bold), c.alignment, c.text_format)
+            obj.expr = c.expr
+        elif c.type == 'Image':
+            obj = ImageComponent(c.name, _rect_text(c), c.image_data)
+        else:
+            obj = LineComponent(c.name, _rect_text(c), c.color)
+        result.append(obj)
+    return result
+
+
+def _slots(obj):
+    for cls in type(obj).__mro__:
+        yield from getattr(cls, '__slots__', ())
+
+
+def deep_size(obj, seen):
+    """对象及其引用的对象占用的字节数，seen中的对象不重复计算"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif not isinstance(obj, (str, int, float)):
+        size += sum(deep_size(getattr(obj, name, None), seen) for name in _slots(obj))
+    return size
+
+
+def shared_objects(components):
+    """两种表示方式共用的对象：文本、名称、编译后的表达式、图像数据等"""
+    shared = {id(None), id(True), id(False)}
+    for component in components:
+        for name in _slots(component):
+            value = getattr(component, name, None)
+            if not isinstance(value, (float, FontSpec)):
+                shared.add(id(value))
+        if component.type == 'Text':
+            shared.add(id(component.font.name))
+            shared.add(id(component.font.size))
+    return shared
+
+
+def measure_memory(built, components):
+    """返回全部组件占用的内存（字节），不含列表本身"""
+    seen = shared_objects(components)
+    # 字典的键是代码中的常量字符串，所有组件共用
+    for item in built:
+        if isinstance(item, dict):
+            seen.update(id(key) for key in item)
+            if 'font' in item:
+                seen.update(id(key) for key in item['font'])
+    return sum(deep_size(item, seen) for item in built)
+
+
+def access_dicts(components):
+    """渲染循环中对字典组件的读取"""
+    total = 0.0
+    for component in components:
+        rect_parts = component['rect'].split(',') if component['rect'] else [0, 0, 1, 1]
+        if len(rect_parts) >= 4:
+            x = float(rect_parts[0]) * PIXELS_PER_CM
+            y = float(rect_parts[1]) * PIXELS_PER_CM
+            width = float(rect_parts[2]) * PIXELS_PER_CM
+            height = float(rect_parts[3]) * PIXELS_PER_CM
+            total += x + y + width + height
+            if component['type'] == 'Text':
+                font_info = component.get('font', {'name': 'Arial', 'size': 9, 'bold': False})
+                total += font_info.get('size', 9) + font_info.get('bold', False)
+                total += len(font_info.get('name', 'Arial')) + len(component.get('alignment', 'Left'))
+    return total
+
+
+def access_objects(components):
+    """渲染循环中对组件对象的读取"""
+    total = 0.0
+    for component in components:
+        if component.valid:
+            x = component.x * PIXELS_PER_CM
+            y = component.y * PIXELS_PER_CM
+            width = component.width * PIXELS_PER_CM
+            height = component.height * PIXELS_PER_CM
+            total += x + y + width + height
+            if component.type == 'Text':
+                font_info = component.font
+                total += font_info.size + font_info.bold
+                total += len(font_info.name) + len(component.alignment)
+    return total
+
+
+def measure_access(access, components, iterations):
+    """返回读取一遍全部组件的平均耗时（微秒）"""
+    access(components)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        access(components)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def run(biz_types, iterations):
+    results = []
+    for biz_type in biz_types:
+        template = TEMPLATE_MAPPING[biz_type]
+        clear_template_cache()
+        parser = MrtParser(os.path.join(TEMPLATE_DIR, template))
+        components = parser.components
+        dicts = build_dicts(components)
+        objects = build_objects(components)
+        dict_bytes = measure_memory(dicts, components)
+        object_bytes = measure_memory(objects, components)
+        dict_us = measure_access(access_dicts, dicts, iterations)
+        object_us = measure_access(access_objects, objects, iterations)
+        results.append({
+            'biz_type': biz_type,
+            'template': template,
+            'components': len(components),
+            'memory_bytes': {'dict': dict_bytes, 'slots': object_bytes,
+                             'change_pct': round(_change(dict_bytes, object_bytes), 1)},
+            'access_us': {'dict': round(dict_us, 2), 'slots': round(object_us, 2),
+                          'change_pct': round(_change(dict_us, object_us), 1)},
+        })
+    return results
+
+
+def print_table(results):
+    header = (f"{'Biz':<5}{'组件数':>6}{'dict KB':>10}{'slots KB':>10}{'内存':>9}"
+              f"{'dict us':>10}{'slots us':>10}{'访问':>9}  template")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        mem, acc = r['memory_bytes'], r['access_us']
+        print(f"{r['biz_type']:<5}{r['components']:>6}{mem['dict'] / 1024:>10.1f}{mem['slots'] / 1024:>10.1f}"
+              f"{mem['change_pct']:>+8.1f}%{acc['dict']:>10.1f}{acc['slots']:>10.1f}{acc['change_pct']:>+8.1f}%"
+              f"  {r['template']}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='模板组件模型基准测试')
+    parser.add_argument('-n', '--iterations', type=int, default=1000, help='每个模板读取全部组件的次数')
+    parser.add_argument('--biz-type', type=int, action='append', help='只测试指定的BizType，可重复')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    args = parser.parse_args()
+
+    results = run(args.biz_type or sorted(TEMPLATE_MAPPING), args.iterations)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'iterations': args.iterations, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
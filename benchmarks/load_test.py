@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+端到端HTTP压力测试
+以N个虚拟用户登录系统，按指定并发或到达速率循环执行真实业务流程：
+查询学员(/search_student) -> 生成打印(/generate_print) -> 查看打印记录(/print_logs)
+统计每个接口的吞吐量、延迟分布和错误率
+
+用法：
+    # 启动一个使用临时SQLite数据库的本地服务并压测
+    python benchmarks/load_test.py --local --users 20 --concurrency 8 --duration 60
+
+    # 压测已运行的服务（SQLite或MySQL均可），需提供管理员账号用于创建测试用户
+    python benchmarks/load_test.py --base-url http://127.0.0.1:5000 --admin-password admin123 --rate 5
+"""
+
+import argparse
+import contextlib
+import http.cookiejar
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+ENDPOINTS = ['login', 'search_student', 'generate_print', 'print_logs']
+
+
+def percentile(values, pct):
+    """线性插值计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class Stats:
+    """线程安全的接口统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.error_samples = {name: [] for name in ENDPOINTS}
+
+    def record(self, endpoint, latency, error=None):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if error:
+                self.errors[endpoint] += 1
+                if len(self.error_samples[endpoint]) < 3:
+                    self.error_samples[endpoint].append(error)
+
+    def record_error(self, endpoint, message):
+        """记录请求成功但业务结果失败的情况"""
+        with self._lock:
+            self.errors[endpoint] += 1
+            if len(self.error_samples[endpoint]) < 3:
+                self.error_samples[endpoint].append(message)
+
+    def summary(self, elapsed):
+        result = {}
+        for name in ENDPOINTS:
+            latencies = self.latencies[name]
+            count = len(latencies)
+            result[name] = {
+                'requests': count,
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / count, 4) if count else 0,
+                'throughput_rps': round(count / elapsed, 2) if elapsed else 0,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 1) if count else None,
+                'p95_ms': round(percentile(latencies, 95) * 1000, 1) if count else None,
+                'p99_ms': round(percentile(latencies, 99) * 1000, 1) if count else None,
+                'max_ms': round(max(latencies) * 1000, 1) if count else None,
+                'error_samples': self.error_samples[name],
+            }
+        return result
+
+
+class VirtualUser:
+    """持有独立会话（Cookie）的虚拟用户"""
+
+    def __init__(self, base_url, username, password, stats, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.stats = stats
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def _request(self, endpoint, path, data=None, json_body=None):
+        """发送请求并记录统计，返回 (状态码, 响应体, 最终URL)"""
+        url = self.base_url + path
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode('utf-8')
+
+        request = urllib.request.Request(url, data=body, headers=headers)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                content = response.read()
+                status, final_url = response.status, response.geturl()
+        except urllib.error.HTTPError as e:
+            content, status, final_url = e.read(), e.code, url
+        except Exception as e:
+            self.stats.record(endpoint, time.perf_counter() - start, error=str(e))
+            return None, None, url
+        latency = time.perf_counter() - start
+
+        error = f"HTTP {status}" if status >= 400 else None
+        self.stats.record(endpoint, latency, error=error)
+        return status, content, final_url
+
+    def login(self):
+        status, _, final_url = self._request(
+            'login', '/login', data={'username': self.username, 'password': self.password}
+        )
+        # 登录成功会重定向到仪表板
+        if status and '/login' in final_url:
+            self.stats.record_error('login', f"{self.username} 登录失败")
+            return False
+        return status == 200
+
+    def run_iteration(self, student_code):
+        """执行一次完整业务流程"""
+        status, content, _ = self._request(
+            'search_student', '/search_student?' + urllib.parse.urlencode({'student_code': student_code})
+        )
+        if status != 200:
+            return
+
+        try:
+            reports = json.loads(content).get('reports') or []
+        except ValueError:
+            return
+        if reports:
+            report = reports[0]
+            status, content, _ = self._request(
+                'generate_print', '/generate_print',
+                json_body={'biz_type': report['biz_type'], 'student_data': report['data']}
+            )
+            if status == 200:
+                try:
+                    result = json.loads(content)
+                except ValueError:
+                    result = {'error': '响应不是JSON'}
+                if not result.get('success'):
+                    self.stats.record_error('generate_print', result.get('error', '生成失败'))
+
+        self._request('print_logs', '/print_logs')
+
+
+def create_users(base_url, admin_username, admin_password, usernames, password):
+    """以管理员身份通过创建用户页面批量创建测试账号（已存在的账号会被跳过）"""
+    admin = VirtualUser(base_url, admin_username, admin_password, Stats())
+    if not admin.login():
+        raise RuntimeError('管理员登录失败，无法创建测试用户')
+    status, _, _ = admin._request('login', '/create_user', data={
+        'usernames': '\n'.join(usernames),
+        'passwords': '\n'.join(password for _ in usernames),
+        'role': 'user'
+    })
+    if status != 200:
+        raise RuntimeError(f'创建测试用户失败: HTTP {status}')
+
+
+def start_local_server(port):
+    """使用临时SQLite数据库在后台线程启动应用，返回 (服务器, 数据库文件路径)"""
+    db_path = os.path.join(tempfile.mkdtemp(prefix='load_test_'), 'print_system.db')
+    os.environ['DATABASE_TYPE'] = 'sqlite'
+    os.environ['SQLITE_DATABASE_PATH'] = db_path
+    # 本地服务只输出警告及以上日志，避免每次渲染的日志干扰压测
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from werkzeug.serving import make_server
+    from app import app, db, create_admin_user
+
+    with app.app_context():
+        db.create_all()
+        create_admin_user()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='load-test-server', daemon=True).start()
+    return server, db_path
+
+
+def run_load(base_url, users, student_codes, concurrency, duration, rate, stats):
+    """
+    执行压测
+
+    rate为0时为闭环模式：每个工作线程完成一次流程后立即开始下一次；
+    rate大于0时为开环模式：按每秒rate次的速率发起流程，由工作线程池处理
+    """
+    stop_at = time.time() + duration
+    tickets = queue.Queue()
+    counter = {'next': 0}
+    counter_lock = threading.Lock()
+
+    def next_student():
+        with counter_lock:
+            counter['next'] += 1
+            return student_codes[counter['next'] % len(student_codes)]
+
+    def worker(index):
+        user = users[index % len(users)]
+        while time.time() < stop_at:
+            if rate > 0:
+                try:
+                    tickets.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            user.run_iteration(next_student())
+
+    def scheduler():
+        interval = 1.0 / rate
+        next_time = time.time()
+        while next_time < stop_at:
+            tickets.put(next_time)
+            next_time += interval
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    if rate > 0:
+        threads.append(threading.Thread(target=scheduler, daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 开环模式下未及处理的请求说明服务跟不上到达速率
+    return tickets.qsize()
+
+
+def print_report(summary, elapsed, backlog):
+    """打印统计结果"""
+    header = f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'err%':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, s in summary.items():
+        if not s['requests']:
+            continue
+        print(f"{name:<16}{s['requests']:>10}{s['errors']:>8}{s['error_rate'] * 100:>6.1f}%{s['throughput_rps']:>9.2f}"
+              f"{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}")
+    vouchers = summary['generate_print']['requests'] - summary['generate_print']['errors']
+    print(f"\n持续时间 {elapsed:.1f} 秒，成功生成凭证 {vouchers} 张，{vouchers / elapsed:.2f} 张/秒")
+    if backlog:
+        print(f"⚠️ 仍有 {backlog} 个请求未处理，服务吞吐量低于设定的到达速率")
+    for name, s in summary.items():
+        for sample in s['error_samples']:
+            print(f"  {name} 错误示例: {sample}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='凭证打印系统端到端压力测试')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000', help='被测服务地址')
+    parser.add_argument('--local', action='store_true', help='使用临时SQLite数据库在本进程内启动服务')
+    parser.add_argument('--port', type=int, default=5055, help='--local模式下的服务端口')
+    parser.add_argument('--users', type=int, default=10, help='虚拟用户数')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发工作线程数')
+    parser.add_argument('--duration', type=float, default=30, help='压测持续时间（秒）')
+    parser.add_argument('--rate', type=float, default=0, help='每秒发起的业务流程数，0表示闭环模式（尽可能快）')
+    parser.add_argument('--student-code', action='append', help='查询的学员编码，可重复')
+    parser.add_argument('--admin-username', default='admin', help='用于创建测试用户的管理员账号')
+    parser.add_argument('--admin-password', default='admin123', help='管理员密码')
+    parser.add_argument('--user-prefix', default='loadtest', help='测试用户名前缀')
+    parser.add_argument('--user-password', default='loadtest123', help='测试用户密码')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    args = parser.parse_args()
+
+    student_codes = args.student_code or ['NC6080119755', 'NC6080119756']
+    usernames = [f"{args.user_prefix}{i:04d}" for i in range(args.users)]
+    real_stdout = sys.stdout
+
+    server = None
+    base_url = args.base_url
+    with contextlib.ExitStack() as stack:
+        if args.local:
+            # 屏蔽本地服务的控制台输出，只保留压测报告
+            devnull = stack.enter_context(open(os.devnull, 'w', encoding='utf-8'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            server, db_path = start_local_server(args.port)
+            base_url = f"http://127.0.0.1:{args.port}"
+            print(f"本地服务已启动: {base_url}，数据库: {db_path}", file=real_stdout)
+
+        create_users(base_url, args.admin_username, args.admin_password, usernames, args.user_password)
+
+        stats = Stats()
+        users = [VirtualUser(base_url, username, args.user_password, stats) for username in usernames]
+        logged_in = sum(1 for user in users if user.login())
+        print(f"{logged_in}/{len(users)} 个虚拟用户登录成功，开始压测 {args.duration:.0f} 秒...", file=real_stdout)
+
+        start = time.time()
+        backlog = run_load(base_url, users, student_codes, args.concurrency, args.duration, args.rate, stats)
+        elapsed = time.time() - start
+
+    if server:
+        server.shutdown()
+
+    summary = stats.summary(elapsed)
+    print_report(summary, elapsed, backlog)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'config': {
+                    'base_url': base_url, 'users': args.users, 'concurrency': args.concurrency,
+                    'duration': args.duration, 'rate': args.rate,
+                },
+                'elapsed': round(elapsed, 2),
+                'backlog': backlog,
+                'endpoints': summary,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
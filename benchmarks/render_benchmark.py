@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+凭证渲染性能基准测试
+使用合成数据渲染 TEMPLATE_MAPPING 中的每个模板，统计：
+- 各阶段耗时：parse（模板解析）、layout（布局）、draw（绘制）、encode（PNG编码）、io（写文件）
+- 单次渲染延迟的 p50/p95/p99
+- 峰值内存（RSS）和输出文件大小
+
+用法：
+    python benchmarks/render_benchmark.py                       # 冷、热缓存各跑一遍
+    python benchmarks/render_benchmark.py --mode warm -n 50 --output results.json
+    python benchmarks/render_benchmark.py --compare baseline.json --output results.json
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from utils.cache import SizedLRUCache
+from utils.print_simulator import ProofPrintSimulator, TEMPLATE_MAPPING, MrtParser, clear_template_cache
+
+STAGES = ['parse', 'layout', 'draw', 'encode', 'io']
+
+# 每次迭代渲染相同的数据，不使用基础渲染缓存，测量的是完整渲染的耗时
+NO_BASE_CACHE = SizedLRUCache(0, len)
+
+_SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗'
+_GIVEN_NAMES = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超兰霞平刚淳懿'
+_CLASS_NAMES = ['新概念英语一册', '高中数学同步提高班', '初三物理冲刺班', '雅思6.5分强化班', '少儿英语启蒙班']
+
+
+def _synthetic_value(field, rnd, now):
+    """根据字段名生成贴近真实的示例值"""
+    name = field.rsplit('.', 1)[-1]
+    lower = name.lower()
+    if name == 'sStudentName':
+        return rnd.choice(_SURNAMES) + ''.join(rnd.choice(_GIVEN_NAMES) for _ in range(rnd.choice([1, 2])))
+    if name == 'sStudentCode':
+        return f"NC{rnd.randint(6000000000, 6099999999)}"
+    if name == 'sSchoolName':
+        return '南昌学校'
+    if name == 'sTelePhone':
+        return '400-175-9898'
+    if name == 'sGender':
+        return rnd.choice(['男', '女', '未知'])
+    if name == 'sMobile':
+        return f"13{rnd.randint(100000000, 999999999)}"
+    if name in ('sClassName', 'sOldClassName', 'sNewClassName', 'sCourseName'):
+        return rnd.choice(_CLASS_NAMES)
+    if 'code' in lower:
+        return f"{name[1:3].upper()}{rnd.randint(100000, 999999)}"
+    if name.startswith('dt') or 'date' in lower or 'time' in lower:
+        return (now - timedelta(minutes=rnd.randint(0, 60 * 24 * 90))).strftime('%Y-%m-%d %H:%M:%S')
+    if name.startswith('d') and name[1:2].isupper():
+        return f"{rnd.randint(0, 2000000) / 100:.2f}"
+    if name.startswith('n') and name[1:2].isupper():
+        return rnd.randint(1, 40)
+    if name == 'Title' or name == 'sProofName':
+        return '凭证'
+    if 'paytype' in lower:
+        return f"支付方式：{rnd.choice(['现金', '支付宝', '微信', '银行卡'])}¥{rnd.randint(100, 9999)}.00"
+    if 'operator' in lower:
+        return f"操作员{rnd.randint(1, 99)}"
+    return f"示例{name}"
+
+
+def build_payload(mrt_parser, seed=0, rows=3):
+    """
+    根据模板的数据字段和文本中的占位符生成合成数据
+
+    {ArrayList.Student.sStudentName} 之类的嵌套字段同时以扁平键（Student.sStudentName）
+    和嵌套结构（Student / ClassAndCardArray 列表）提供
+    """
+    rnd = random.Random(seed)
+    now = datetime(2025, 6, 5, 9, 49, 44)
+    payload = {}
+
+    fields = set(mrt_parser.data_fields)
+    for component in mrt_parser.components:
+        if component.type == 'Text' and component.text:
+            fields.update(re.findall(r'\{ArrayList\.([^}]*)\}', component.text))
+
+    for field in sorted(fields):
+        value = _synthetic_value(field, rnd, now)
+        payload[field] = value
+        if '.' in field:
+            group, name = field.split('.', 1)
+            if group.endswith('Array') or group == 'RegisterProduct':
+                items = payload.setdefault(group, [{} for _ in range(rows)])
+                if isinstance(items, list):
+                    for item in items:
+                        item[name] = _synthetic_value(field, rnd, now)
+            else:
+                nested = payload.setdefault(group, {})
+                if isinstance(nested, dict):
+                    nested[name] = value
+
+    payload.setdefault('sProofName', os.path.splitext(mrt_parser.mrt_file_path)[0].rsplit(os.sep, 1)[-1])
+    return payload
+
+
+def percentile(values, pct):
+    """线性插值计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def peak_rss_bytes():
+    """当前进程的峰值内存（RSS），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux单位为KB，macOS单位为字节
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except Exception:
+        pass
+    return None
+
+
+def benchmark_template(biz_type, mode, iterations, seed=0):
+    """对单个模板执行基准测试，返回统计结果字典"""
+    template_name = TEMPLATE_MAPPING[biz_type]
+    output_dir = tempfile.mkdtemp(prefix='render_bench_')
+    latencies = []
+    stage_samples = {stage: [] for stage in STAGES}
+    output_sizes = []
+    errors = []
+
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            simulator = ProofPrintSimulator(base_cache=NO_BASE_CACHE)
+            simulator.output_dir = output_dir
+            template_path = os.path.join(simulator.template_dir, template_name)
+            payload = build_payload(MrtParser(template_path), seed=seed)
+
+            if mode == 'warm':
+                # 预热：填充模板缓存
+                simulator.generate_print_output(template_name, payload, '¥')
+
+            for _ in range(iterations):
+                if mode == 'cold':
+                    clear_template_cache()
+                    simulator = ProofPrintSimulator(base_cache=NO_BASE_CACHE)
+                    simulator.output_dir = output_dir
+
+                try:
+                    start = time.perf_counter()
+                    output_path = simulator.generate_print_output(template_name, payload, '¥')
+                    latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors.append(str(e))
+                    continue
+
+                for stage in STAGES:
+                    stage_samples[stage].append(simulator.last_timings.get(stage, 0.0))
+                if output_path and os.path.exists(output_path):
+                    output_sizes.append(os.path.getsize(output_path))
+                    os.remove(output_path)
+                    json_path = output_path.replace('.png', '.json')
+                    if os.path.exists(json_path):
+                        os.remove(json_path)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    def ms(value):
+        return round(value * 1000, 3) if value is not None else None
+
+    peak = peak_rss_bytes()
+    return {
+        'biz_type': biz_type,
+        'template': template_name,
+        'mode': mode,
+        'iterations': len(latencies),
+        'errors': errors[:5],
+        'error_count': len(errors),
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'min': ms(min(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 50)),
+            'p95': ms(percentile(latencies, 95)),
+            'p99': ms(percentile(latencies, 99)),
+            'max': ms(max(latencies)) if latencies else None,
+        },
+        'stages_ms': {
+            stage: ms(sum(samples) / len(samples)) if samples else None
+            for stage, samples in stage_samples.items()
+        },
+        'peak_rss_mb': round(peak / 1024 / 1024, 1) if peak else None,
+        'output_bytes': int(sum(output_sizes) / len(output_sizes)) if output_sizes else None,
+    }
+
+
+def _run_isolated(args):
+    """在独立子进程中执行，使峰值内存只反映单个模板"""
+    return benchmark_template(*args)
+
+
+def run_benchmarks(biz_types, modes, iterations, isolate=True, seed=0):
+    """执行全部基准测试"""
+    jobs = [(biz_type, mode, iterations, seed) for mode in modes for biz_type in biz_types]
+    if not isolate:
+        return [benchmark_template(*job) for job in jobs]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for job in jobs:
+        with context.Pool(1) as pool:
+            results.append(pool.apply(_run_isolated, (job,)))
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def build_report(results, iterations):
+    """生成机器可读的结果"""
+    try:
+        import PIL
+        pillow_version = PIL.__version__
+    except Exception:
+        pillow_version = None
+    return {
+        'meta': {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'pillow': pillow_version,
+            'platform': platform.platform(),
+            'iterations': iterations,
+        },
+        'results': results,
+    }
+
+
+def print_table(results):
+    """打印结果表格（耗时单位为毫秒）"""
+    header = f"{'Biz':<5}{'mode':<6}{'p50':>9}{'p95':>9}{'p99':>9}" + ''.join(f"{s:>9}" for s in STAGES)
+    header += f"{'RSS MB':>9}{'KB':>8}  template"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        prefix = f"{r['biz_type']:<5}{r['mode']:<6}"
+        if r['iterations'] == 0:
+            print(f"{prefix}失败: {r['errors'][0] if r['errors'] else '未知错误'}  {r['template']}")
+            continue
+        lat = r['latency_ms']
+        line = prefix + f"{lat['p50']:>9.1f}{lat['p95']:>9.1f}{lat['p99']:>9.1f}"
+        line += ''.join(f"{r['stages_ms'][s]:>9.1f}" for s in STAGES)
+        line += f"{r['peak_rss_mb'] or 0:>9.1f}{(r['output_bytes'] or 0) / 1024:>8.0f}  {r['template']}"
+        print(line)
+
+
+def compare(results, baseline_path, threshold):
+    """与历史结果比较，返回是否存在超过阈值的性能回退"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['biz_type'], r['mode']): r for r in json.load(f)['results']}
+
+    regressed = False
+    print(f"\n与基线比较: {baseline_path}（阈值 {threshold}%）")
+    for r in results:
+        base = baseline.get((r['biz_type'], r['mode']))
+        if not base or not base['latency_ms']['p50'] or not r['latency_ms']['p50']:
+            continue
+        deltas = []
+        for key in ('p50', 'p95'):
+            old, new = base['latency_ms'][key], r['latency_ms'][key]
+            change = (new - old) / old * 100
+            deltas.append(f"{key} {old:.1f} -> {new:.1f} ms ({change:+.1f}%)")
+            if change > threshold:
+                regressed = True
+        print(f"  {r['biz_type']:<5}{r['mode']:<6}" + '  '.join(deltas) + f"  {r['template']}")
+    return regressed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='凭证渲染性能基准测试')
+    parser.add_argument('-n', '--iterations', type=int, default=20, help='每个模板的渲染次数')
+    parser.add_argument('--mode', choices=['cold', 'warm', 'both'], default='both',
+                        help='cold: 每次清空模板缓存; warm: 预热后复用缓存')
+    parser.add_argument('--biz-type', type=int, action='append', help='只测试指定的BizType，可重复')
+    parser.add_argument('--no-isolate', action='store_true', help='在当前进程中运行（峰值内存为累计值）')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--output', help='将结果写入JSON文件')
+    parser.add_argument('--compare', help='与之前保存的JSON结果比较')
+    parser.add_argument('--threshold', type=float, default=10.0, help='判定为性能回退的延迟增幅（百分比）')
+    args = parser.parse_args()
+
+    biz_types = args.biz_type or sorted(TEMPLATE_MAPPING)
+    modes = ['cold', 'warm'] if args.mode == 'both' else [args.mode]
+
+    results = run_benchmarks(biz_types, modes, args.iterations, isolate=not args.no_isolate, seed=args.seed)
+    print_table(results)
+
+    report = build_report(results, args.iterations)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,7 +26,65 @@ class Config:
         SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{MYSQL_USERNAME}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}?charset=utf8mb4'
     else:
         # SQLite配置（默认）
-        SQLALCHEMY_DATABASE_URI = 'sqlite:///print_system.db'
+        SQLITE_DATABASE_PATH = os.environ.get('SQLITE_DATABASE_PATH', 'print_system.db')
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{SQLITE_DATABASE_PATH}'
+
+    # 登录用户缓存配置 - 多进程部署时各进程缓存独立，过期时间决定其他进程看到账号变更的最大延迟
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '10'))  # 秒，为0时关闭缓存
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '1024'))
+
+    # 学员数据源配置
+    STUDENT_SOURCE = os.environ.get('STUDENT_SOURCE', 'fixture').lower()  # fixture, sqlite 或 sql
+    STUDENT_DB_URI = os.environ.get('STUDENT_DB_URI', '')  # sql模式下学员系统数据库连接串
+    STUDENT_DB_POOL_SIZE = int(os.environ.get('STUDENT_DB_POOL_SIZE', '5'))
+    STUDENT_DB_MAX_OVERFLOW = int(os.environ.get('STUDENT_DB_MAX_OVERFLOW', '10'))
+    STUDENT_SQLITE_PATH = os.environ.get('STUDENT_SQLITE_PATH', 'students.db')
+    STUDENT_CACHE_TTL = int(os.environ.get('STUDENT_CACHE_TTL', '60'))  # 秒，为0时关闭缓存
+    STUDENT_CACHE_NEGATIVE_TTL = int(os.environ.get('STUDENT_CACHE_NEGATIVE_TTL', '10'))  # 未找到学员的缓存时间
+    STUDENT_CACHE_SIZE = int(os.environ.get('STUDENT_CACHE_SIZE', '10000'))
+    STUDENT_INDEX_REFRESH_INTERVAL = int(os.environ.get('STUDENT_INDEX_REFRESH_INTERVAL', '600'))  # 搜索索引重建间隔（秒），为0时只在启动时构建
+
+    # 打印日志归档配置
+    PRINT_LOG_RETENTION_DAYS = int(os.environ.get('PRINT_LOG_RETENTION_DAYS', '180'))  # 在线表保留天数
+    PRINT_LOG_ARCHIVE_MODE = os.environ.get('PRINT_LOG_ARCHIVE_MODE', 'jsonl').lower()  # jsonl 或 table
+    PRINT_LOG_ARCHIVE_DIR = os.environ.get('PRINT_LOG_ARCHIVE_DIR', 'archive')  # jsonl模式的归档目录
+    PRINT_LOG_EXPORT_BATCH_SIZE = int(os.environ.get('PRINT_LOG_EXPORT_BATCH_SIZE', '1000'))  # 导出时每批读取的行数
+
+    # 日志配置
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()  # DEBUG, INFO, WARNING, ERROR
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()  # text 或 json
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))  # 输出渲染调试日志的请求比例（需LOG_LEVEL=DEBUG）
+    LOG_FILE = os.environ.get('LOG_FILE', '')  # 日志文件，为空时输出到终端
+
+    # 打印输出归档配置
+    OUTPUT_ARCHIVE_ENABLED = os.environ.get('OUTPUT_ARCHIVE_ENABLED', 'false').lower() == 'true'  # 是否保存渲染结果
+    OUTPUT_DIR = os.environ.get('OUTPUT_DIR', 'image')
+    OUTPUT_MAX_MB = int(os.environ.get('OUTPUT_MAX_MB', '1024'))  # 输出目录最大占用空间（MB），为0时不限制
+    OUTPUT_MAX_AGE_DAYS = int(os.environ.get('OUTPUT_MAX_AGE_DAYS', '7'))  # 保存天数，为0时不限制
+    OUTPUT_SWEEP_INTERVAL = int(os.environ.get('OUTPUT_SWEEP_INTERVAL', '300'))  # 清理间隔（秒）
+
+    # 渲染请求合并配置
+    RENDER_LOCK_DIR = os.environ.get('RENDER_LOCK_DIR', '')  # 同一节点多个进程共用的锁文件目录，为空（默认）时只在进程内合并
+    RENDER_COALESCE_TIMEOUT = int(os.environ.get('RENDER_COALESCE_TIMEOUT', '30'))  # 等待其他线程或进程渲染的最长时间（秒）
+
+    # 多校区模板配置
+    DEFAULT_SCHOOL_ID = int(os.environ.get('DEFAULT_SCHOOL_ID', '35'))  # 打印数据中没有nSchoolId时使用的学校ID
+    TEMPLATE_SCHOOLS_DIR = os.environ.get('TEMPLATE_SCHOOLS_DIR', 'properties/schools')  # 各学校模板目录的上级目录，为空时全部使用默认模板
+    TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE', '32'))  # 最多缓存的已解析模板数
+    RENDER_BASE_CACHE_MB = int(os.environ.get('RENDER_BASE_CACHE_MB', '16'))  # 每个进程基础渲染缓存（不含打印时间的页面图像）的内存上限（MB），0为不缓存
+
+    # 渲染颜色模式：RGB（彩色）、L（灰度）或1（黑白），灰度和黑白模式占用内存和编码耗时更少
+    RENDER_COLOR_MODE = os.environ.get('RENDER_COLOR_MODE', 'RGB')
+
+    # 多联打印配置
+    COPY_LAYOUT = os.environ.get('COPY_LAYOUT', 'pdf')  # 打印数据PrintNumber大于1时的输出方式：pdf（多页PDF）或tile（各联拼接为一张图像）
+
+    # 渲染剖析配置
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')  # 剖析结果保存目录
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '50'))  # 最多保留的剖析结果数量
+
+    # 性能指标配置
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # /metrics 访问令牌，为空时不校验
 
 class DevelopmentConfig(Config):
     """开发环境配置"""
@@ -45,12 +45,16 @@ def create_mysql_database():
 def init_database():
     """初始化数据库表和数据"""
     try:
-        from app import app, db, create_admin_user
+        from app import app, db, create_admin_user, ensure_indexes
         
         with app.app_context():
             # 创建所有表
             db.create_all()
             print("✅ 数据库表创建成功")
+
+            # 升级前创建的表补建索引（create_all不会修改已有的表）
+            for name in ensure_indexes():
+                print(f"✅ 已创建索引 {name}")
             
             # 创建默认管理员账户
             create_admin_user()
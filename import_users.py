@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量导入用户脚本
+从CSV文件批量创建用户账号，CSV格式为每行 "用户名,密码"（密码可省略，省略时使用默认密码）
+首行为 username,password 表头时自动跳过
+"""
+
+import argparse
+import csv
+import sys
+
+def read_entries(csv_path):
+    """读取CSV文件，返回 (用户名, 密码) 列表"""
+    entries = []
+    # utf-8-sig 兼容Excel导出的带BOM文件
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for i, row in enumerate(csv.reader(f)):
+            if not row or not row[0].strip():
+                continue
+            if i == 0 and row[0].strip().lower() == 'username':
+                continue
+            password = row[1].strip() if len(row) > 1 else ''
+            entries.append((row[0].strip(), password))
+    return entries
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='从CSV文件批量创建用户')
+    parser.add_argument('csv_file', help='CSV文件路径，每行为 用户名,密码')
+    parser.add_argument('--role', choices=['user', 'admin'], default='user', help='用户角色，默认为普通用户')
+    parser.add_argument('--created-by', default='admin', help='记录为创建者的用户名，默认为admin')
+    parser.add_argument('--batch-size', type=int, default=200, help='每批插入的用户数')
+    parser.add_argument('--workers', type=int, default=None, help='计算密码哈希的线程数，默认为CPU核数')
+    parser.add_argument('--output', help='将创建成功的账号和密码写入此CSV文件')
+    args = parser.parse_args()
+
+    print("=" * 50)
+    print("南昌新东方凭证打印系统 - 批量导入用户")
+    print("=" * 50)
+
+    try:
+        entries = read_entries(args.csv_file)
+    except Exception as e:
+        print(f"❌ 读取CSV文件失败: {str(e)}")
+        sys.exit(1)
+    print(f"读取到 {len(entries)} 个用户")
+
+    from app import app, db, User
+    from utils import provision_users
+
+    try:
+        with app.app_context():
+            creator = User.query.filter_by(username=args.created_by).first()
+            created_users, errors = provision_users(
+                db, User, entries,
+                role=args.role,
+                created_by=creator.id if creator else None,
+                batch_size=args.batch_size,
+                workers=args.workers
+            )
+    except Exception as e:
+        print(f"❌ 导入失败: {str(e)}")
+        sys.exit(1)
+
+    for error in errors:
+        print(f"⚠️ {error}")
+
+    if args.output and created_users:
+        with open(args.output, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['username', 'password'])
+            for user in created_users:
+                writer.writerow([user['username'], user['password']])
+        print(f"账号信息已保存: {args.output}")
+
+    print(f"\n🎉 导入完成，成功创建 {len(created_users)} 个用户，跳过 {len(errors)} 个")
+
+if __name__ == "__main__":
+    main()
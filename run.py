@@ -6,12 +6,13 @@
 运行此脚本启动Web应用程序
 """
 
-from app import app, db, create_admin_user
+from app import app, db, create_admin_user, ensure_indexes
 
 if __name__ == '__main__':
     # 创建数据库表和默认管理员账户
     with app.app_context():
         db.create_all()
+        ensure_indexes()
         create_admin_user()
     
     print("=" * 50)
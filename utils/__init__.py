@@ -3,6 +3,37 @@
 Utils package for 南昌新东方凭证打印系统
 """
 
-from .print_simulator import ProofPrintSimulator, TEMPLATE_MAPPING
+from .print_simulator import (ProofPrintSimulator, TEMPLATE_MAPPING, clear_template_cache, template_version,
+                              template_registry, base_render_cache, normalize_print_data, VOLATILE_FIELDS)
+from .log_archiver import PrintLogArchiver
+from .log_export import PrintLogExporter
+from .user_provisioning import provision_users
+from .cache import TTLCache, LRUCache, SizedLRUCache
+from .text_measure import TextMeasurer, text_measurer
+from .template_expr import CompiledText, compile_text, format_value
+from .band_layout import iter_pages, count_pages
+from .components import FontSpec, TextComponent, ImageComponent, LineComponent
+from .template_registry import TemplateRegistry
+from .compiled_layout import LAYOUT_FORMAT, compile_layout, load_layout
+from .copy_output import copy_count, copy_labels, tile_copies, copies_pdf
+from .student_source import (StudentDataSource, FixtureStudentSource, SqlStudentSource,
+                             SqliteStudentSource, CachedStudentSource, create_student_source)
+from .student_index import StudentSearchIndex
+from .profiling import RenderProfiler
+from .render_coalescing import SingleFlight, RenderCoalescer, RenderResult, render_key
+from .async_render import AsyncPrintRenderer
+from .output_store import (OutputStore, NullOutputStore, DirectoryOutputStore, ArchivingOutputStore,
+                           create_output_store)
+from . import metrics, logging_setup
 
-__all__ = ['ProofPrintSimulator', 'TEMPLATE_MAPPING'] 
\ No newline at end of file
+__all__ = ['ProofPrintSimulator', 'TEMPLATE_MAPPING', 'clear_template_cache', 'template_version',
+           'template_registry', 'TemplateRegistry', 'base_render_cache', 'normalize_print_data', 'VOLATILE_FIELDS',
+           'PrintLogArchiver', 'PrintLogExporter', 'provision_users', 'TTLCache', 'LRUCache', 'SizedLRUCache', 'TextMeasurer', 'text_measurer',
+           'CompiledText', 'compile_text', 'format_value', 'iter_pages', 'count_pages',
+           'FontSpec', 'TextComponent', 'ImageComponent', 'LineComponent', 'LAYOUT_FORMAT', 'compile_layout', 'load_layout',
+           'copy_count', 'copy_labels', 'tile_copies', 'copies_pdf',
+           'StudentDataSource', 'FixtureStudentSource', 'SqlStudentSource', 'SqliteStudentSource',
+           'CachedStudentSource', 'create_student_source', 'StudentSearchIndex', 'RenderProfiler',
+           'SingleFlight', 'RenderCoalescer', 'RenderResult', 'render_key', 'AsyncPrintRenderer',
+           'OutputStore', 'NullOutputStore', 'DirectoryOutputStore', 'ArchivingOutputStore', 'create_output_store',
+           'metrics', 'logging_setup'] 
\ No newline at end of file
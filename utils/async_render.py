@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+异步渲染接口
+供基于asyncio的打印网关使用：渲染在线程池中进行，不阻塞事件循环，可以用asyncio.gather同时处理多个打印消息
+
+- 并发限制：同时进行的渲染不超过max_concurrency个，其余请求在信号量上等待
+- 超时和取消：等待超时或调用方取消时立即抛出，正在进行的渲染在开始下一页之前停止；
+  并发名额在渲染线程真正结束后才归还，取消的请求不会使实际渲染数超过限制
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .print_simulator import ProofPrintSimulator, RenderCancelled
+from .render_coalescing import RenderResult
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPrintRenderer:
+    """
+    asyncio渲染器
+
+    max_concurrency: 同时进行的最大渲染数
+    timeout: 默认超时时间（秒），为空时不限制
+    executor: 执行渲染的线程池，为空时创建max_concurrency个线程的线程池（close时关闭）
+    simulator_factory: 创建渲染器的函数，每次渲染使用一个新的ProofPrintSimulator
+    """
+
+    def __init__(self, max_concurrency=4, timeout=None, executor=None, simulator_factory=ProofPrintSimulator):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_concurrency,
+                                                        thread_name_prefix='print-render')
+        self._simulator_factory = simulator_factory
+        # 信号量绑定创建时的事件循环，换用新的事件循环时重新创建
+        self._loop = None
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def render(self, message, timeout=None):
+        """
+        渲染一个打印消息，返回RenderResult，渲染失败时返回None
+
+        超过timeout秒（为空时使用默认超时）抛出asyncio.TimeoutError；等待信号量的时间也计入超时
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return await asyncio.wait_for(self._render(message), timeout)
+
+    async def _render(self, message):
+        semaphore = self._get_semaphore()
+        await semaphore.acquire()
+        simulator = self._simulator_factory()
+        cancel = threading.Event()
+        try:
+            task = asyncio.ensure_future(simulator.process_print_request_async(message, self._executor, cancel))
+        except BaseException:
+            semaphore.release()
+            raise
+        task.add_done_callback(lambda done: self._finished(done, semaphore))
+        try:
+            # shield使超时或取消只影响等待方，渲染线程结束后才归还并发名额
+            output = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+        if not output or not simulator.last_image:
+            return None
+        return RenderResult(output, simulator.last_pages, simulator.last_cache_hit, simulator.last_document)
+
+    @staticmethod
+    def _finished(task, semaphore):
+        semaphore.release()
+        if not task.cancelled() and isinstance(task.exception(), RenderCancelled):
+            logger.info("渲染已取消")
+
+    async def render_many(self, messages, timeout=None, return_exceptions=True):
+        """
+        同时渲染多个打印消息，按消息顺序返回结果列表
+
+        return_exceptions为True时，超时或出错的消息对应的结果为异常对象，不影响其他消息
+        """
+        return await asyncio.gather(*(self.render(message, timeout) for message in messages),
+                                    return_exceptions=return_exceptions)
+
+    def close(self):
+        """关闭自行创建的线程池，等待正在进行的渲染结束"""
+        if self._own_executor:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+带区（Band）排版
+模板中的组件按带区组织：HeaderBand（表头）、DataBand（数据行）、FooterBand（表尾）、
+PageHeaderBand/PageFooterBand（页眉/页脚），带区内组件的位置相对于带区左上角
+
+排版时带区从上到下依次排列，DataBand对绑定的数据列表逐行重复，当前页放不下时换页，
+新页面先重复该数据带区的表头；页面以生成器逐页产出，调用方处理完一页再排下一页，
+数据行也是逐行读取，内存占用与数据行数无关
+
+位置和高度的单位均为厘米，与模板一致
+"""
+
+from collections import namedtuple
+from collections.abc import Iterable, Mapping, Sized
+
+from .template_expr import resolve_field
+
+# 每页都出现在固定位置的带区
+PAGE_HEADER_BAND = 'PageHeaderBand'
+PAGE_FOOTER_BAND = 'PageFooterBand'
+
+# 排版结果：components 放置在距页面顶部 top 厘米处，字段从 data 中取值
+Placement = namedtuple('Placement', ['components', 'top', 'data'])
+# 一页的排版结果，total 为总页数（数据行数未知时为None）
+Page = namedtuple('Page', ['number', 'total', 'placements'])
+
+
+def page_variables(number, total):
+    """页码相关的系统变量，如 {PageNofM}"""
+    return {
+        'PageNumber': number,
+        'TotalPageCount': total if total is not None else '',
+        'PageNofM': f"第{number}页/共{total}页" if total is not None else f"第{number}页",
+    }
+
+
+class RowData(Mapping):
+    """
+    数据带区中一行的字段视图
+
+    data_path 下的字段（如 ClassAndCardArray.sClassName）从当前行取值，
+    页码等系统变量从 variables 取值，其余字段从整份数据取值
+    """
+
+    def __init__(self, data, data_path=None, row=None, variables=None):
+        self._data = data
+        self._prefix = data_path + '.' if data_path else None
+        self._path = data_path
+        self._row = row
+        self._variables = variables or {}
+
+    def __getitem__(self, key):
+        if key in self._variables:
+            return self._variables[key]
+        if self._row is not None:
+            if key == self._path:
+                return self._row
+            if key.startswith(self._prefix) and isinstance(self._row, Mapping):
+                # 当前行没有的字段为空，不使用整份数据中的同名扁平键
+                value = resolve_field(self._row, key[len(self._prefix):])
+                if value is None:
+                    raise KeyError(key)
+                return value
+        return self._data[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def band_rows(band, data):
+    """
+    数据带区要重复的数据行
+
+    绑定到数据列表（如 ClassAndCardArray）时逐行返回；绑定到根数据、或数据中没有对应列表时
+    只有一行（返回 [None]），字段按原样从整份数据中取值
+    """
+    path = band.get('data_path')
+    if not path:
+        return [None]
+    rows = resolve_field(data, path)
+    if rows is None or isinstance(rows, (str, bytes, Mapping)) or not isinstance(rows, Iterable):
+        return [None]
+    return rows
+
+
+class _PageBuilder:
+    """逐页收集带区，记录当前页已用到的高度"""
+
+    def __init__(self, mrt_parser, data, total):
+        self.parser = mrt_parser
+        self.data = data
+        self.total = total
+        bands = mrt_parser.bands
+        self.page_headers = [b for b in bands if b['type'] == PAGE_HEADER_BAND]
+        self.page_footers = [b for b in bands if b['type'] == PAGE_FOOTER_BAND]
+        flow = [b for b in bands if b['type'] not in (PAGE_HEADER_BAND, PAGE_FOOTER_BAND)]
+        self.flow = flow
+        # 页脚固定在页面内容区底部，其余带区只能排到页脚上方
+        footer_height = sum(b['height'] for b in self.page_footers)
+        self.limit = mrt_parser.page_content_height - footer_height
+        self.start = flow[0]['top'] if flow else 0
+        self.number = 0
+        self._new_page()
+
+    def _new_page(self):
+        self.number += 1
+        self.variables = page_variables(self.number, self.total)
+        self.placements = [Placement(self.parser.page_components, 0,
+                                     RowData(self.data, variables=self.variables))]
+        for band in self.page_headers:
+            self.placements.append(Placement(band['components'], band['top'],
+                                             RowData(self.data, variables=self.variables)))
+        self.y = self.start
+        self.empty = True
+
+    def fits(self, band):
+        # 空白页上总能放下一个带区，避免超过整页高度的带区导致无限换页
+        return self.empty or self.y + band['height'] <= self.limit + 1e-6
+
+    def place(self, band, row=None):
+        self.placements.append(Placement(band['components'], self.y,
+                                         RowData(self.data, band.get('data_path'), row, self.variables)))
+        self.y += band['height']
+        self.empty = False
+
+    def finish(self):
+        """结束当前页，返回该页的排版结果并开始新页面"""
+        top = self.limit
+        for band in self.page_footers:
+            self.placements.append(Placement(band['components'], top,
+                                             RowData(self.data, variables=self.variables)))
+            top += band['height']
+        page = Page(self.number, self.total, self.placements)
+        self._new_page()
+        return page
+
+
+def _paginate(mrt_parser, data, total=None):
+    builder = _PageBuilder(mrt_parser, data, total)
+    header = None
+    for band in builder.flow:
+        if band['type'] == 'DataBand':
+            for row in band_rows(band, data):
+                if not builder.fits(band):
+                    yield builder.finish()
+                    # 换页后先重复表头
+                    if header is not None:
+                        builder.place(header)
+                builder.place(band, row)
+            header = None
+            continue
+
+        if not builder.fits(band):
+            yield builder.finish()
+        builder.place(band)
+        # 表头属于紧随其后的数据带区
+        header = band if band['type'] == 'HeaderBand' else None
+    yield builder.finish()
+
+
+def count_pages(mrt_parser, data):
+    """总页数，数据行为迭代器等无法预先计算时返回None"""
+    if not mrt_parser.bands:
+        return 1
+    for band in mrt_parser.bands:
+        if band['type'] == 'DataBand' and not isinstance(band_rows(band, data), Sized):
+            return None
+    return sum(1 for _ in _paginate(mrt_parser, data))
+
+
+def iter_pages(mrt_parser, data):
+    """
+    逐页产出排版结果（Page）
+
+    模板没有带区时只有一页，包含全部组件；有带区时按数据行分页
+    """
+    if not mrt_parser.bands:
+        yield Page(1, 1, [Placement(mrt_parser.page_components, 0, data)])
+        return
+    yield from _paginate(mrt_parser, data, count_pages(mrt_parser, data))
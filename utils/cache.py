@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+通用缓存工具
+线程安全、容量有限的LRU缓存，以及带过期时间的版本
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """带过期时间的LRU缓存"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        """
+        maxsize: 最多缓存的条目数，超出时淘汰最久未使用的条目
+        ttl: 条目有效期（秒），为0时不缓存任何内容
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """获取缓存值，不存在或已过期时返回default"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """写入缓存值，ttl为空时使用默认有效期"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """删除指定的缓存条目"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LRUCache:
+    """不过期的LRU缓存，适合缓存由输入唯一确定的计算结果"""
+
+    def __init__(self, maxsize=1024):
+        """maxsize: 最多缓存的条目数，超出时淘汰最久未使用的条目"""
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """获取缓存值，不存在时返回default"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_many(self, keys):
+        """批量获取，返回 {key: value}，只包含已缓存的键"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                try:
+                    found[key] = self._data[key]
+                except KeyError:
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                self.hits += 1
+        return found
+
+    def set(self, key, value):
+        """写入缓存值"""
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        """批量写入缓存值"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SizedLRUCache(LRUCache):
+    """
+    按总大小限制的LRU缓存，适合缓存大小差别很大的对象（如图像）
+
+    max_bytes: 缓存值的总大小上限（字节），超出时淘汰最久未使用的条目，为0时不缓存任何内容
+    sizeof: 计算缓存值大小（字节）的函数；单个值超过max_bytes时不缓存
+    """
+
+    def __init__(self, max_bytes, sizeof):
+        super().__init__(maxsize=max_bytes)
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._sizes = {}
+
+    def set_many(self, items):
+        """批量写入缓存值"""
+        if self.max_bytes <= 0:
+            return
+        sizes = {key: self.sizeof(value) for key, value in items.items()}
+        with self._lock:
+            for key, value in items.items():
+                old_size = self._sizes.pop(key, None)
+                if old_size is not None:
+                    del self._data[key]
+                    self.bytes -= old_size
+                if sizes[key] > self.max_bytes:
+                    continue
+                self._data[key] = value
+                self._sizes[key] = sizes[key]
+                self.bytes += sizes[key]
+            while self.bytes > self.max_bytes:
+                key, _ = self._data.popitem(last=False)
+                self.bytes -= self._sizes.pop(key)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.bytes = 0
+            self.hits = self.misses = 0
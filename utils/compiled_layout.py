@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板编译布局
+把解析后的模板（MrtParser）转换为可序列化的布局描述，供浏览器在canvas上绘制打印预览：
+页面尺寸和居中偏移、组件位置（厘米）、字体和渲染字号、静态图像、文本的字面片段和数据字段、
+带区及其绑定的数据列表；字段替换、金额格式化和带区分页由浏览器按同样的规则完成
+
+布局只与模板有关，与学员数据无关，模板文件不变时可以一直缓存
+"""
+
+from .print_simulator import (PIXELS_PER_CM, BOLD_KEYWORDS, BOLD_KEYWORD_GROUPS, BOLD_FONT_SIZE, FOOTER_FONT_SIZE,
+                              template_registry, font_pixel_size, page_offsets, print_time_position)
+
+# 布局格式版本，格式变化时递增，浏览器据此判断能否绘制
+LAYOUT_FORMAT = 2
+
+# Base64编码的图像开头与图像类型的对应关系
+_IMAGE_SIGNATURES = (
+    ('iVBORw0KGgo', 'image/png'),
+    ('/9j/', 'image/jpeg'),
+    ('R0lGOD', 'image/gif'),
+    ('Qk', 'image/bmp'),
+)
+
+
+def _image_source(image_data):
+    """模板中的Base64图像转换为data URL，无法识别的格式返回None"""
+    if not image_data:
+        return None
+    data = image_data.strip()
+    for prefix, mime_type in _IMAGE_SIGNATURES:
+        if data.startswith(prefix):
+            return f"data:{mime_type};base64,{data}"
+    return None
+
+
+def _segments(expr):
+    """编译后的文本拆分为片段：字面文本为字符串，数据字段为 {"field": 路径}"""
+    return [part if isinstance(part, str) else {'field': part[0]} for part in expr.parts]
+
+
+def _components(components):
+    """可绘制的组件：位置或尺寸无效的组件服务器渲染时不绘制，布局中同样省略"""
+    return [_component(c) for c in components if c.valid]
+
+
+def _component(component):
+    result = component.to_dict()
+    if component.type == 'Text':
+        result.update({
+            'segments': _segments(component.expr),
+            'format': component.text_format,
+            'font_px': font_pixel_size(component.font.size, False),
+            'bold_font_px': font_pixel_size(component.font.size, True),
+        })
+    elif component.type == 'Image':
+        result['src'] = _image_source(component.image_data)
+    return result
+
+
+def compile_layout(mrt_parser):
+    """生成模板的布局描述（可直接序列化为JSON）"""
+    width, height = mrt_parser.page_settings['width'], mrt_parser.page_settings['height']
+    offset_x, offset_y = page_offsets(width)
+    print_time = None
+    if not mrt_parser.has_print_time:
+        x, y = print_time_position(width, height)
+        print_time = {'x': x, 'y': y, 'font_px': FOOTER_FONT_SIZE}
+    return {
+        'format': LAYOUT_FORMAT,
+        'page': {
+            'width': width,
+            'height': height,
+            'offset_x': offset_x,
+            'offset_y': offset_y,
+            'pixels_per_cm': PIXELS_PER_CM,
+            'content_height': mrt_parser.page_content_height,
+        },
+        'text_rules': {
+            'bold_keywords': list(BOLD_KEYWORDS),
+            'bold_keyword_groups': [list(group) for group in BOLD_KEYWORD_GROUPS],
+            'bold_font_size': BOLD_FONT_SIZE,
+        },
+        'print_time': print_time,
+        'components': _components(mrt_parser.page_components),
+        'bands': [{
+            'type': band['type'],
+            'name': band['name'],
+            'top': band['top'],
+            'height': band['height'],
+            'data_path': band.get('data_path'),
+            'components': _components(band['components']),
+        } for band in mrt_parser.bands],
+    }
+
+
+def load_layout(biz_type, school_id=None):
+    """学校和BizType对应模板的布局描述（学校没有该模板时使用默认模板），模板不存在时返回None"""
+    loaded = template_registry.load(school_id, biz_type)
+    if loaded is None:
+        return None
+    mrt_parser, _ = loaded
+    return compile_layout(mrt_parser)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板组件模型
+MrtParser解析出的组件使用带 __slots__ 的类表示，位置和尺寸在解析时就转换为数值（厘米），
+渲染时直接读取属性，不再每次拆分 ClientRectangle 字符串和查找字典键；
+模板缓存中的每个组件也比同样内容的字典占用更少内存
+"""
+
+
+def parse_rect(rect):
+    """解析 ClientRectangle（如 "2.4,0.4,7,0.4"），返回 (x, y, width, height)，格式错误时返回None"""
+    if not rect:
+        return None
+    parts = rect.split(',')
+    if len(parts) < 4:
+        return None
+    try:
+        return tuple(float(part) for part in parts[:4])
+    except ValueError:
+        return None
+
+
+class FontSpec:
+    """字体信息，size为模板中的字号（磅）"""
+
+    __slots__ = ('name', 'size', 'bold')
+
+    def __init__(self, name='Arial', size=9, bold=False):
+        self.name = name
+        self.size = size
+        self.bold = bold
+
+    def to_dict(self):
+        return {'name': self.name, 'size': self.size, 'bold': self.bold}
+
+    def __repr__(self):
+        return f"FontSpec({self.name!r}, {self.size}, bold={self.bold})"
+
+
+class Component:
+    """
+    组件基类
+
+    x, y, width, height 为相对于页面（或所在带区）的位置和尺寸，单位厘米；
+    ClientRectangle 缺失时使用各类型的默认值，格式错误时 valid 为False，渲染时跳过
+    """
+
+    __slots__ = ('name', 'x', 'y', 'width', 'height', 'valid')
+
+    type = None
+    # ClientRectangle 为空时使用的默认值
+    default_rect = (0.0, 0.0, 1.0, 1.0)
+
+    def __init__(self, name='', rect=None):
+        self.name = name or ''
+        geometry = parse_rect(rect) if rect else self.default_rect
+        self.valid = geometry is not None
+        self.x, self.y, self.width, self.height = geometry or (0.0, 0.0, 0.0, 0.0)
+
+    def to_dict(self):
+        """转换为可序列化的字典"""
+        return {'type': self.type, 'name': self.name, 'x': self.x, 'y': self.y,
+                'width': self.width, 'height': self.height}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, {self.x}, {self.y}, {self.width}, {self.height})"
+
+
+class TextComponent(Component):
+    """
+    文本组件，expr为编译后的文本表达式（见utils.template_expr）
+
+    volatile为True时文本只引用每次打印都会变化的字段（如打印时间），在叠加层中绘制
+    """
+
+    __slots__ = ('text', 'data_type', 'font', 'alignment', 'text_format', 'expr', 'volatile')
+
+    type = 'Text'
+
+    def __init__(self, name='', rect=None, text='', data_type='', font=None, alignment='Left',
+                 text_format=None):
+        super().__init__(name, rect)
+        self.text = text
+        self.data_type = data_type
+        self.font = font or FontSpec()
+        self.alignment = alignment or 'Left'
+        self.text_format = text_format
+        self.expr = None
+        self.volatile = False
+
+    def to_dict(self):
+        result = super().to_dict()
+        result.update({'text': self.text, 'font': self.font.to_dict(), 'alignment': self.alignment})
+        return result
+
+
+class ImageComponent(Component):
+    """图像组件，image_data为Base64编码的图像"""
+
+    __slots__ = ('image_data',)
+
+    type = 'Image'
+
+    def __init__(self, name='', rect=None, image_data=''):
+        super().__init__(name, rect)
+        self.image_data = image_data
+
+    def to_dict(self):
+        result = super().to_dict()
+        result['has_image'] = bool(self.image_data)
+        return result
+
+
+class LineComponent(Component):
+    """线条组件，宽大于高时为水平线，否则为垂直线"""
+
+    __slots__ = ('color',)
+
+    type = 'Line'
+    default_rect = (0.0, 0.0, 1.0, 0.01)
+
+    def __init__(self, name='', rect=None, color='Black'):
+        super().__init__(name, rect)
+        self.color = color or 'Black'
+
+    @property
+    def draw_color(self):
+        """绘制使用的颜色：灰色系的线条画为灰色，其余一律为黑色"""
+        return 'gray' if self.color.lower() in ('dimgray', 'gray') else 'black'
+
+    def to_dict(self):
+        result = super().to_dict()
+        result.update({'color': self.color, 'draw_color': self.draw_color})
+        return result
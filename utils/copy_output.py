@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多联打印输出
+打印数据的PrintNumber（或消息的DefaultPrintNumber）大于1时，凭证只渲染一次，按联数复制到输出中：
+- pdf: 多页PDF，每联每页一页；各页的渲染结果在PDF中只保存一份，由各联的页面共同引用，
+       直接使用已编码的PNG数据，不重新压缩
+- tile: 各联上下拼接为一张图像，每页一张
+
+每联右上角叠加一个小的联次标签（如“学员联”“学校联”），标签图像按文字缓存，不重新渲染凭证
+"""
+
+import io
+import logging
+import struct
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# 一次打印的最大联数，超过时按最大联数输出
+MAX_COPIES = 10
+# 各联的默认标签，联数超过标签数时依次为“第N联”
+DEFAULT_COPY_LABELS = ('学员联', '学校联', '存根联')
+COPY_LAYOUTS = ('pdf', 'tile')
+LABEL_FONT_SIZE = 28
+# 标签距页面右边缘和上边缘的距离（像素）
+LABEL_MARGIN_RIGHT = 40
+LABEL_MARGIN_TOP = 10
+_LABEL_PADDING = 8
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# PNG颜色类型与PDF颜色空间的对应关系：灰度、RGB，以及可以原样写入的位深
+_PNG_COLOR_SPACES = {0: (b'/DeviceGray', 1, (1, 8)), 2: (b'/DeviceRGB', 3, (8,))}
+
+
+def copy_count(data, default=1, max_copies=MAX_COPIES):
+    """联数：优先使用打印数据的PrintNumber，其次为default，均无效时为1，最多max_copies"""
+    for value in (data.get('PrintNumber'), default):
+        try:
+            copies = int(value)
+        except (TypeError, ValueError):
+            continue
+        if copies >= 1:
+            return min(copies, max_copies)
+    return 1
+
+
+def copy_labels(copies, labels=None):
+    """各联的标签文字，labels为空或不足时使用默认标签和“第N联”"""
+    labels = list(labels or DEFAULT_COPY_LABELS)
+    return [labels[i] if i < len(labels) and labels[i] else f"第{i + 1}联" for i in range(copies)]
+
+
+@lru_cache(maxsize=64)
+def label_image(text, font_path=None, size=LABEL_FONT_SIZE):
+    """
+    联次标签图像（灰度，白底黑字带边框）
+
+    结果被缓存并在各次打印之间共用，调用方不能修改返回的图像
+    """
+    font = None
+    if font_path:
+        try:
+            font = ImageFont.truetype(font_path, size)
+        except OSError:
+            logger.warning("无法加载标签字体 %s", font_path)
+    font = font or ImageFont.load_default()
+    left, top, right, bottom = font.getbbox(text)
+    width = right - left + _LABEL_PADDING * 2
+    height = bottom - top + _LABEL_PADDING * 2
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width - 1, height - 1], outline=0, width=2)
+    draw.text((_LABEL_PADDING - left, _LABEL_PADDING - top), text, fill=0, font=font)
+    return image
+
+
+def label_position(page_width, label):
+    """标签在页面上的位置（左上角像素坐标）"""
+    return page_width - label.width - LABEL_MARGIN_RIGHT, LABEL_MARGIN_TOP
+
+
+def tile_copies(image, labels):
+    """把一页的各联上下拼接为一张图像（颜色模式与image相同），labels为各联的标签图像"""
+    width, height = image.size
+    sheet = Image.new(image.mode, (width, height * len(labels)), 'white')
+    for index, label in enumerate(labels):
+        top = height * index
+        sheet.paste(image, (0, top))
+        x, y = label_position(width, label)
+        sheet.paste(label.convert(image.mode, dither=Image.Dither.NONE), (x, top + y))
+    return sheet
+
+
+def _png_image(png_bytes):
+    """
+    读取PNG的尺寸和压缩数据，返回 (宽, 高, 颜色空间, 每像素分量数, 位深, 压缩数据)
+
+    非隔行的灰度（1位或8位）或8位RGB图像的IDAT数据就是PDF的FlateDecode数据（配合PNG预测器），
+    可以原样写入PDF；其他格式返回None
+    """
+    if png_bytes[:8] != _PNG_SIGNATURE:
+        return None
+    header = None
+    chunks = []
+    pos = 8
+    while pos + 8 <= len(png_bytes):
+        length, kind = struct.unpack('>I4s', png_bytes[pos:pos + 8])
+        chunk = png_bytes[pos + 8:pos + 8 + length]
+        if kind == b'IHDR':
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif kind == b'IDAT':
+            chunks.append(chunk)
+        elif kind == b'IEND':
+            break
+        pos += length + 12
+    if header is None:
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if interlace or color_type not in _PNG_COLOR_SPACES:
+        return None
+    color_space, colors, bit_depths = _PNG_COLOR_SPACES[color_type]
+    if bit_depth not in bit_depths:
+        return None
+    return width, height, color_space, colors, bit_depth, b''.join(chunks)
+
+
+def _encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class _PdfWriter:
+    """最小的PDF写入器，对象按添加顺序编号（从1开始）"""
+
+    def __init__(self):
+        self.objects = []
+
+    def reserve(self):
+        """预留一个对象编号，稍后用set写入内容"""
+        self.objects.append(None)
+        return len(self.objects)
+
+    def set(self, number, body):
+        self.objects[number - 1] = body
+
+    def add(self, body):
+        self.objects.append(body)
+        return len(self.objects)
+
+    def add_stream(self, dictionary, data):
+        return self.add(b'<<' + dictionary + b' /Length %d>>\nstream\n' % len(data) + data + b'\nendstream')
+
+    def add_image(self, png_bytes):
+        """把PNG图像作为图像对象写入，返回 (对象编号, 宽, 高)"""
+        parsed = _png_image(png_bytes)
+        if parsed is None:
+            # 调色板、16位等格式先转换为RGB
+            with Image.open(io.BytesIO(png_bytes)) as image:
+                parsed = _png_image(_encode_png(image.convert('RGB')))
+        width, height, color_space, colors, bits, data = parsed
+        dictionary = (b'/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent %d'
+                      b' /Filter /FlateDecode /DecodeParms <</Predictor 15 /Colors %d /BitsPerComponent %d'
+                      b' /Columns %d>>' % (width, height, color_space, bits, colors, bits, width))
+        return self.add_stream(dictionary, data), width, height
+
+    def tobytes(self, root):
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(self.objects, 1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(self.objects) + 1)
+        for offset in offsets:
+            out += b'%010d 00000 n \n' % offset
+        out += b'trailer\n<</Size %d /Root %d 0 R>>\nstartxref\n%d\n%%%%EOF\n' % (
+            len(self.objects) + 1, root, xref)
+        return bytes(out)
+
+
+def _points(pixels, dpi):
+    return b'%.2f' % (pixels * 72.0 / dpi)
+
+
+def copies_pdf(pages, labels, dpi=200):
+    """
+    生成多联PDF：pages为各页的PNG数据，labels为各联的标签图像（为空时只有一联、不加标签）
+
+    页面顺序为逐联排列（第1联的各页，第2联的各页……）；各页图像和各标签图像在文件中只保存一份
+    """
+    writer = _PdfWriter()
+    catalog = writer.reserve()
+    pages_number = writer.reserve()
+    writer.set(catalog, b'<</Type /Catalog /Pages %d 0 R>>' % pages_number)
+
+    images = [writer.add_image(page) for page in pages]
+    label_objects = {}
+    for label in labels or ():
+        if id(label) not in label_objects:
+            label_objects[id(label)] = writer.add_image(_encode_png(label))
+
+    kids = []
+    for label in labels or (None,):
+        for image_number, width, height in images:
+            page_width, page_height = _points(width, dpi), _points(height, dpi)
+            content = b'q %s 0 0 %s 0 0 cm /P Do Q' % (page_width, page_height)
+            resources = b'/P %d 0 R' % image_number
+            if label is not None:
+                label_number, label_width, label_height = label_objects[id(label)]
+                x, y = label_position(width, label)
+                # PDF坐标原点在左下角
+                content += b'\nq %s 0 0 %s %s %s cm /L Do Q' % (
+                    _points(label_width, dpi), _points(label_height, dpi),
+                    _points(x, dpi), _points(height - y - label_height, dpi))
+                resources += b' /L %d 0 R' % label_number
+            content_number = writer.add_stream(b'', content)
+            kids.append(writer.add(
+                b'<</Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Resources <</XObject <<%s>>>>'
+                b' /Contents %d 0 R>>' % (pages_number, page_width, page_height, resources, content_number)))
+
+    writer.set(pages_number, b'<</Type /Pages /Kids [%s] /Count %d>>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)))
+    return writer.tobytes(catalog)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+打印日志归档模块
+将超过保留期限的PrintLog记录从在线表迁移到归档存储（按月分区表或压缩JSONL文件），
+归档后的数据仍可通过查询接口检索和补打
+"""
+
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, inspect
+
+# 归档记录中的时间格式
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 按月分区表的表名前缀，例如 print_log_archive_202506
+ARCHIVE_TABLE_PREFIX = "print_log_archive_"
+
+# 归档记录包含的字段，与PrintLog模型保持一致
+ARCHIVE_FIELDS = ['id', 'user_id', 'student_code', 'student_name', 'biz_type',
+                  'biz_name', 'print_time', 'print_data']
+
+
+class PrintLogArchiver:
+    """打印日志归档器"""
+
+    def __init__(self, db, model, archive_dir, mode='jsonl', batch_size=500):
+        """
+        初始化归档器
+
+        db: Flask-SQLAlchemy实例
+        model: PrintLog模型类
+        archive_dir: JSONL归档文件的存放目录
+        mode: 'jsonl'（压缩文件）或 'table'（按月分区表）
+        batch_size: 每批迁移的记录数，避免长事务锁表
+        """
+        if mode not in ('jsonl', 'table'):
+            raise ValueError(f"不支持的归档模式: {mode}")
+        self.db = db
+        self.model = model
+        self.archive_dir = archive_dir
+        self.mode = mode
+        self.batch_size = batch_size
+        self.index_path = os.path.join(self.archive_dir, 'index.json')
+        self._lock = threading.Lock()
+        self._metadata = MetaData()
+        self._tables = {}
+
+    # ------------------------------------------------------------------
+    # 归档
+    # ------------------------------------------------------------------
+    def archive(self, retention_days):
+        """归档早于保留期限的记录，返回按月统计的迁移条数"""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        return self.archive_before(cutoff)
+
+    def archive_before(self, cutoff):
+        """归档print_time早于cutoff的记录"""
+        summary = {}
+        with self._lock:
+            while True:
+                rows = (self.model.query
+                        .filter(self.model.print_time < cutoff)
+                        .order_by(self.model.id)
+                        .limit(self.batch_size)
+                        .all())
+                if not rows:
+                    break
+
+                # 按月份分组，每个月份写入各自的分区
+                by_month = {}
+                for row in rows:
+                    record = self._row_to_record(row)
+                    by_month.setdefault(self._month_key(row.print_time), []).append(record)
+
+                try:
+                    if self.mode == 'table':
+                        # 先建表再写入，MySQL的DDL会隐式提交事务
+                        for month in by_month:
+                            self._archive_table(month)
+                    for month, records in by_month.items():
+                        if self.mode == 'table':
+                            self._write_table(month, records)
+                        else:
+                            self._write_jsonl(month, records)
+                        summary[month] = summary.get(month, 0) + len(records)
+
+                    # 写入归档成功后再删除在线记录
+                    ids = [row.id for row in rows]
+                    self.model.query.filter(self.model.id.in_(ids)).delete(synchronize_session=False)
+                    self.db.session.commit()
+                except Exception:
+                    self.db.session.rollback()
+                    raise
+
+        return summary
+
+    def _row_to_record(self, row):
+        """将模型实例转换为可序列化的字典"""
+        record = {field: getattr(row, field) for field in ARCHIVE_FIELDS}
+        if record['print_time'] is not None:
+            record['print_time'] = record['print_time'].strftime(TIME_FORMAT)
+        return record
+
+    @staticmethod
+    def _month_key(value):
+        """获取记录所属月份，格式为 YYYY-MM"""
+        return (value or datetime.utcnow()).strftime("%Y-%m")
+
+    # ------------------------------------------------------------------
+    # JSONL 文件存储
+    # ------------------------------------------------------------------
+    def _jsonl_path(self, month):
+        return os.path.join(self.archive_dir, f"print_logs_{month}.jsonl.gz")
+
+    def _write_jsonl(self, month, records):
+        """以追加方式写入压缩JSONL文件（每次追加一个gzip成员）"""
+        if not os.path.exists(self.archive_dir):
+            os.makedirs(self.archive_dir)
+
+        with gzip.open(self._jsonl_path(month), 'at', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write('\n')
+
+        # 更新月份索引，按ID查询时只需打开一个文件
+        index = self._load_index()
+        entry = index.get(month, {'min_id': None, 'max_id': None, 'count': 0})
+        ids = [record['id'] for record in records]
+        entry['min_id'] = min(ids) if entry['min_id'] is None else min(entry['min_id'], min(ids))
+        entry['max_id'] = max(ids) if entry['max_id'] is None else max(entry['max_id'], max(ids))
+        entry['count'] += len(records)
+        index[month] = entry
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _iter_jsonl(self, month):
+        path = self._jsonl_path(month)
+        if not os.path.exists(path):
+            return
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    # ------------------------------------------------------------------
+    # 按月分区表存储
+    # ------------------------------------------------------------------
+    def _archive_table(self, month):
+        """获取（必要时创建）指定月份的归档表"""
+        name = ARCHIVE_TABLE_PREFIX + month.replace('-', '')
+        table = self._tables.get(name)
+        if table is None:
+            table = Table(
+                name, self._metadata,
+                Column('id', Integer, primary_key=True, autoincrement=False),
+                Column('user_id', Integer, nullable=False, index=True),
+                Column('student_code', String(50), nullable=False, index=True),
+                Column('student_name', String(100), nullable=False),
+                Column('biz_type', Integer, nullable=False),
+                Column('biz_name', String(50), nullable=False),
+                Column('print_time', DateTime),
+                Column('print_data', Text, nullable=False),
+            )
+            table.create(self.db.session.connection(), checkfirst=True)
+            self._tables[name] = table
+        return table
+
+    def _write_table(self, month, records):
+        table = self._archive_table(month)
+        rows = []
+        for record in records:
+            row = dict(record)
+            if row['print_time']:
+                row['print_time'] = datetime.strptime(row['print_time'], TIME_FORMAT)
+            rows.append(row)
+        self.db.session.execute(table.insert(), rows)
+
+    def _archived_table_months(self):
+        names = inspect(self.db.engine).get_table_names()
+        months = []
+        for name in names:
+            if name.startswith(ARCHIVE_TABLE_PREFIX):
+                suffix = name[len(ARCHIVE_TABLE_PREFIX):]
+                months.append(f"{suffix[:4]}-{suffix[4:]}")
+        return months
+
+    def _iter_table(self, month, **filters):
+        table = self._archive_table(month)
+        query = table.select()
+        for field, value in filters.items():
+            if value is not None:
+                query = query.where(table.c[field] == value)
+        for row in self.db.session.execute(query.order_by(table.c.id.desc())):
+            record = dict(row._mapping)
+            if record['print_time'] is not None:
+                record['print_time'] = record['print_time'].strftime(TIME_FORMAT)
+            yield record
+
+    # ------------------------------------------------------------------
+    # 查询接口
+    # ------------------------------------------------------------------
+    def months(self):
+        """列出已归档的月份（倒序）"""
+        if self.mode == 'table':
+            months = self._archived_table_months()
+        else:
+            months = list(self._load_index().keys())
+        return sorted(months, reverse=True)
+
+    def get(self, log_id):
+        """按日志ID获取归档记录，找不到时返回None"""
+        if self.mode == 'table':
+            for month in self.months():
+                for record in self._iter_table(month, id=log_id):
+                    return record
+            return None
+
+        for month, entry in self._load_index().items():
+            if entry['min_id'] <= log_id <= entry['max_id']:
+                for record in self._iter_jsonl(month):
+                    if record['id'] == log_id:
+                        return record
+        return None
+
+    def search(self, student_code=None, user_id=None, biz_type=None,
+               start=None, end=None, limit=100):
+        """
+        检索归档记录
+
+        start/end 为UTC时间（与print_time一致），检索[start, end)区间内的记录，并用于限定需要扫描的月份范围
+        返回按ID倒序排列的记录列表，最多limit条
+        """
+        start_month = start.strftime("%Y-%m") if start else None
+        end_month = end.strftime("%Y-%m") if end else None
+
+        results = []
+        seen = set()
+        for month in self.months():
+            if (start_month and month < start_month) or (end_month and month > end_month):
+                continue
+
+            if self.mode == 'table':
+                records = self._iter_table(month, student_code=student_code,
+                                           user_id=user_id, biz_type=biz_type)
+            else:
+                records = self._iter_jsonl(month)
+
+            month_results = []
+            for record in records:
+                if student_code is not None and record['student_code'] != student_code:
+                    continue
+                if user_id is not None and record['user_id'] != user_id:
+                    continue
+                if biz_type is not None and record['biz_type'] != biz_type:
+                    continue
+                print_time = datetime.strptime(record['print_time'], TIME_FORMAT) if record['print_time'] else None
+                if start and print_time and print_time < start:
+                    continue
+                if end and print_time and print_time >= end:
+                    continue
+                # 归档过程中断重跑可能产生重复记录，按ID去重
+                if record['id'] in seen:
+                    continue
+                seen.add(record['id'])
+                month_results.append(record)
+
+            month_results.sort(key=lambda r: r['id'], reverse=True)
+            results.extend(month_results)
+            if len(results) >= limit:
+                break
+
+        return results[:limit]
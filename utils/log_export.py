@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+打印日志导出模块
+按条件把在线表中的打印记录以CSV或JSONL格式逐行输出，供审计使用
+
+记录按ID分段读取，每段使用流式游标（yield_per）逐批取出，读完一段即归还数据库连接，
+因此内存占用与导出的总条数无关，长时间的导出也不会一直占用连接或阻塞打印记录的写入
+"""
+
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+# 导出的字段，username 来自关联的用户表
+EXPORT_FIELDS = ['id', 'user_id', 'username', 'student_code', 'student_name', 'biz_type',
+                 'biz_name', 'print_time', 'print_data']
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# 导出记录中的时间格式，与归档记录一致
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class PrintLogExporter:
+    """打印日志导出器"""
+
+    def __init__(self, db, model, user_model, batch_size=1000, chunk_size=50000):
+        """
+        batch_size: 流式游标每次从数据库取出的行数
+        chunk_size: 每段查询的最大行数，读完一段后释放连接再查询下一段
+        """
+        self.db = db
+        self.model = model
+        self.user_model = user_model
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+
+    def _query(self, after_id, start=None, end=None, user_id=None, biz_type=None, student_code=None):
+        log, user = self.model, self.user_model
+        query = (select(log.id, log.user_id, user.username, log.student_code, log.student_name,
+                        log.biz_type, log.biz_name, log.print_time, log.print_data)
+                 .outerjoin(user, user.id == log.user_id)
+                 .where(log.id > after_id))
+        if start is not None:
+            query = query.where(log.print_time >= start)
+        if end is not None:
+            query = query.where(log.print_time < end)
+        if user_id is not None:
+            query = query.where(log.user_id == user_id)
+        if biz_type is not None:
+            query = query.where(log.biz_type == biz_type)
+        if student_code is not None:
+            query = query.where(log.student_code == student_code)
+        return query.order_by(log.id).limit(self.chunk_size)
+
+    def iter_records(self, **filters):
+        """按ID升序逐条产出符合条件的记录字典，filters同 _query 的筛选参数"""
+        last_id = 0
+        while True:
+            count = 0
+            # 使用独立连接而不是请求的会话，结果不进入ORM标识映射，读完即归还连接池
+            with self.db.engine.connect() as conn:
+                result = conn.execution_options(yield_per=self.batch_size).execute(
+                    self._query(last_id, **filters))
+                for row in result:
+                    record = dict(row._mapping)
+                    if record['print_time'] is not None:
+                        record['print_time'] = record['print_time'].strftime(TIME_FORMAT)
+                    last_id = record['id']
+                    count += 1
+                    yield record
+            if count < self.chunk_size:
+                break
+
+    def iter_csv(self, **filters):
+        """产出CSV文本，首行为表头，每次产出一批记录"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # 带BOM，Excel打开时能正确识别中文
+        buffer.write('\ufeff')
+        writer.writerow(EXPORT_FIELDS)
+        count = 0
+        for record in self.iter_records(**filters):
+            writer.writerow([record[field] for field in EXPORT_FIELDS])
+            count += 1
+            if count % self.batch_size == 0:
+                yield self._drain(buffer)
+        yield self._drain(buffer)
+
+    def iter_jsonl(self, **filters):
+        """产出JSONL文本，每行一条记录，每次产出一批记录"""
+        lines = []
+        for record in self.iter_records(**filters):
+            lines.append(json.dumps(record, ensure_ascii=False))
+            if len(lines) >= self.batch_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    def iter_export(self, fmt, **filters):
+        """按格式导出，fmt为 csv 或 jsonl"""
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        return self.iter_csv(**filters) if fmt == 'csv' else self.iter_jsonl(**filters)
+
+    @staticmethod
+    def _drain(buffer):
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
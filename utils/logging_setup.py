@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+日志配置模块
+- 分级日志，文本或JSON格式输出
+- 每个请求一个关联ID（request_id），自动附加到该请求产生的所有日志
+- 渲染热点路径的调试日志按请求采样，只有被采样的请求才输出完整调试信息
+- 日志经队列交给后台线程写出，业务线程不阻塞在stdout或文件IO上
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import uuid
+
+_request_id = contextvars.ContextVar('request_id', default='-')
+_sampled = contextvars.ContextVar('log_sampled', default=False)
+
+_sample_rate = 0.0
+_listener = None
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+
+def new_request_id():
+    """生成新的请求ID"""
+    return uuid.uuid4().hex[:16]
+
+
+def start_request(request_id=None):
+    """
+    开始一个请求的日志上下文，返回请求ID
+
+    同时决定该请求的热点调试日志是否被采样
+    """
+    request_id = request_id or new_request_id()
+    _request_id.set(request_id)
+    _sampled.set(_sample_rate >= 1 or (_sample_rate > 0 and random.random() < _sample_rate))
+    return request_id
+
+
+def get_request_id():
+    """获取当前请求ID，请求之外返回'-'"""
+    return _request_id.get()
+
+
+def debug_sampled(logger, msg, *args):
+    """
+    热点路径的调试日志，仅在DEBUG级别开启且当前请求被采样时输出
+
+    参数按logging惯例延迟格式化，未输出时几乎没有开销
+    """
+    if _sampled.get() and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args)
+
+
+class RequestIdFilter(logging.Filter):
+    """为日志记录附加当前请求ID"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON，便于日志采集系统解析"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level='INFO', fmt='text', sample_rate=0.0, log_file=None, queue_size=10000):
+    """
+    配置根日志记录器
+
+    参数:
+        level: 日志级别
+        fmt: 'text' 或 'json'
+        sample_rate: 热点调试日志的请求采样比例（0~1）
+        log_file: 日志文件路径，为空时输出到stderr
+        queue_size: 日志队列长度，队列满时丢弃新日志而不阻塞业务线程
+    """
+    global _sample_rate, _listener
+
+    _sample_rate = float(sample_rate)
+
+    if log_file:
+        target = logging.handlers.RotatingFileHandler(log_file, maxBytes=50 * 1024 * 1024,
+                                                      backupCount=5, encoding='utf-8')
+    else:
+        target = logging.StreamHandler()
+    target.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    # 过滤器在业务线程中执行，此时才能取到请求上下文
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # Pillow在DEBUG级别会逐块输出PNG解码信息
+    logging.getLogger('PIL').setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志，保证日志不会拖慢请求"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+@atexit.register
+def _stop_listener():
+    # 进程退出前写出队列中剩余的日志
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+打印输出存储模块
+渲染结果（PNG图像或多联PDF，以及对应的JSON数据）的保存方式：
+- NullOutputStore: 不落盘，图像只在内存中返回给调用方（默认）
+- DirectoryOutputStore: 同步写入目录，文件名唯一，按日期和哈希前缀分子目录
+- ArchivingOutputStore: 由后台线程写入，并按总大小和保存天数定期清理
+"""
+
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_BYTES = REGISTRY.gauge('print_output_bytes', '打印输出目录占用空间（字节）')
+OUTPUT_FILES = REGISTRY.gauge('print_output_files', '打印输出目录文件数')
+OUTPUT_EVICTED = REGISTRY.counter('print_output_evicted_total', '清理的打印输出文件数', ('reason',))
+OUTPUT_DROPPED = REGISTRY.counter('print_output_dropped_total', '写入队列已满而未保存的打印输出数')
+
+# 文件名中不允许出现的字符
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def output_name(proof_name):
+    """
+    生成唯一的输出文件名（不含扩展名）和分片子目录
+
+    返回 (子目录, 文件名)，如 ('20250605/3f', '提现凭证_20250605094944_3fa2c1d0')
+    """
+    now = datetime.now()
+    token = uuid.uuid4().hex[:8]
+    safe_name = _UNSAFE_CHARS.sub('_', proof_name or '打印凭证').strip('._') or '打印凭证'
+    return f"{now:%Y%m%d}/{token[:2]}", f"{safe_name}_{now:%Y%m%d%H%M%S}_{token}"
+
+
+class OutputStore:
+    """打印输出存储接口"""
+
+    def save(self, proof_name, image_bytes, data, ext='.png'):
+        """保存一次渲染结果，返回输出标识（文件路径或文件名），ext为文件扩展名"""
+        raise NotImplementedError
+
+    def usage(self):
+        """存储占用情况"""
+        return {}
+
+    def close(self):
+        """停止后台任务并写完待保存的内容"""
+
+
+class NullOutputStore(OutputStore):
+    """不保存渲染结果"""
+
+    def save(self, proof_name, image_bytes, data, ext='.png'):
+        return output_name(proof_name)[1] + ext
+
+
+class DirectoryOutputStore(OutputStore):
+    """同步写入目录"""
+
+    def __init__(self, root, write_json=True):
+        self.root = root
+        self.write_json = write_json
+
+    def _write(self, path, image_bytes, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(image_bytes)
+        if self.write_json:
+            with open(os.path.splitext(path)[0] + '.json', 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+
+    def _path(self, proof_name, ext='.png'):
+        subdir, name = output_name(proof_name)
+        return os.path.join(self.root, *subdir.split('/'), name + ext)
+
+    def save(self, proof_name, image_bytes, data, ext='.png'):
+        path = self._path(proof_name, ext)
+        self._write(path, image_bytes, data)
+        return path
+
+    def _scan(self):
+        """遍历目录，返回 [(mtime, size, path)]"""
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def usage(self):
+        files = self._scan()
+        result = {
+            'root': self.root,
+            'files': len(files),
+            'bytes': sum(size for _, size, _ in files),
+            'oldest': datetime.fromtimestamp(min(files)[0]).isoformat() if files else None,
+            'newest': datetime.fromtimestamp(max(files)[0]).isoformat() if files else None,
+        }
+        if os.path.isdir(self.root):
+            disk = shutil.disk_usage(self.root)
+            result.update({'disk_total': disk.total, 'disk_free': disk.free})
+        return result
+
+    def _scan_outputs(self):
+        """
+        按渲染结果分组遍历目录，返回 [(mtime, size, paths, orphan)]
+
+        同名（不含扩展名）的图像和JSON文件属于同一次渲染，作为一组统计大小并一起清理；
+        mtime取组内最新的文件，orphan表示只剩JSON文件、对应的图像已不存在
+        """
+        groups = {}
+        for mtime, size, path in self._scan():
+            group = groups.setdefault(os.path.splitext(path)[0], [0.0, 0, []])
+            group[0] = max(group[0], mtime)
+            group[1] += size
+            group[2].append(path)
+        return [(mtime, size, paths, all(path.endswith('.json') for path in paths))
+                for mtime, size, paths in groups.values()]
+
+
+class ArchivingOutputStore(DirectoryOutputStore):
+    """
+    后台写入并限制容量的输出目录
+
+    save只把内容放入队列，由写入线程落盘；写入线程每隔sweep_interval秒清理一次：
+    图像和对应的JSON作为一组清理，先删除图像已不存在的JSON和超过max_age_days的输出，
+    再从最旧的输出开始删除，直到总大小不超过max_bytes
+    """
+
+    def __init__(self, root, max_bytes=1024 * 1024 * 1024, max_age_days=7, sweep_interval=300,
+                 queue_size=1000, write_json=True):
+        super().__init__(root, write_json=write_json)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.sweep_interval = sweep_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='print-output-writer', daemon=True)
+        self._thread.start()
+
+    def save(self, proof_name, image_bytes, data, ext='.png'):
+        path = self._path(proof_name, ext)
+        try:
+            self._queue.put_nowait((path, image_bytes, data))
+        except queue.Full:
+            # 磁盘写入跟不上时放弃归档，不影响本次打印
+            OUTPUT_DROPPED.inc()
+            logger.warning("打印输出写入队列已满，未保存: %s", path)
+        return path
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                if item is _STOP:
+                    self._queue.task_done()
+                    break
+                try:
+                    self._write(*item)
+                except Exception:
+                    logger.exception("写入打印输出失败: %s", item[0])
+                    self._remove(item[0])
+                    self._remove(os.path.splitext(item[0])[0] + '.json')
+                finally:
+                    self._queue.task_done()
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self.sweep()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning("删除打印输出失败 %s: %s", path, e)
+            return False
+
+    def sweep(self):
+        """按保存天数和总大小清理文件，返回删除的文件数"""
+        with self._sweep_lock:
+            self._last_sweep = time.monotonic()
+            outputs = sorted(self._scan_outputs(), key=lambda output: output[0])
+            total = sum(size for _, size, _, _ in outputs)
+            cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days > 0 else None
+            removed = 0
+            kept = 0
+            for mtime, size, paths, orphan in outputs:
+                if orphan:
+                    # 写入时先写图像再写JSON，只剩JSON说明图像已被删除或写入失败
+                    reason = 'orphan'
+                elif cutoff is not None and mtime < cutoff:
+                    reason = 'age'
+                elif self.max_bytes > 0 and total > self.max_bytes:
+                    reason = 'size'
+                else:
+                    kept += len(paths)
+                    continue
+                for path in paths:
+                    if self._remove(path):
+                        OUTPUT_EVICTED.inc(reason=reason)
+                        removed += 1
+                total -= size
+            self._remove_empty_dirs()
+            OUTPUT_BYTES.set(total)
+            OUTPUT_FILES.set(kept)
+            if removed:
+                logger.info("清理打印输出 %d 个文件，剩余 %.1fMB", removed, total / 1024 / 1024)
+            return removed
+
+    def _remove_empty_dirs(self):
+        for dirpath, _, _ in os.walk(self.root, topdown=False):
+            if dirpath != self.root:
+                try:
+                    # 只能删除空目录，非空时抛出OSError
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    def usage(self):
+        result = super().usage()
+        result.update({
+            'pending': self._queue.qsize(),
+            'max_bytes': self.max_bytes,
+            'max_age_days': self.max_age_days,
+        })
+        return result
+
+    def flush(self):
+        """等待队列中的内容全部写入"""
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+
+_STOP = object()
+
+
+def create_output_store(config):
+    """根据配置创建输出存储"""
+    if not config.get('OUTPUT_ARCHIVE_ENABLED'):
+        return NullOutputStore()
+    return ArchivingOutputStore(
+        config['OUTPUT_DIR'],
+        max_bytes=config['OUTPUT_MAX_MB'] * 1024 * 1024,
+        max_age_days=config['OUTPUT_MAX_AGE_DAYS'],
+        sweep_interval=config['OUTPUT_SWEEP_INTERVAL']
+    )
@@ -2,15 +2,46 @@
 # -*- coding: utf-8 -*-
 
 import json
+import logging
 import os
 import sys
 import asyncio
 import base64
+import functools
+import hashlib
+import time
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops, ImageDraw, ImageFont
 import io
 
+if __package__:
+    from .metrics import RENDERS_IN_FLIGHT, RENDERS_TOTAL, record_render
+    from .logging_setup import debug_sampled, setup_logging
+    from .text_measure import text_measurer
+    from .template_expr import compile_text, parse_text_format
+    from .output_store import DirectoryOutputStore
+    from .band_layout import iter_pages
+    from .components import FontSpec, TextComponent, ImageComponent, LineComponent
+    from .copy_output import COPY_LAYOUTS, copy_count, copy_labels, label_image, tile_copies, copies_pdf
+    from .template_registry import TemplateRegistry
+    from .cache import SizedLRUCache
+else:
+    # 直接运行本文件时没有包上下文，从项目根目录导入
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from utils.metrics import RENDERS_IN_FLIGHT, RENDERS_TOTAL, record_render
+    from utils.logging_setup import debug_sampled, setup_logging
+    from utils.text_measure import text_measurer
+    from utils.template_expr import compile_text, parse_text_format
+    from utils.output_store import DirectoryOutputStore
+    from utils.band_layout import iter_pages
+    from utils.components import FontSpec, TextComponent, ImageComponent, LineComponent
+    from utils.copy_output import COPY_LAYOUTS, copy_count, copy_labels, label_image, tile_copies, copies_pdf
+    from utils.template_registry import TemplateRegistry
+    from utils.cache import SizedLRUCache
+
+logger = logging.getLogger(__name__)
+
 # 模板映射表 - 根据BizType映射到对应的.mrt文件
 TEMPLATE_MAPPING = {
     1: "报班凭证.mrt",
@@ -24,6 +55,164 @@ TEMPLATE_MAPPING = {
     9: "高端报班凭证.mrt"
 }
 
+# Stimulsoft MRT文件使用厘米作为单位，渲染分辨率为200 DPI：1厘米 = 200/2.54 = 78.74像素
+PIXELS_PER_CM = 78.74
+
+# 带区类型，带区内组件的位置相对于带区
+BAND_TYPES = ('PageHeaderBand', 'PageFooterBand', 'HeaderBand', 'DataBand', 'FooterBand',
+              'ReportTitleBand', 'ReportSummaryBand')
+
+# 文字加粗规则：文本包含以下关键字（或同时包含一组关键字）、字体本身为粗体或字号较大时加粗显示
+BOLD_KEYWORDS = ('余额', '提现凭证', '南昌学校', 'Title')
+BOLD_KEYWORD_GROUPS = (('学校', '凭证'),)
+BOLD_FONT_SIZE = 10.5
+
+# 页脚打印时间的字号（像素）
+FOOTER_FONT_SIZE = 24
+
+# 渲染颜色模式：RGB（彩色，每像素3字节）、L（灰度，1字节）、1（黑白，每像素1位）
+# 凭证只有黑色文字、线条和标志图像，灰度模式输出与彩色模式转为灰度的结果相同
+COLOR_MODES = ('RGB', 'L', '1')
+
+# 每次打印都会变化的字段（打印时间）：只引用这些字段的文本组件和页脚打印时间在叠加层中绘制，
+# 其余内容（基础渲染）只由模板和其他打印数据决定，可以缓存并在多次打印之间复用
+VOLATILE_FIELDS = frozenset({'dtCreate'})
+# 页数超过该值的凭证不缓存基础渲染，避免数据行很多的凭证占用大量内存
+BASE_CACHE_MAX_PAGES = 4
+# 基础渲染缓存的默认容量（字节），约为8页凭证的基础图像（每页约1.9MB，见compact_base）
+BASE_CACHE_BYTES = 16 * 1024 * 1024
+
+
+class RenderCancelled(Exception):
+    """渲染在完成前被取消（见ProofPrintSimulator.process_print_request的cancel参数）"""
+
+
+def _check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise RenderCancelled()
+
+
+def normalize_print_data(data):
+    """
+    打印数据的规范形式：去掉每次打印都会变化的字段（见VOLATILE_FIELDS），字典按键排序（包括嵌套的字典）
+
+    除打印时间外内容相同的打印数据规范形式相同，基础渲染按规范形式缓存
+    """
+    def canonical(value):
+        if isinstance(value, dict):
+            return {key: canonical(value[key]) for key in sorted(value, key=str)}
+        if isinstance(value, (list, tuple)):
+            return [canonical(item) for item in value]
+        return value
+
+    return canonical({key: value for key, value in data.items() if key not in VOLATILE_FIELDS})
+
+
+def image_bytes(image):
+    """图像占用的内存（字节）：Pillow中多通道图像每像素4字节，单通道（L、1）每像素1字节"""
+    return image.width * image.height * (4 if len(image.getbands()) > 1 else 1)
+
+
+def compact_base(image):
+    """
+    缓存基础图像时使用的紧凑形式 (图像, 彩色区域, 彩色区域图像)，用restore_base无损还原
+
+    凭证除标志外只有黑色文字和灰色线条：RGB图像保存为L（内存为1/4），只有彩色区域（如标志）另存一份RGB；
+    彩色区域超过页面一半时原样保存
+    """
+    if image.mode != 'RGB':
+        return image, None, None
+    red, green, blue = image.split()
+    boxes = [box for box in (ImageChops.difference(red, green).getbbox(),
+                             ImageChops.difference(green, blue).getbbox()) if box]
+    if not boxes:
+        return red, None, None
+    box = (min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes))
+    if (box[2] - box[0]) * (box[3] - box[1]) * 2 > image.width * image.height:
+        return image, None, None
+    return red, box, image.crop(box)
+
+
+def restore_base(compact, mode):
+    """由compact_base的结果得到可以绘制的页面图像（新的图像，不影响缓存内容）"""
+    base, box, patch = compact
+    if base.mode == mode:
+        return base.copy()
+    image = base.convert(mode)
+    if patch is not None:
+        image.paste(patch, box[:2])
+    return image
+
+
+def _base_render_size(pages):
+    return sum(image_bytes(base) + (image_bytes(patch) if patch is not None else 0)
+               for (base, _, patch), _ in pages)
+
+
+def ink(color, mode):
+    """颜色模式下使用的颜色；黑白模式没有灰色，除白色外一律画为黑色"""
+    if mode == '1':
+        return 255 if color == 'white' else 0
+    return color
+
+
+def needs_bold(text, font):
+    """文本是否加粗显示，font为FontSpec"""
+    return bool(any(keyword in text for keyword in BOLD_KEYWORDS) or
+                any(all(keyword in text for keyword in group) for group in BOLD_KEYWORD_GROUPS) or
+                font.bold or font.size >= BOLD_FONT_SIZE)
+
+
+def font_pixel_size(size, bold):
+    """模板字号（磅）对应的渲染字号（像素）"""
+    # 由于分辨率提高到200 DPI，字体至少16像素，放大2.7倍
+    base_size = max(16, int(size * 2.7))
+    # 对于加粗文字，稍微增加字体大小，但主要靠多次绘制实现
+    return int(base_size * 1.1) if bold else base_size
+
+
+def page_offsets(width):
+    """让内容整体居中显示的偏移量 (x, y)，单位像素"""
+    content_width = width * 0.85  # 内容区域占页面85%
+    left_margin = (width - content_width) / 2
+    return left_margin - 30, 20  # 向右偏移让左右对称，向下偏移20像素
+
+
+def print_time_position(width, height):
+    """页脚打印时间的位置"""
+    offset_x, offset_y = page_offsets(width)
+    return width - 400 + offset_x, height - 50 + offset_y
+
+
+# 模板文件目录
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "properties")
+
+
+def find_chinese_font():
+    """查找可用的中文字体，优先使用宋体(simsun.ttc)，其次尝试其他常见中文字体，都没有时返回None"""
+    for font_name in ['simsun.ttc', 'simhei.ttf', 'msyh.ttc', 'simkai.ttf']:
+        potential_path = os.path.join(os.environ.get('WINDIR', ''), 'Fonts', font_name)
+        if os.path.exists(potential_path):
+            return potential_path
+    return None
+
+
+def load_template(template_path):
+    """获取解析后的模板，返回 (MrtParser, 是否命中缓存)"""
+    return template_registry.load_path(template_path)
+
+
+def template_version(biz_type, school_id=None):
+    """学校和BizType对应模板文件的版本（修改时间），用于判断缓存的渲染结果是否仍然有效；模板不存在时返回None"""
+    return template_registry.version(school_id, biz_type)
+
+
+def clear_template_cache():
+    """清空已解析模板缓存和基础渲染缓存"""
+    template_registry.clear()
+    base_render_cache.clear()
+
+
 class MrtParser:
     """解析.mrt文件的类"""
 
@@ -31,6 +220,13 @@ class MrtParser:
         """初始化MRT解析器"""
         self.mrt_file_path = mrt_file_path
         self.components = []
+        # 带区及其组件，按在页面中的位置排列；不属于任何带区的组件在page_components中
+        self.bands = []
+        self.page_components = None
+        # 解码、缩放并转换颜色模式后的图像，随模板缓存：(图像数据, 宽, 高, 颜色模式) -> Image
+        self._images = {}
+        # 页面内容区高度（厘米），用于带区分页
+        self.page_content_height = None
         self.data_fields = {}
         self.tree = None
         self.root = None
@@ -43,6 +239,25 @@ class MrtParser:
             'margin_bottom': 10,
         }
         self.parse()
+        if self.page_components is None:
+            self.page_components = self.components
+        if self.page_content_height is None:
+            self.page_content_height = self.page_settings['height'] / PIXELS_PER_CM
+        self._compile_texts()
+
+    def _compile_texts(self):
+        """预编译文本组件的占位符表达式，模板缓存后每次渲染只需替换数据"""
+        for component in self.components:
+            if component.type == 'Text':
+                component.expr = compile_text(component.text, component.text_format)
+                fields = component.expr.fields
+                component.volatile = bool(fields) and VOLATILE_FIELDS.issuperset(fields)
+        # 模板中没有打印时间字段时，渲染时在页脚补充
+        self.has_print_time = any(c.type == 'Text' and '打印时间' in (c.text or '') for c in self.components)
+        # 有文本同时引用易变字段和其他字段时，基础渲染与打印时间有关，按完整的打印数据缓存
+        self.volatile_in_base = any(
+            c.type == 'Text' and not c.volatile and not VOLATILE_FIELDS.isdisjoint(c.expr.fields)
+            for c in self.components)
 
     def parse(self):
         """解析.mrt文件"""
@@ -58,18 +273,18 @@ class MrtParser:
                 self._extract_data_fields()
                 self._extract_components()
                 self._extract_page_settings(xml_content)
-                print(f"XML解析成功，共提取 {len(self.components)} 个组件")
+                logger.debug("XML解析成功，共提取 %d 个组件", len(self.components))
                 return True
             except Exception as e:
-                print(f"XML解析错误: {str(e)}")
+                logger.warning("XML解析错误: %s", e)
                 # 如果解析失败，使用备用方法提取关键信息
                 self._extract_components_manually(xml_content)
                 self._extract_page_settings(xml_content)
-                print(f"手动解析完成，共提取 {len(self.components)} 个组件")
+                logger.info("手动解析完成，共提取 %d 个组件", len(self.components))
                 return True
 
         except Exception as e:
-            print(f"解析.mrt文件出错: {str(e)}")
+            logger.error("解析.mrt文件出错: %s", e)
             # 即使解析失败，仍然返回一些基本组件，这样至少可以显示一些内容
             self._create_default_components()
             return False
@@ -87,54 +302,112 @@ class MrtParser:
                         field_type = parts[1].strip()
                         self.data_fields[field_name] = field_type
         except Exception as e:
-            print(f"提取数据字段时出错: {str(e)}")
+            logger.warning("提取数据字段时出错: %s", e)
 
     def _extract_components(self):
         """提取组件信息"""
         try:
             # 尝试查找所有组件
-            components = self.tree.findall(".//Components//*")
+            # 带区内的组件同时位于页面和带区的Components下，会被查找到两次，按出现顺序去重
+            components = list(dict.fromkeys(self.tree.findall(".//Components//*")))
+            # XML元素 -> 组件信息，用于按带区归类
+            element_components = {}
 
             for component in components:
                 component_type = component.get('type')
 
                 # 文本组件
                 if component_type == 'Text':
-                    font_info = self._extract_font_info(component)
-                    alignment = self._find_element_text(component, 'HorAlignment') or 'Left'
-                    comp_info = {
-                        'type': 'Text',
-                        'name': component.get('Name', ''),
-                        'rect': self._find_element_text(component, 'ClientRectangle'),
-                        'text': self._find_element_text(component, 'Text'),
-                        'data_type': self._find_element_text(component, 'Type'),
-                        'font': font_info,  # 添加字体信息
-                        'alignment': alignment  # 添加对齐信息
-                    }
+                    comp_info = TextComponent(
+                        name=component.get('Name', ''),
+                        rect=self._find_element_text(component, 'ClientRectangle'),
+                        text=self._find_element_text(component, 'Text'),
+                        data_type=self._find_element_text(component, 'Type'),
+                        font=self._extract_font_info(component),
+                        alignment=self._find_element_text(component, 'HorAlignment') or 'Left',
+                        text_format=parse_text_format(component.find('./TextFormat'))  # 金额、日期等格式
+                    )
                     self.components.append(comp_info)
+                    element_components[component] = comp_info
 
                 # 图像组件
                 elif component_type == 'Image':
-                    comp_info = {
-                        'type': 'Image',
-                        'name': component.get('Name', ''),
-                        'rect': self._find_element_text(component, 'ClientRectangle'),
-                        'image_data': self._find_element_text(component, 'Image')
-                    }
+                    comp_info = ImageComponent(
+                        name=component.get('Name', ''),
+                        rect=self._find_element_text(component, 'ClientRectangle'),
+                        image_data=self._find_element_text(component, 'Image')
+                    )
                     self.components.append(comp_info)
+                    element_components[component] = comp_info
 
                 # 线条组件
                 elif component_type and ('LinePrimitive' in component_type):
-                    color = self._find_element_text(component, 'Color') or 'Black'
-                    comp_info = {
-                        'type': 'Line',
-                        'name': component.get('Name', ''),
-                        'rect': self._find_element_text(component, 'ClientRectangle'),
-                        'color': color
-                    }
+                    comp_info = LineComponent(
+                        name=component.get('Name', ''),
+                        rect=self._find_element_text(component, 'ClientRectangle'),
+                        color=self._find_element_text(component, 'Color') or 'Black'
+                    )
                     self.components.append(comp_info)
+                    element_components[component] = comp_info
+            self._extract_bands(element_components)
         except Exception as e:
-            print(f"提取组件时出错: {str(e)}")
+            logger.warning("提取组件时出错: %s", e)
+
+    def _extract_bands(self, element_components):
+        """按带区归类组件，带区内组件的位置相对于带区"""
+        # 业务对象Guid -> 数据路径，根数据（ArrayList）为空字符串
+        data_paths = {}
+
+        def walk(element, path):
+            for business_object in element.findall('./BusinessObjects/*'):
+                name = business_object.findtext('./Name') or business_object.tag
+                # 顶层业务对象即根数据，下级业务对象的路径如 ClassAndCardArray
+                child_path = '' if path is None else (f"{path}.{name}" if path else name)
+                guid = business_object.findtext('./Guid')
+                if guid:
+                    data_paths[guid] = child_path
+                walk(business_object, child_path)
+
+        dictionary = self.tree.find('./Dictionary')
+        if dictionary is not None:
+            walk(dictionary, None)
+
+        banded = set()
+        for page in self.tree.findall('.//Pages/*'):
+            page_components = page.find('./Components')
+            if page_components is None:
+                continue
+            for element in page_components:
+                band_type = element.get('type')
+                if band_type not in BAND_TYPES:
+                    continue
+                rect = [float(v) for v in (self._find_element_text(element, 'ClientRectangle') or '0,0,0,0').split(',')]
+                band_components = []
+                for child in element.iter():
+                    info = element_components.get(child)
+                    if info is not None:
+                        band_components.append(info)
+                        banded.add(info)
+                guid = self._find_element_text(element, 'BusinessObjectGuid')
+                self.bands.append({
+                    'type': band_type,
+                    'name': element.get('Name') or element.tag,
+                    'top': rect[1],
+                    'height': rect[3],
+                    'components': band_components,
+                    'data_path': data_paths.get(guid) if guid else None,
+                })
+
+            # 页面内容区高度 = 纸张高度 - 上下边距
+            page_height = self._find_element_text(page, 'PageHeight')
+            if page_height and self.page_content_height is None:
+                margins = (self._find_element_text(page, 'Margins') or '0,0,0,0').split(',')
+                top, bottom = (float(margins[1]), float(margins[3])) if len(margins) >= 4 else (0, 0)
+                self.page_content_height = float(page_height) - top - bottom
+
+        if self.bands:
+            self.bands.sort(key=lambda band: band['top'])
+            self.page_components = [c for c in self.components if c not in banded]
 
     def _extract_font_info(self, component):
         """提取字体信息"""
@@ -146,20 +419,12 @@ class MrtParser:
                 font_name = font_info[0] if len(font_info) > 0 else "Arial"
                 font_size = int(float(font_info[1])) if len(font_info) > 1 else 9
                 font_bold = "Bold" in font_info if len(font_info) > 2 else False
-                return {
-                    'name': font_name,
-                    'size': font_size,
-                    'bold': font_bold
-                }
+                return FontSpec(font_name, font_size, font_bold)
         except Exception:
             pass
 
         # 默认字体信息
-        return {
-            'name': 'Arial',
-            'size': 9,
-            'bold': False
-        }
+        return FontSpec()
 
     def _extract_page_settings(self, xml_content):
         """提取页面设置"""
@@ -182,8 +447,8 @@ class MrtParser:
                 height = float(page_height) * PIXELS_PER_CM
                 self.page_settings['width'] = int(width)
                 self.page_settings['height'] = int(height)
-                print(f"使用模板指定尺寸: 宽={page_width}厘米, 高={page_height}厘米")
-                print(f"转换为像素: 宽={int(width)}, 高={int(height)}")
+                logger.debug("使用模板指定尺寸: 宽=%s厘米, 高=%s厘米", page_width, page_height)
+                logger.debug("转换为像素: 宽=%d, 高=%d", width, height)
 
             # 如果没有明确的宽度和高度，但有纸张规格，尝试从纸张规格推断尺寸
             elif paper_size:
@@ -209,12 +474,12 @@ class MrtParser:
 
                     self.page_settings['width'] = int(width)
                     self.page_settings['height'] = int(height)
-                    print(f"使用{paper_size}纸张规格: 宽={int(width)}像素, 高={int(height)}像素")
+                    logger.debug("使用%s纸张规格: 宽=%d像素, 高=%d像素", paper_size, width, height)
                 else:
                     # 未知纸张规格，使用默认A4尺寸
                     self.page_settings['width'] = 794  # A4宽度约为21cm * 37.8 = 794像素
                     self.page_settings['height'] = 1123 # A4高度约为29.7cm * 37.8 = 1123像素
-                    print(f"未知纸张规格 {paper_size}，使用默认A4尺寸")
+                    logger.warning("未知纸张规格 %s，使用默认A4尺寸", paper_size)
             else:
                 # 尝试从Page的ClientRectangle获取尺寸
                 page_start = xml_content.find('<Page')
@@ -233,17 +498,17 @@ class MrtParser:
                                 if width > 100 and height > 100:
                                     self.page_settings['width'] = int(width)
                                     self.page_settings['height'] = int(height)
-                                    print(f"使用ClientRectangle尺寸: 宽={int(width)}像素, 高={int(height)}像素")
+                                    logger.debug("使用ClientRectangle尺寸: 宽=%d像素, 高=%d像素", width, height)
                                 else:
                                     # 值过小，使用标准A4尺寸
                                     self.page_settings['width'] = 794
                                     self.page_settings['height'] = 1123
-                                    print("ClientRectangle值过小，使用默认A4尺寸")
+                                    logger.warning("ClientRectangle值过小，使用默认A4尺寸")
                         else:
                             # 没有尺寸信息，使用标准A4尺寸
                             self.page_settings['width'] = 794
                             self.page_settings['height'] = 1123
-                            print("未找到页面尺寸信息，使用默认A4尺寸")
+                            logger.warning("未找到页面尺寸信息，使用默认A4尺寸")
 
             # 寻找边距信息
             margins = self._extract_attribute(xml_content, 'Margins')
@@ -254,14 +519,15 @@ class MrtParser:
                     self.page_settings['margin_top'] = float(margin_parts[1]) * PIXELS_PER_CM
                     self.page_settings['margin_right'] = float(margin_parts[2]) * PIXELS_PER_CM
                     self.page_settings['margin_bottom'] = float(margin_parts[3]) * PIXELS_PER_CM
-                    print(f"设置页面边距: 左={self.page_settings['margin_left']}, 上={self.page_settings['margin_top']}, 右={self.page_settings['margin_right']}, 下={self.page_settings['margin_bottom']}")
+                    logger.debug("设置页面边距: 左=%s, 上=%s, 右=%s, 下=%s", self.page_settings['margin_left'], self.page_settings['margin_top'],
+                             self.page_settings['margin_right'], self.page_settings['margin_bottom'])
 
         except Exception as e:
-            print(f"提取页面设置时出错: {str(e)}")
+            logger.warning("提取页面设置时出错: %s", e)
             # 使用标准A4尺寸作为备用
             self.page_settings['width'] = 794
             self.page_settings['height'] = 1123
-            print("出现错误，使用默认A4尺寸")
+            logger.warning("出现错误，使用默认A4尺寸")
 
     def _find_element_text(self, parent, tag_name):
         """安全地获取元素文本"""
@@ -282,9 +548,9 @@ class MrtParser:
             image_components = self._extract_image_components(xml_content)
             self.components.extend(image_components)
 
-            print(f"手动提取了 {len(self.components)} 个组件")
+            logger.debug("手动提取了 %d 个组件", len(self.components))
         except Exception as e:
-            print(f"手动提取组件时出错: {str(e)}")
+            logger.warning("手动提取组件时出错: %s", e)
 
     def _extract_text_components(self, xml_content):
         """从XML字符串提取文本组件"""
@@ -318,15 +584,8 @@ class MrtParser:
             # 提取对齐信息
             alignment = self._extract_tag_content(text_xml, 'HorAlignment') or 'Left'
 
-            comp_info = {
-                'type': 'Text',
-                'name': '',
-                'rect': rect,
-                'text': content,
-                'data_type': data_type,
-                'font': font_info,
-                'alignment': alignment
-            }
+            comp_info = TextComponent(rect=rect, text=content, data_type=data_type, font=font_info,
+                                      alignment=alignment)
             components.append(comp_info)
 
             text_start = text_end
@@ -341,19 +600,11 @@ class MrtParser:
                 name = parts[0] if len(parts) > 0 else "Arial"
                 size = float(parts[1]) if len(parts) > 1 else 9
                 bold = "Bold" in parts if len(parts) > 2 else False
-                return {
-                    'name': name,
-                    'size': int(size),
-                    'bold': bold
-                }
+                return FontSpec(name, int(size), bold)
         except:
             pass
 
-        return {
-            'name': 'Arial',
-            'size': 9,
-            'bold': False
-        }
+        return FontSpec()
 
     def _extract_image_components(self, xml_content):
         """从XML字符串提取图像组件"""
@@ -379,12 +630,7 @@ class MrtParser:
             rect = self._extract_attribute(img_xml, 'ClientRectangle')
             image_data = self._extract_tag_content(img_xml, 'Image')
 
-            comp_info = {
-                'type': 'Image',
-                'name': '',
-                'rect': rect,
-                'image_data': image_data
-            }
+            comp_info = ImageComponent(rect=rect, image_data=image_data)
             components.append(comp_info)
 
             img_start = img_end
@@ -414,241 +660,535 @@ class MrtParser:
     def _create_default_components(self):
         """创建默认组件以便在解析失败时使用"""
         default_components = [
-            {
-                'type': 'Text',
-                'name': 'title',
-                'rect': '3,0.6,12,1',
-                'text': '凭证',
-                'data_type': 'Expression',
-                'font': {'name': 'Arial', 'size': 14, 'bold': True}
-            },
-            {
-                'type': 'Text',
-                'name': 'student_code',
-                'rect': '1,3,6,0.6',
-                'text': '学员编码：{ArrayList.sStudentCode}',
-                'data_type': 'DataColumn',
-                'font': {'name': 'Arial', 'size': 9, 'bold': False}
-            },
-            {
-                'type': 'Text',
-                'name': 'student_name',
-                'rect': '1,4,6,0.6',
-                'text': '学员姓名：{ArrayList.sStudentName}',
-                'data_type': 'DataColumn',
-                'font': {'name': 'Arial', 'size': 9, 'bold': False}
-            }
+            TextComponent(name='title', rect='3,0.6,12,1', text='凭证', data_type='Expression',
+                          font=FontSpec('Arial', 14, True)),
+            TextComponent(name='student_code', rect='1,3,6,0.6', text='学员编码：{ArrayList.sStudentCode}',
+                          data_type='DataColumn', font=FontSpec('Arial', 9, False)),
+            TextComponent(name='student_name', rect='1,4,6,0.6', text='学员姓名：{ArrayList.sStudentName}',
+                          data_type='DataColumn', font=FontSpec('Arial', 9, False))
         ]
         self.components = default_components
 
+    def prepared_image(self, image_data, width, height, mode):
+        """
+        图像组件解码并缩放到绘制尺寸、转换为渲染颜色模式后的图像，解码失败时返回None
+
+        每种尺寸和颜色模式只转换一次，之后的渲染直接粘贴；返回的图像由各次渲染共用，不能修改
+        """
+        key = (image_data, width, height, mode)
+        if key in self._images:
+            return self._images[key]
+        try:
+            # 解码Base64
+            img = Image.open(io.BytesIO(base64.b64decode(image_data)))
+
+            # 调整大小
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+
+            # 如果图像有透明度，需要处理alpha通道
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                # 创建一个白色背景
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+                img = background
+
+            if img.mode != mode:
+                img = img.convert(mode)
+        except Exception as e:
+            logger.warning("处理图像时出错: %s", e)
+            img = None
+        self._images[key] = img
+        return img
+
     def get_template_title(self):
         """获取模板标题"""
         # 尝试查找标题，通常是第一个文本组件或者特定名称的组件
         for component in self.components:
-            if component['type'] == 'Text' and 'title' in component['name'].lower():
-                return component['text']
+            if component.type == 'Text' and 'title' in component.name.lower():
+                return component.text
 
         # 如果没有找到标题，返回文件名
         return os.path.basename(self.mrt_file_path).replace('.mrt', '')
 
 
+# 模板注册表：按 (学校ID, BizType) 查找模板，解析结果按模板文件缓存，可在多个请求间共享
+# 学校模板目录和缓存容量由应用启动时通过 template_registry.configure 设置
+template_registry = TemplateRegistry(TEMPLATE_DIR, TEMPLATE_MAPPING, MrtParser)
+
+# 基础渲染缓存：渲染键 -> [(不含叠加层的页面图像（compact_base的紧凑形式）, 叠加层组件), ...]，
+# 按图像占用的内存限制总大小，容量（字节）由应用启动时设置（0为不缓存），多进程部署时每个进程各有一份
+base_render_cache = SizedLRUCache(BASE_CACHE_BYTES, _base_render_size)
+
+
 class ProofPrintSimulator:
-    def __init__(self):
+    def __init__(self, output_store=None, color_mode='RGB', templates=None, clock=None, base_cache=None):
+        """
+        output_store: 渲染结果的保存方式（见utils.output_store），
+                      为空时同步写入output_dir（默认为image目录）
+        color_mode: 渲染颜色模式（见COLOR_MODES），L和1模式的图像内存和编码耗时远小于RGB
+        templates: 模板注册表（见utils.template_registry），为空时使用全局的template_registry
+        clock: 返回页脚打印时间的函数，为空时为datetime.now；固定时钟和打印数据时输出逐字节相同
+        base_cache: 基础渲染缓存（SizedLRUCache），为空时使用全局的base_render_cache
+        """
+        if color_mode not in COLOR_MODES:
+            raise ValueError(f"不支持的颜色模式: {color_mode}")
+        self.color_mode = color_mode
+        self.templates = templates or template_registry
+        self.clock = clock or datetime.now
+        self.base_cache = base_render_cache if base_cache is None else base_cache
         # 获取项目根目录，用于访问模板文件
         self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # 上一级目录
-        self.template_dir = os.path.join(self.base_dir, "properties")
+        self.template_dir = self.templates.default_dir
         self.output_dir = os.path.join(self.base_dir, "image")  # 输出到image目录
-        
-        # 确保输出目录存在
-        if not os.path.exists(self.output_dir):
-            os.makedirs(self.output_dir)
-            print(f"创建输出目录: {self.output_dir}")
+        self.output_store = output_store
 
         # 字体路径 - 可以根据需要更改
         self.font_path = os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'simhei.ttf')
         if not os.path.exists(self.font_path):
             self.font_path = None  # 如果找不到字体，将使用默认字体
 
-    def process_print_request(self, message):
-        """处理打印请求"""
+        # 最近一次渲染各阶段耗时（秒）：parse, layout, draw, encode, io
+        self.last_timings = {}
+        # 最近一次渲染是否命中模板缓存
+        self.last_cache_hit = False
+        # 最近一次渲染的PNG图像数据（第一页）和各页数据
+        self.last_image = None
+        self.last_pages = []
+        # 最近一次渲染的联数和多联PDF数据（联数为1或拼接输出时为None）
+        self.last_copies = 1
+        self.last_document = None
+        # 最近一次渲染是否复用了缓存的基础渲染
+        self.last_base_hit = False
+
+    def process_print_request(self, message, cancel=None):
+        """
+        处理打印请求
+
+        cancel为threading.Event，被设置后渲染在开始下一页之前停止并抛出RenderCancelled，
+        供异步接口在取消或超时后尽快释放渲染线程（见utils.async_render）
+        """
         try:
-            print("开始处理打印请求...")
+            debug_sampled(logger, "开始处理打印请求")
             # 解析消息
             if "Info" in message and "Params" in message["Info"]:
                 params = message["Info"]["Params"]
                 biz_type = params.get("BizType")
                 json_string = params.get("JsonString")
                 currency_symbol = params.get("CurrencySymbol", "¥")
+                school_id = params.get("SchoolId")
+                copy_layout = params.get("CopyLayout") or 'pdf'
+                if copy_layout not in COPY_LAYOUTS:
+                    logger.warning("不支持的多联输出方式 %s，使用pdf", copy_layout)
+                    copy_layout = 'pdf'
 
                 if biz_type is None or json_string is None:
-                    print("错误: 缺少必要参数 BizType 或 JsonString")
+                    logger.warning("缺少必要参数 BizType 或 JsonString")
                     return False
 
                 # 根据BizType获取模板名称
                 template_name = TEMPLATE_MAPPING.get(biz_type)
                 if not template_name:
-                    print(f"错误: 不支持的BizType: {biz_type}")
+                    logger.warning("不支持的BizType: %s", biz_type)
                     return False
 
                 # 解析内部JSON
                 data = json.loads(json_string)
 
                 # 创建打印输出
-                print(f"使用模板: {template_name}")
-                output_path = self.generate_print_output(template_name, data, currency_symbol)
+                debug_sampled(logger, "使用模板: %s", template_name)
+                RENDERS_IN_FLIGHT.inc()
+                try:
+                    output_path = self.generate_print_output(
+                        template_name, data, currency_symbol, school_id=school_id,
+                        copies=copy_count(data, params.get("DefaultPrintNumber", 1)),
+                        copy_layout=copy_layout, copy_label_texts=params.get("CopyLabels"), cancel=cancel)
+                except RenderCancelled:
+                    RENDERS_TOTAL.inc(biz_type=biz_type, status='cancelled')
+                    raise
+                except Exception:
+                    RENDERS_TOTAL.inc(biz_type=biz_type, status='error')
+                    raise
+                finally:
+                    RENDERS_IN_FLIGHT.dec()
+                if output_path:
+                    record_render(biz_type, self.last_timings, self.last_cache_hit)
+                RENDERS_TOTAL.inc(biz_type=biz_type, status='success' if output_path else 'error')
                 return output_path
             else:
-                print("错误: 消息格式不正确")
+                logger.warning("消息格式不正确")
                 return None
+        except RenderCancelled:
+            raise
         except Exception as e:
-            print(f"处理打印请求时出错: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("处理打印请求时出错: %s", e)
             return None
 
-    def generate_print_output(self, template_name, data, currency_symbol):
-        """生成打印输出"""
-        # 获取模板文件路径
-        template_path = os.path.join(self.template_dir, template_name)
+    async def process_print_request_async(self, message, executor=None, cancel=None):
+        """
+        在线程池中处理打印请求，不阻塞事件循环，返回值与process_print_request相同
+
+        executor为空时使用事件循环的默认线程池；并发限制、超时和取消见utils.async_render.AsyncPrintRenderer
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self.process_print_request, message, cancel))
+
+    def generate_print_output(self, template_name, data, currency_symbol, school_id=None, copies=1,
+                              copy_layout='pdf', copy_label_texts=None, cancel=None):
+        """
+        生成打印输出
+
+        school_id不为空且学校有同名模板时使用学校的模板，否则使用默认模板；
+        copies大于1时凭证只渲染一次，按copy_layout复制为多联（见utils.copy_output）：
+        pdf时各页PNG用于预览，输出为多联PDF；tile时每页输出各联上下拼接的图像
+        """
+        _check_cancelled(cancel)
+        # 获取模板文件路径（学校模板优先）
+        template_path = self.templates.find(school_id, template_name)
 
         # 检查模板文件是否存在
-        if not os.path.exists(template_path):
-            print(f"错误: 无法找到模板文件 {template_path}")
+        if template_path is None:
+            logger.error("无法找到模板文件 %s (学校: %s)", template_name, school_id)
             return None
 
-        # 解析MRT模板
-        mrt_parser = MrtParser(template_path)
-        print(f"模板文件已找到并解析: {template_path}")
+        timings = {}
+
+        # 解析MRT模板（优先使用缓存）
+        start = time.perf_counter()
+        mrt_parser, self.last_cache_hit = self.templates.load_path(template_path)
+        timings['parse'] = time.perf_counter() - start
+        debug_sampled(logger, "模板文件已找到并解析: %s", template_path)
+
+        # 逐页生成打印图像，每页编码后即释放图像（布局和绘制耗时由iter_page_images记录）
+        store = self.output_store or DirectoryOutputStore(self.output_dir)
+        proof_name = data.get('sProofName', '打印凭证')
+        timings['encode'] = timings['io'] = 0.0
+        labels = None
+        if copies > 1:
+            # 联次标签按文字缓存，各次打印共用
+            start = time.perf_counter()
+            label_font = find_chinese_font()
+            labels = [label_image(text, label_font) for text in copy_labels(copies, copy_label_texts)]
+            timings['copies'] = time.perf_counter() - start
+        tiled = labels is not None and copy_layout == 'tile'
+        pages = []
+        output_path = None
+        for number, image in enumerate(self.iter_page_images(data, mrt_parser, currency_symbol, timings, cancel), 1):
+            if tiled:
+                start = time.perf_counter()
+                image = tile_copies(image, labels)
+                timings['copies'] += time.perf_counter() - start
+
+            # 编码图像，使用高质量保存设置
+            start = time.perf_counter()
+            buffer = io.BytesIO()
+            image.save(buffer, 'PNG', optimize=True, dpi=(200, 200))
+            pages.append(buffer.getvalue())
+            timings['encode'] += time.perf_counter() - start
+            if labels is not None and not tiled:
+                # 多联PDF在全部页面生成后一次保存
+                continue
+
+            # 保存图像和JSON数据（由输出存储决定同步写入、后台写入或不保存），第二页起文件名带页码
+            start = time.perf_counter()
+            path = store.save(proof_name if number == 1 else f"{proof_name}_第{number}页", pages[-1], data)
+            output_path = output_path or path
+            timings['io'] += time.perf_counter() - start
+
+        document = None
+        if labels is not None and not tiled:
+            _check_cancelled(cancel)
+            # 各页PNG原样写入PDF，各联的页面引用同一份图像数据，只叠加各自的标签
+            start = time.perf_counter()
+            document = copies_pdf(pages, labels)
+            timings['copies'] += time.perf_counter() - start
+            start = time.perf_counter()
+            output_path = store.save(proof_name, document, data, ext='.pdf')
+            timings['io'] += time.perf_counter() - start
+
+        self.last_pages = pages
+        self.last_image = pages[0]
+        self.last_copies = copies
+        self.last_document = document
+        self.last_timings = timings
+
+        logger.info("打印输出已生成: %s (共%d页%d联, 模板缓存%s, 基础渲染缓存%s, 耗时 %.1fms)", output_path, len(pages),
+                    copies, '命中' if self.last_cache_hit else '未命中', '命中' if self.last_base_hit else '未命中',
+                    sum(timings.get(k, 0.0) for k in ('parse', 'layout', 'draw', 'encode', 'copies', 'io')) * 1000)
 
-        # 生成基于图像的打印预览，使用模板信息
-        image = self._create_print_preview_from_template(data, mrt_parser, currency_symbol)
+        return output_path
 
-        # 保存图像到文件
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"{data.get('sProofName', '打印凭证')}_{timestamp}.png"
-        output_path = os.path.join(self.output_dir, filename)
-        # 使用高质量保存设置
-        image.save(output_path, 'PNG', optimize=True, dpi=(200, 200))
+    def _create_print_preview_from_template(self, data, mrt_parser, currency_symbol, timings=None):
+        """根据MRT模板创建打印预览图像，多页时只返回第一页"""
+        return next(self.iter_page_images(data, mrt_parser, currency_symbol, timings))
 
-        # 生成JSON输出文件
-        json_filename = f"{data.get('sProofName', '打印凭证')}_{timestamp}.json"
-        json_output_path = os.path.join(self.output_dir, json_filename)
-        with open(json_output_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+    def iter_page_images(self, data, mrt_parser, currency_symbol, timings=None, cancel=None):
+        """
+        根据MRT模板逐页生成打印图像
 
-        print(f"打印输出已保存: {output_path}")
-        print(f"JSON数据已保存: {json_output_path}")
+        带区按数据行分页（见utils.band_layout），每次只排版和绘制一页，调用方处理完一页再生成下一页
+        timings不为空时累计各页耗时：draw为绘制文字(draw_text)、图像(draw_image)和线条(draw_line)的时间，
+        layout为其余时间（字段替换、字体选择、测量等）；cancel被设置时在开始下一页之前抛出RenderCancelled
 
-        return output_path
+        每页先绘制基础图像，再在其上绘制叠加层（打印时间）；基础图像按模板和规范化的打印数据缓存，
+        相同凭证再次打印时只需复制基础图像并重新绘制叠加层
+        """
+        setup_start = time.perf_counter()
+        if timings is not None:
+            for key in ('layout', 'draw', 'draw_text', 'draw_image', 'draw_line'):
+                timings.setdefault(key, 0.0)
+
+        # 默认字体作为后备
+        default_font = ImageFont.load_default()
+
+        # 确保有一个中文字体可用
+        chinese_font_path = find_chinese_font()
+        if chinese_font_path:
+            debug_sampled(logger, "找到中文字体: %s", os.path.basename(chinese_font_path))
+        else:
+            logger.warning("无法找到中文字体，中文可能无法正确显示")
 
-    def _create_print_preview_from_template(self, data, mrt_parser, currency_symbol):
-        """根据MRT模板创建打印预览图像"""
+        # 字体缓存，避免重复创建相同的字体对象，各页共用
+        fonts = {
+            'default': default_font,
+            'chinese_path': chinese_font_path,
+            'cache': {}
+        }
+
+        # 添加调试信息
+        debug_sampled(logger, "解析到 %d 个组件", len(mrt_parser.components))
+
+        base_key = self._base_key(data, mrt_parser, currency_symbol, chinese_font_path)
+        cached = self.base_cache.get(base_key) if base_key else None
+        self.last_base_hit = cached is not None
+        if timings is not None:
+            timings['layout'] += time.perf_counter() - setup_start
+
+        if cached is not None:
+            for base, overlay in cached:
+                _check_cancelled(cancel)
+                page_timings = {}
+                start = time.perf_counter()
+                image = restore_base(base, self.color_mode)
+                page_timings['layout'] = time.perf_counter() - start
+                self._draw_overlay(image, overlay, data, mrt_parser, currency_symbol, fonts, page_timings)
+                self._add_timings(timings, page_timings)
+                yield image
+            return
+
+        # 页数不超过BASE_CACHE_MAX_PAGES时，全部页面生成后缓存基础图像
+        bases = [] if base_key else None
+        for page in iter_pages(mrt_parser, data):
+            _check_cancelled(cancel)
+            page_timings = {}
+            overlay = []
+            image = self._render_page(page, mrt_parser, currency_symbol, fonts, page_timings, overlay)
+            if bases is not None:
+                if len(bases) < BASE_CACHE_MAX_PAGES:
+                    start = time.perf_counter()
+                    base = compact_base(image)
+                    bases.append((base, overlay))
+                    if base[0] is image:
+                        image = image.copy()
+                    page_timings['layout'] += time.perf_counter() - start
+                else:
+                    bases = None
+            self._draw_overlay(image, overlay, data, mrt_parser, currency_symbol, fonts, page_timings)
+            self._add_timings(timings, page_timings)
+            yield image
+        if bases:
+            self.base_cache.set(base_key, bases)
+
+    def _base_key(self, data, mrt_parser, currency_symbol, font_path):
+        """基础渲染的缓存键，不缓存时返回None"""
+        if self.base_cache.max_bytes <= 0:
+            return None
+        try:
+            version = os.stat(mrt_parser.mrt_file_path).st_mtime_ns
+        except OSError:
+            return None
+        # 有文本同时引用易变字段和其他字段时，基础渲染与打印时间有关
+        payload = json.dumps([data if mrt_parser.volatile_in_base else normalize_print_data(data),
+                              currency_symbol, self.color_mode, font_path],
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return mrt_parser.mrt_file_path, version, hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _add_timings(timings, page_timings):
+        if timings is not None:
+            for key, value in page_timings.items():
+                timings[key] += value
+
+    def _render_page(self, page, mrt_parser, currency_symbol, fonts, timings, overlay):
+        """排版并绘制一页的基础图像；只引用易变字段的文本组件不绘制，以 (组件, x偏移, y偏移) 追加到overlay"""
+        render_start = time.perf_counter()
         # 创建一个白色背景的图像
+        mode = self.color_mode
         width, height = mrt_parser.page_settings['width'], mrt_parser.page_settings['height']
-        image = Image.new('RGB', (width, height), color='white')
+        image = Image.new(mode, (width, height), color=ink('white', mode))
         draw = ImageDraw.Draw(image)
         
         # 绘制页面边框 - 模拟打印纸张效果
         margin = 3  # 提高分辨率后，边框也应相应调整
-        draw.rectangle([margin, margin, width-margin, height-margin], outline='lightgray', width=2)
+        draw.rectangle([margin, margin, width-margin, height-margin], outline=ink('lightgray', mode), width=2)
 
-        # 默认字体作为后备
-        default_font = ImageFont.load_default()
-
-        # 确保有一个中文字体可用 - 优先使用宋体(simsun.ttc)，其次尝试其他常见中文字体
-        chinese_font_path = None
-        # 调整字体搜索顺序，将宋体放在首位
-        for font_name in ['simsun.ttc', 'simhei.ttf', 'msyh.ttc', 'simkai.ttf']:
-            potential_path = os.path.join(os.environ.get('WINDIR', ''), 'Fonts', font_name)
-            if os.path.exists(potential_path):
-                chinese_font_path = potential_path
-                print(f"找到中文字体: {font_name}")
-                break
-
-        if not chinese_font_path:
-            print("警告: 无法找到中文字体，中文可能无法正确显示")
+        # 计算居中偏移量 - 让内容整体居中显示
+        center_offset_x, center_offset_y = page_offsets(width)
+        
+        # 排版：计算每个组件的位置、文本和字体，按组件顺序记录绘制操作
+        draw_ops = []
+        # 右对齐、居中文本需要测量宽度，排版完成后批量测量
+        measure_requests = []
+        for placement in page.placements:
+            # 带区内组件的位置相对于带区顶部
+            self._layout_components(placement.components, placement.data, currency_symbol, fonts,
+                                    center_offset_x, center_offset_y + placement.top * PIXELS_PER_CM,
+                                    draw_ops, measure_requests, overlay)
+        self._align_texts(measure_requests)
+
+        # 绘制
+        draw_times = self._draw_ops(image, draw, draw_ops, mrt_parser)
+        draw_time = sum(draw_times)
+        timings['draw'] = draw_time
+        timings['draw_text'], timings['draw_image'], timings['draw_line'] = draw_times
+        timings['layout'] = time.perf_counter() - render_start - draw_time
 
-        # 字体缓存，避免重复创建相同的字体对象
-        font_cache = {}
+        return image
 
-        # Stimulsoft MRT文件使用厘米作为单位，提高分辨率到200 DPI
-        # 1厘米 = 200/2.54 = 78.74像素 (200 DPI)
-        PIXELS_PER_CM = 78.74  # 进一步提高分辨率，让图像更清晰
+    def _draw_overlay(self, image, overlay, data, mrt_parser, currency_symbol, fonts, timings):
+        """在基础图像上绘制叠加层：只引用易变字段的文本组件，以及模板中没有打印时间字段时页脚的打印时间"""
+        start = time.perf_counter()
+        draw = ImageDraw.Draw(image)
+        draw_ops = []
+        measure_requests = []
+        for component, offset_x, offset_y in overlay:
+            # 易变字段都是顶层字段，直接从整份数据取值
+            self._layout_components((component,), data, currency_symbol, fonts, offset_x, offset_y,
+                                    draw_ops, measure_requests)
+        self._align_texts(measure_requests)
+        draw_text_time = self._draw_ops(image, draw, draw_ops, mrt_parser)[0]
 
-        # 添加调试信息
-        print(f"解析到 {len(mrt_parser.components)} 个组件")
-        
-        # 计算居中偏移量 - 让内容整体居中显示
-        # 根据页面实际宽度计算更精确的居中偏移
-        content_width = width * 0.85  # 内容区域占页面85%
-        left_margin = (width - content_width) / 2
-        center_offset_x = left_margin - 30  # 向右偏移，让左右对称
-        center_offset_y = 20  # 向下偏移20像素
-        
-        # 绘制模板组件
-        for component in mrt_parser.components:
-            if component['type'] == 'Text':
-                # 解析矩形区域
-                rect_parts = component['rect'].split(',') if component['rect'] else [0, 0, 1, 1]
-                if len(rect_parts) >= 4:
+        # 仅在模板中没有相应字段时添加打印时间
+        if not mrt_parser.has_print_time:
+            # 页脚字体也需要适应高分辨率
+            footer_font = fonts['default']
+            if fonts['chinese_path']:
+                try:
+                    footer_font = ImageFont.truetype(fonts['chinese_path'], FOOTER_FONT_SIZE)
+                except OSError:
+                    pass
+            # 页脚位置也需要适应高分辨率和居中偏移
+            footer_x, footer_y = print_time_position(image.width, image.height)
+            draw_start = time.perf_counter()
+            draw.text((footer_x, footer_y), f"打印时间: {self.clock().strftime('%Y-%m-%d %H:%M:%S')}",
+                      fill='black', font=footer_font)
+            draw_text_time += time.perf_counter() - draw_start
+
+        timings['draw'] = timings.get('draw', 0.0) + draw_text_time
+        timings['draw_text'] = timings.get('draw_text', 0.0) + draw_text_time
+        timings['layout'] = timings.get('layout', 0.0) + time.perf_counter() - start - draw_text_time
+
+    @staticmethod
+    def _align_texts(measure_requests):
+        """根据对齐方式调整文本位置，所有文本宽度一次批量测量（结果在进程内缓存）"""
+        if not measure_requests:
+            return
+        text_widths = text_measurer.measure_many([(op[4], op[3]) for op, _, _ in measure_requests])
+        for (op, text_alignment, width_comp), text_width in zip(measure_requests, text_widths):
+            if text_alignment == 'Right':
+                # 右对齐
+                op[1] += width_comp - text_width
+            else:
+                # 居中对齐
+                op[1] += (width_comp - text_width) / 2
+
+    def _draw_ops(self, image, draw, draw_ops, mrt_parser):
+        """按顺序执行绘制操作，返回绘制文字、图像和线条的耗时"""
+        mode = self.color_mode
+        draw_text_time = draw_image_time = draw_line_time = 0.0
+        for op in draw_ops:
+            if op[0] == 'text':
+                _, x, y, text, font_to_use, should_bold = op
+                # 绘制文本，如果需要加粗，使用多次绘制技术
+                draw_start = time.perf_counter()
+                if should_bold:
+                    # 通过在周围绘制多次来实现加粗效果，使用更粗的效果
+                    for dx in [-1, 0, 1]:
+                        for dy in [-1, 0, 1]:
+                            if dx != 0 or dy != 0:  # 不绘制中心点
+                                draw.text((x + dx, y + dy), text, fill='black', font=font_to_use)
+                    # 额外绘制一次稍微偏移的版本以增强加粗效果
+                    draw.text((x + 1, y), text, fill='black', font=font_to_use)
+                    draw.text((x, y + 1), text, fill='black', font=font_to_use)
+
+                # 绘制主文本
+                draw.text((x, y), text, fill='black', font=font_to_use)
+                draw_text_time += time.perf_counter() - draw_start
+
+            elif op[0] == 'image':
+                _, x, y, width_comp, height_comp, image_data = op
+                # 图像在模板缓存中已转换为绘制尺寸和颜色模式，直接粘贴
+                draw_start = time.perf_counter()
+                img = mrt_parser.prepared_image(image_data, int(width_comp), int(height_comp), mode)
+                if img is not None:
+                    image.paste(img, (int(x), int(y)))
+                else:
+                    # 如果图像无法加载，绘制一个占位符
+                    draw.rectangle([x, y, x + width_comp, y + height_comp], outline=ink('gray', mode), width=1)
+                draw_image_time += time.perf_counter() - draw_start
+
+            elif op[0] == 'line':
+                _, x1, y1, x2, y2, line_color = op
+                draw_start = time.perf_counter()
+                draw.line([(x1, y1), (x2, y2)], fill=ink(line_color, mode), width=2)  # 高分辨率下线条更粗
+                draw_line_time += time.perf_counter() - draw_start
+        return draw_text_time, draw_image_time, draw_line_time
+
+    def _layout_components(self, components, data, currency_symbol, fonts, offset_x, offset_y,
+                           draw_ops, measure_requests, overlay=None):
+        """
+        计算组件的位置、文本和字体，追加到draw_ops；需要按对齐方式测量宽度的文本追加到measure_requests
+
+        overlay不为空时，只引用易变字段的文本组件不排版，以 (组件, x偏移, y偏移) 追加到overlay
+        """
+        default_font = fonts['default']
+        chinese_font_path = fonts['chinese_path']
+        font_cache = fonts['cache']
+        for component in components:
+            component_type = component.type
+            if component_type == 'Text':
+                if overlay is not None and component.volatile:
+                    overlay.append((component, offset_x, offset_y))
+                    continue
+                # 位置和尺寸在解析模板时已转换为数值（厘米）
+                if component.valid:
                     # 使用正确的转换因子，并添加居中偏移
-                    x = float(rect_parts[0]) * PIXELS_PER_CM + center_offset_x
-                    y = float(rect_parts[1]) * PIXELS_PER_CM + center_offset_y
-                    width_comp = float(rect_parts[2]) * PIXELS_PER_CM
-                    height_comp = float(rect_parts[3]) * PIXELS_PER_CM
-
-                    # 获取文本内容
-                    text = component['text']
-
-                    # 处理混合内容（如 "{ArrayList.sSchoolName}{ArrayList.Title}"）
-                    if text and '{' in text and '}' in text:
-                        # 替换所有数据字段
-                        while '{ArrayList.' in text and '}' in text:
-                            start_idx = text.find('{ArrayList.')
-                            end_idx = text.find('}', start_idx)
-                            if (start_idx != -1 and end_idx != -1):
-                                field_name = text[start_idx+11:end_idx]  # 去掉 {ArrayList.
-                                if field_name in data:
-                                    # 替换数据字段为实际值
-                                    replacement = str(data[field_name])
-                                    text = text[:start_idx] + replacement + text[end_idx+1:]
-                                else:
-                                    # 找不到数据，用空字符串替换
-                                    text = text[:start_idx] + "" + text[end_idx+1:]
+                    x = component.x * PIXELS_PER_CM + offset_x
+                    y = component.y * PIXELS_PER_CM + offset_y
+                    width_comp = component.width * PIXELS_PER_CM
 
-                    # 替换文本中可能存在的货币符号HTML实体
-                    text = text.replace('&yen;', '¥')  # 替换HTML实体为普通人民币符号
+                    # 替换数据字段（如 "{ArrayList.sSchoolName}{ArrayList.Title}"），表达式在解析模板时已编译
+                    # has_special_chars: 文本是否包含中文字符或特殊符号（如人民币符号¥）
+                    expr = component.expr or compile_text(component.text, component.text_format)
+                    text, has_special_chars = expr.render(data, currency_symbol)
 
                     # 渲染文本
                     if text and not text.startswith('{'):
                         # 从组件中获取字体信息
-                        font_info = component.get('font', {'name': 'Arial', 'size': 9, 'bold': False})
-                        font_name = font_info.get('name', 'Arial')
-                        font_size = font_info.get('size', 9)
-                        font_bold = font_info.get('bold', False)
-
-                        # 检查文本是否包含中文字符或特殊符号（如人民币符号¥）
-                        has_chinese = any('\u4e00' <= char <= '\u9fff' for char in text)
-                        has_special_chars = '¥' in text or '￥' in text or any(ord(char) > 127 for char in text)
-                        
+                        font_info = component.font
+                        font_name = font_info.name
+                        font_size = font_info.size
+
                         # 检查是否需要加粗显示
-                        should_bold = (
-                            '余额' in text or
-                            '提现凭证' in text or
-                            '南昌学校' in text or
-                            ('学校' in text and '凭证' in text) or
-                            'Title' in text or  # 包含Title的文字
-                            component.get('font', {}).get('bold', False) or
-                            font_bold or
-                            font_size >= 10.5  # 较大字体也加粗
-                        )
+                        should_bold = needs_bold(text, font_info)
                         
                         # 添加调试信息
                         if should_bold:
-                            print(f"加粗文字: {text[:20]}{'...' if len(text) > 20 else ''}")
+                            debug_sampled(logger, "加粗文字: %.20s", text)
 
                         # 对于包含中文或特殊字符的文本，使用中文字体
-                        if has_chinese or has_special_chars:
+                        if has_special_chars:
                             # 如果包含中文或特殊字符，使用中文字体
                             font_key = f"chinese_{font_size}_{should_bold}"
                             if font_key in font_cache:
@@ -657,10 +1197,7 @@ class ProofPrintSimulator:
                                 try:
                                     if chinese_font_path:
                                         # 字体大小按比例调整，由于分辨率提高到200 DPI，需要相应调整字体大小
-                                        # 提高分辨率后，字体大小需要进一步放大
-                                        base_size = max(16, int(font_size * 2.7))  # 至少16像素，放大2.7倍
-                                        # 对于加粗文字，稍微增加字体大小，但主要靠多次绘制实现
-                                        adjusted_size = int(base_size * 1.1) if should_bold else base_size
+                                        adjusted_size = font_pixel_size(font_size, should_bold)
                                         font_to_use = ImageFont.truetype(chinese_font_path, adjusted_size)
                                         font_cache[font_key] = font_to_use
                                     else:
@@ -668,7 +1205,7 @@ class ProofPrintSimulator:
                                         font_to_use = default_font
                                         font_cache[font_key] = font_to_use
                                 except Exception as e:
-                                    print(f"加载中文字体失败: {str(e)}")
+                                    logger.warning("加载中文字体失败: %s", e)
                                     font_to_use = default_font
                                     font_cache[font_key] = font_to_use
                         else:
@@ -692,23 +1229,19 @@ class ProofPrintSimulator:
                                             # 使用默认字体
                                             font_to_use = default_font
                                             font_cache[font_key] = font_to_use
-                                            draw.text((x, y), text, fill='black', font=font_to_use)
+                                            draw_ops.append(['text', x, y, text, font_to_use, False])
                                             continue
 
                                     # 对于非中文字体，使用调整后的大小
-                                    base_size = max(16, int(font_size * 2.7))  # 至少16像素，放大2.7倍
-                                    # 对于加粗文字，稍微增加字体大小，但主要靠多次绘制实现
-                                    adjusted_size = int(base_size * 1.1) if should_bold else base_size
+                                    adjusted_size = font_pixel_size(font_size, should_bold)
                                     font_to_use = ImageFont.truetype(font_path, adjusted_size)
                                     font_cache[font_key] = font_to_use
                                 except Exception as e:
-                                    print(f"加载字体失败 {font_name} 大小 {font_size}: {str(e)}")
+                                    logger.warning("加载字体失败 %s 大小 %s: %s", font_name, font_size, e)
                                     # 如果加载失败，尝试使用中文字体
                                     if chinese_font_path:
                                         try:
-                                            base_size = max(16, int(font_size * 2.7))  # 同样放大
-                                            # 对于加粗文字，稍微增加字体大小，但主要靠多次绘制实现
-                                            adjusted_size = int(base_size * 1.1) if should_bold else base_size
+                                            adjusted_size = font_pixel_size(font_size, should_bold)
                                             font_to_use = ImageFont.truetype(chinese_font_path, adjusted_size)
                                             font_cache[font_key] = font_to_use
                                         except:
@@ -719,79 +1252,30 @@ class ProofPrintSimulator:
                                         font_cache[font_key] = font_to_use
 
                         # 获取文本对齐方式
-                        text_alignment = component.get('alignment', 'Left')  # 默认左对齐
-                        
-                        # 根据对齐方式调整文本位置
-                        if text_alignment == 'Right':
-                            # 右对齐 - 计算文本宽度并调整x坐标
-                            text_bbox = draw.textbbox((0, 0), text, font=font_to_use)
-                            text_width = text_bbox[2] - text_bbox[0]
-                            x = x + width_comp - text_width
-                        elif text_alignment == 'Center':
-                            # 居中对齐
-                            text_bbox = draw.textbbox((0, 0), text, font=font_to_use)
-                            text_width = text_bbox[2] - text_bbox[0]
-                            x = x + (width_comp - text_width) / 2
-
-                        # 绘制文本，如果需要加粗，使用多次绘制技术
-                        if should_bold:
-                            # 通过在周围绘制多次来实现加粗效果，使用更粗的效果
-                            for dx in [-1, 0, 1]:
-                                for dy in [-1, 0, 1]:
-                                    if dx != 0 or dy != 0:  # 不绘制中心点
-                                        draw.text((x + dx, y + dy), text, fill='black', font=font_to_use)
-                            # 额外绘制一次稍微偏移的版本以增强加粗效果
-                            draw.text((x + 1, y), text, fill='black', font=font_to_use)
-                            draw.text((x, y + 1), text, fill='black', font=font_to_use)
-                        
-                        # 绘制主文本
-                        draw.text((x, y), text, fill='black', font=font_to_use)
+                        text_alignment = component.alignment  # 默认左对齐
 
-            elif component['type'] == 'Image' and component.get('image_data'):
-                # 解析矩形区域
-                rect_parts = component['rect'].split(',') if component['rect'] else [0, 0, 1, 1]
-                if len(rect_parts) >= 4:
+                        op = ['text', x, y, text, font_to_use, should_bold]
+                        if text_alignment in ('Right', 'Center'):
+                            measure_requests.append((op, text_alignment, width_comp))
+                        draw_ops.append(op)
+
+            elif component_type == 'Image' and component.image_data:
+                if component.valid:
                     # 使用正确的转换因子，并添加居中偏移
-                    x = float(rect_parts[0]) * PIXELS_PER_CM + center_offset_x
-                    y = float(rect_parts[1]) * PIXELS_PER_CM + center_offset_y
-                    width_comp = float(rect_parts[2]) * PIXELS_PER_CM
-                    height_comp = float(rect_parts[3]) * PIXELS_PER_CM
-
-                    # 尝试解码图像数据
-                    try:
-                        image_data = component['image_data']
-                        if image_data:
-                            # 解码Base64
-                            img_bytes = base64.b64decode(image_data)
-                            img = Image.open(io.BytesIO(img_bytes))
-
-                            # 调整大小并粘贴到主图像
-                            img = img.resize((int(width_comp), int(height_comp)), Image.Resampling.LANCZOS)
-                            
-                            # 如果图像有透明度，需要处理alpha通道
-                            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                                # 创建一个白色背景
-                                background = Image.new('RGB', img.size, (255, 255, 255))
-                                if img.mode == 'P':
-                                    img = img.convert('RGBA')
-                                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                                img = background
-                            
-                            image.paste(img, (int(x), int(y)))
-                    except Exception as e:
-                        print(f"处理图像时出错: {str(e)}")
-                        # 如果图像无法加载，绘制一个占位符
-                        draw.rectangle([x, y, x + width_comp, y + height_comp], outline='gray', width=1)
-
-            elif component['type'] == 'Line':
-                # 解析矩形区域
-                rect_parts = component['rect'].split(',') if component['rect'] else [0, 0, 1, 0.01]
-                if len(rect_parts) >= 4:
+                    x = component.x * PIXELS_PER_CM + offset_x
+                    y = component.y * PIXELS_PER_CM + offset_y
+                    width_comp = component.width * PIXELS_PER_CM
+                    height_comp = component.height * PIXELS_PER_CM
+
+                    draw_ops.append(['image', x, y, width_comp, height_comp, component.image_data])
+
+            elif component_type == 'Line':
+                if component.valid:
                     # 使用正确的转换因子，并添加居中偏移
-                    x1 = float(rect_parts[0]) * PIXELS_PER_CM + center_offset_x
-                    y1 = float(rect_parts[1]) * PIXELS_PER_CM + center_offset_y
-                    line_width = float(rect_parts[2]) * PIXELS_PER_CM
-                    line_height = float(rect_parts[3]) * PIXELS_PER_CM
+                    x1 = component.x * PIXELS_PER_CM + offset_x
+                    y1 = component.y * PIXELS_PER_CM + offset_y
+                    line_width = component.width * PIXELS_PER_CM
+                    line_height = component.height * PIXELS_PER_CM
 
                     # 判断是垂直线还是水平线
                     if line_height > line_width:  # 垂直线
@@ -802,42 +1286,13 @@ class ProofPrintSimulator:
                         y2 = y1
 
                     # 绘制线条，使用更合适的颜色
-                    line_color = component.get('color', 'black')
-                    if line_color.lower() in ['dimgray', 'gray']:
-                        line_color = 'gray'
-                    else:
-                        line_color = 'black'
-                    
-                    draw.line([(x1, y1), (x2, y2)], fill=line_color, width=2)  # 高分辨率下线条更粗
-
-        # 使用中文字体添加页脚信息
-        footer_font = None
-        if chinese_font_path:
-            try:
-                # 页脚字体也需要适应高分辨率
-                footer_font = ImageFont.truetype(chinese_font_path, 24)  # 进一步放大到24
-            except:
-                footer_font = default_font
-        else:
-            footer_font = default_font
-
-        # 仅在模板中没有相应字段时添加打印时间
-        if not any("打印时间" in c.get('text', '') for c in mrt_parser.components):
-            # 页脚位置也需要适应高分辨率和居中偏移
-            footer_x = width - 400 + center_offset_x  # 调整位置
-            footer_y = height - 50 + center_offset_y   # 调整位置
-            draw.text((footer_x, footer_y), f"打印时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", fill='black', font=footer_font)
-
-        # 不再添加页码显示
-        # 删除添加"第1页"的代码
-
-        return image
+                    draw_ops.append(['line', x1, y1, x2, y2, component.draw_color])
 
 
 async def simulate_print_request(message):
-    """模拟打印请求处理过程"""
+    """模拟打印请求处理过程，渲染在线程池中进行，不阻塞事件循环"""
     simulator = ProofPrintSimulator()
-    result = simulator.process_print_request(message)
+    result = await simulator.process_print_request_async(message)
     return result
 
 def main():
@@ -879,6 +1334,7 @@ def main():
     }
 
     # 运行模拟
+    setup_logging('DEBUG', sample_rate=1)
     asyncio.run(simulate_print_request(message))
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+渲染性能剖析模块
+对单次渲染请求运行cProfile，按请求ID保存剖析结果，并生成调用树摘要用于火焰图展示
+未开启剖析的请求不经过本模块，没有额外开销
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import time
+
+# 请求ID只允许字母、数字、下划线和短横线，避免被用作文件路径
+_PROFILE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def is_valid_profile_id(profile_id):
+    """检查剖析ID是否可以安全地用作文件名"""
+    return bool(profile_id) and bool(_PROFILE_ID_RE.match(profile_id))
+
+
+def _func_label(func):
+    filename, lineno, name = func
+    if filename == '~':
+        # 内置函数，如 <method 'save' of 'ImagingCore' objects>
+        return name
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+class RenderProfiler:
+    """渲染剖析器，结果保存在profile_dir中，只保留最近keep份"""
+
+    def __init__(self, profile_dir, keep=50):
+        self.profile_dir = profile_dir
+        self.keep = keep
+
+    def _path(self, profile_id, ext):
+        if not is_valid_profile_id(profile_id):
+            raise ValueError(f"无效的剖析ID: {profile_id}")
+        return os.path.join(self.profile_dir, f"{profile_id}.{ext}")
+
+    def prof_path(self, profile_id):
+        """pstats格式的剖析文件路径，可用snakeviz、gprof2dot等工具打开"""
+        return self._path(profile_id, 'prof')
+
+    def run(self, profile_id, func, *args, meta=None, **kwargs):
+        """
+        在剖析器下执行func并保存结果，返回func的返回值
+
+        meta为附加说明（如用户、凭证类型），与剖析结果一起保存
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            profiler.dump_stats(self.prof_path(profile_id))
+            info = dict(meta or {})
+            info.update({
+                'profile_id': profile_id,
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'elapsed': elapsed,
+            })
+            with open(self._path(profile_id, 'json'), 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False)
+            self._prune()
+
+    def _prune(self):
+        """删除超出保留数量的旧剖析结果"""
+        entries = self.list(limit=None)
+        for info in entries[self.keep:]:
+            for ext in ('prof', 'json'):
+                try:
+                    os.remove(self._path(info['profile_id'], ext))
+                except OSError:
+                    pass
+
+    def list(self, limit=20):
+        """最近的剖析结果说明，按时间倒序"""
+        if not os.path.isdir(self.profile_dir):
+            return []
+        entries = []
+        for filename in os.listdir(self.profile_dir):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.profile_dir, filename)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    info = json.load(f)
+                info['mtime'] = os.path.getmtime(path)
+            except (OSError, ValueError):
+                continue
+            if is_valid_profile_id(info.get('profile_id')):
+                entries.append(info)
+        entries.sort(key=lambda info: info['mtime'], reverse=True)
+        return entries if limit is None else entries[:limit]
+
+    def get(self, profile_id):
+        """单个剖析结果的说明，不存在时返回None"""
+        try:
+            with open(self._path(profile_id, 'json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def summary(self, profile_id, max_depth=12, min_fraction=0.005, top=25):
+        """
+        生成剖析摘要
+
+        返回 {'total', 'tree', 'top'}：
+        - tree为调用树（火焰图），每个节点为 {'name', 'time', 'fraction', 'children'}，
+          子节点耗时按调用边上的累计时间分配，省略占比低于min_fraction的分支
+        - top为按自身耗时排序的前top个函数
+        """
+        stats = pstats.Stats(self.prof_path(profile_id))
+        entries = stats.stats  # func -> (cc, nc, tt, ct, callers)
+
+        # 根节点：没有被其他已记录函数调用的函数（通常是runcall调用的目标函数）
+        roots = [func for func, (_, _, _, _, callers) in entries.items() if not callers]
+        total = sum(entries[func][3] for func in roots) or stats.total_tt or 1e-9
+
+        callees = {}
+        for func, (_, _, _, _, callers) in entries.items():
+            for caller, edge in callers.items():
+                # edge为 (cc, nc, tt, ct)，ct是经由该调用者产生的累计时间
+                callees.setdefault(caller, []).append((func, edge[3]))
+
+        def build(func, elapsed, depth, path):
+            node = {
+                'name': _func_label(func),
+                'time': elapsed,
+                'fraction': elapsed / total,
+                'children': [],
+            }
+            if depth >= max_depth:
+                return node
+            for child, child_time in sorted(callees.get(func, []), key=lambda item: -item[1]):
+                # 递归调用会形成环，只展开一次
+                if child in path or child_time / total < min_fraction:
+                    continue
+                # 子节点时间不超过父节点（多个调用者时按边分配是近似值）
+                node['children'].append(build(child, min(child_time, elapsed), depth + 1, path | {child}))
+            return node
+
+        tree = [build(func, entries[func][3], 0, {func}) for func in roots
+                if entries[func][3] / total >= min_fraction]
+
+        top_functions = sorted(entries.items(), key=lambda item: -item[1][2])[:top]
+        return {
+            'total': total,
+            'tree': tree,
+            'top': [{
+                'name': _func_label(func),
+                'calls': nc,
+                'self_time': tt,
+                'cumulative_time': ct,
+            } for func, (_, nc, tt, ct, _) in top_functions],
+        }
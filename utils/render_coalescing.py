@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+渲染请求合并
+多个操作员或重复点击同时请求同一张凭证时，只渲染一次，其余请求等待并共用结果：
+- 进程内：相同渲染键的并发调用由第一个线程执行，其他线程等待其结果（SingleFlight）
+- 同一节点的多个进程之间（需配置锁文件目录）：按渲染键加文件锁，等待锁的进程留下等待标记；
+  持有锁的进程渲染完成后，只在有其他进程等待时把结果写入结果文件，等待的进程拿到锁后读取结果文件，
+  不再重复渲染，最后一个读取的进程删除结果文件
+
+结果文件包含凭证图像（学员姓名、编码、金额等），只在合并期间短暂存在于磁盘上
+
+渲染键由BizType、模板版本和打印数据计算，打印数据不同（如操作员不同）时不会合并
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from .metrics import REGISTRY
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+RENDER_COALESCED = REGISTRY.counter(
+    'print_render_coalesced_total', '与进行中的相同渲染合并、未重复渲染的请求数', ('scope',))
+RENDER_COALESCE_TIMEOUTS = REGISTRY.counter(
+    'print_render_coalesce_timeouts_total', '等待进行中的相同渲染超时后自行渲染的请求数', ('scope',))
+
+# 渲染结果：output为输出标识（文件路径或文件名），pages为各页PNG数据，document为多联PDF数据（没有时为None），
+# printed_at为凭证上的打印时间（UTC，精确到秒，没有时为None）
+RenderResult = namedtuple('RenderResult', ['output', 'pages', 'cache_hit', 'document', 'printed_at'],
+                          defaults=(None, None))
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def render_key(biz_type, version, student_data, currency_symbol='¥', printed_at=None):
+    """
+    渲染键：相同的键渲染出相同的凭证
+
+    printed_at不为空时（如补打时指定原始打印时间）打印时间也是键的一部分，不同打印时间的渲染不会合并
+    """
+    parts = [biz_type, version, currency_symbol, student_data]
+    if printed_at is not None:
+        parts.append(printed_at.strftime(_TIME_FORMAT))
+    payload = json.dumps(parts, sort_keys=True,
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """进程内合并：相同key的并发调用只执行一次"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        """
+        执行fn并返回 (结果, 是否共用了其他线程的结果)；fn抛出的异常同样传给所有等待的线程
+
+        timeout不为空时等待其他线程最多timeout秒，超时抛出TimeoutError
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(key)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        """正在执行的key数量"""
+        with self._lock:
+            return len(self._calls)
+
+
+def _try_lock(fd):
+    """尝试以非阻塞方式对文件加排他锁"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class RenderCoalescer:
+    """
+    渲染请求合并器
+
+    lock_dir为空时只在进程内合并；不为空时同一节点上使用该目录的进程之间也会合并。
+    等待其他线程或进程超过wait_timeout秒时不再等待，自行渲染；结果文件在最后一个等待的进程读取后删除，
+    进程异常退出等原因遗留的文件超过max_age秒后由后台线程每sweep_interval秒清理一次
+    """
+
+    def __init__(self, lock_dir=None, wait_timeout=30, poll_interval=0.02, max_age=60, sweep_interval=60):
+        self.lock_dir = lock_dir
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._flight = SingleFlight()
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+            # 清理不依赖新的渲染请求，空闲节点上遗留的结果文件同样会被删除
+            threading.Thread(target=self._sweep_loop, name='render-lock-sweeper', daemon=True).start()
+
+    def render(self, key, fn):
+        """返回渲染结果（RenderResult，渲染失败时为None），fn执行实际的渲染"""
+        try:
+            result, shared = self._flight.do(key, lambda: self._render_locked(key, fn), timeout=self.wait_timeout)
+        except TimeoutError:
+            # 持有文件锁的是本进程的其他线程，不再经过文件锁，直接渲染
+            RENDER_COALESCE_TIMEOUTS.inc(scope='thread')
+            logger.warning("等待其他线程渲染超时，自行渲染: %s", key[:12])
+            return fn()
+        if shared:
+            RENDER_COALESCED.inc(scope='thread')
+        return result
+
+    def _render_locked(self, key, fn):
+        if not self.lock_dir:
+            return fn()
+
+        start = time.time()
+        result_path = os.path.join(self.lock_dir, key + '.json')
+        fd = os.open(os.path.join(self.lock_dir, key + '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        acquired = False
+        waiter_path = None
+        try:
+            acquired = _try_lock(fd)
+            if not acquired:
+                # 其他进程正在渲染同一张凭证，留下等待标记，渲染的进程据此决定是否写入结果文件
+                waiter_path = os.path.join(self.lock_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.wait")
+                open(waiter_path, 'w').close()
+                deadline = time.monotonic() + self.wait_timeout
+                while not acquired and time.monotonic() < deadline:
+                    time.sleep(self.poll_interval)
+                    acquired = _try_lock(fd)
+                if not acquired:
+                    RENDER_COALESCE_TIMEOUTS.inc(scope='process')
+                    logger.warning("等待其他进程渲染超时，自行渲染: %s", key[:12])
+
+            # 本请求开始后才写入的结果来自与本请求同时进行的渲染，可以直接使用
+            shared = self._read_result(result_path, key, start)
+            if waiter_path:
+                _remove(waiter_path)
+                waiter_path = None
+            if shared is not None:
+                RENDER_COALESCED.inc(scope='process')
+                # 持有锁时检查，没有其他进程等待时本进程是最后一个读取的
+                if acquired and not self._has_waiters(key):
+                    _remove(result_path)
+                return shared
+
+            result = fn()
+            # 没有其他进程等待时不写结果文件，凭证数据不落盘
+            if acquired and result is not None and self._has_waiters(key):
+                self._write_result(result_path, key, result)
+            return result
+        finally:
+            if waiter_path:
+                _remove(waiter_path)
+            if acquired:
+                _unlock(fd)
+            os.close(fd)
+
+    def _has_waiters(self, key):
+        prefix = key + '.'
+        try:
+            return any(name.startswith(prefix) and name.endswith('.wait') for name in os.listdir(self.lock_dir))
+        except OSError:
+            return False
+
+    @staticmethod
+    def _read_result(path, key, since):
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('key') != key:
+            return None
+        document = record.get('document')
+        printed_at = record.get('printed_at')
+        return RenderResult(record['output'], [base64.b64decode(page) for page in record['pages']],
+                            record['cache_hit'], base64.b64decode(document) if document else None,
+                            datetime.strptime(printed_at, _TIME_FORMAT) if printed_at else None)
+
+    @staticmethod
+    def _write_result(path, key, result):
+        record = {
+            'key': key,
+            'output': result.output,
+            'pages': [base64.b64encode(page).decode() for page in result.pages],
+            'cache_hit': result.cache_hit,
+            'document': base64.b64encode(result.document).decode() if result.document else None,
+            'printed_at': result.printed_at.strftime(_TIME_FORMAT) if result.printed_at else None,
+        }
+        # 先写临时文件再替换，读取方不会读到写了一半的结果
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            # 结果文件包含学员信息，只允许运行服务的用户读取
+            with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600),
+                           'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("写入渲染结果失败 %s: %s", path, e)
+            _remove(temp_path)
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+
+    def sweep(self):
+        """删除过期的锁文件、等待标记和结果文件"""
+        cutoff = time.time() - self.max_age
+        try:
+            names = os.listdir(self.lock_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                # 正在渲染的锁文件不删除
+                if name.endswith('.lock') and not self._lock_free(path):
+                    continue
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _lock_free(path):
+        fd = os.open(path, os.O_RDWR)
+        try:
+            free = _try_lock(fd)
+            if free:
+                _unlock(fd)
+            return free
+        finally:
+            os.close(fd)
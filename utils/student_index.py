@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+学员搜索索引模块
+在内存中维护学员编码和姓名的索引，支持：
+- 学员编码前缀匹配（如 NC60801、6080119）
+- 姓名前缀及子串匹配（基于单字/双字n-gram倒排索引）
+- 姓名拼音首字母匹配（如 wcy 匹配 王淳懿）
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from .pinyin_table import FIRST, LAST, INITIALS
+
+logger = logging.getLogger(__name__)
+
+# 作为姓氏时读音与常用读音不同的字，姓名第一个字使用姓氏读音
+_SURNAME_INITIALS = {
+    '曾': 'z', '单': 's', '解': 'x', '仇': 'q', '区': 'o', '查': 'z', '翟': 'z', '乐': 'y', '覃': 'q',
+    '尉': 'y', '长': 'c', '种': 'c', '秘': 'b', '繁': 'p', '句': 'g', '召': 's', '隗': 'w', '重': 'c',
+    '藏': 'z', '祭': 'z', '蕃': 'p',
+}
+
+
+def pinyin_initial(char):
+    """获取单个字符的拼音首字母，字母和数字原样返回（小写），无法识别时返回'?'"""
+    if char.isascii():
+        return char.lower()
+    code = ord(char)
+    if FIRST <= code <= LAST:
+        return INITIALS[code - FIRST]
+    return '?'
+
+
+def pinyin_initials(text):
+    """获取姓名的拼音首字母（第一个字按姓氏读音），例如 王淳懿 -> wcy、曾小贤 -> zxx"""
+    if not text:
+        return ''
+    first = _SURNAME_INITIALS.get(text[0]) or pinyin_initial(text[0])
+    return first + ''.join(pinyin_initial(char) for char in text[1:])
+
+
+def _digits_key(student_code):
+    """去掉学员编码的字母前缀，例如 NC6080119755 -> 6080119755"""
+    return student_code.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+
+def _name_grams(name):
+    """姓名的单字和双字n-gram"""
+    grams = set(name)
+    grams.update(name[i:i + 2] for i in range(len(name) - 1))
+    return grams
+
+
+class StudentSearchIndex:
+    """学员编码和姓名的内存搜索索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.last_refresh = None
+        self._refresh_thread = None
+
+    def _reset(self):
+        self._names = {}        # 学员编码 -> 姓名
+        self._codes = []        # 排序后的学员编码
+        self._digit_keys = []   # 排序后的 (编码数字部分, 学员编码)
+        self._name_keys = []    # 排序后的 (姓名, 学员编码)
+        self._initials = []     # 排序后的 (拼音首字母, 学员编码)
+        self._grams = {}        # n-gram -> 学员编码集合
+
+    def __len__(self):
+        return len(self._names)
+
+    # ------------------------------------------------------------------
+    # 维护索引
+    # ------------------------------------------------------------------
+    def refresh(self, source):
+        """从学员数据源全量重建索引，重建期间旧索引仍可查询"""
+        new_index = StudentSearchIndex()
+        names = {}
+        for student_code, student_name in source.iter_students():
+            names[student_code.upper()] = student_name or ''
+        new_index._build(names)
+
+        with self._lock:
+            self._names = new_index._names
+            self._codes = new_index._codes
+            self._digit_keys = new_index._digit_keys
+            self._name_keys = new_index._name_keys
+            self._initials = new_index._initials
+            self._grams = new_index._grams
+            self.last_refresh = time.time()
+        return len(names)
+
+    def _build(self, names):
+        self._names = names
+        self._codes = sorted(names)
+        self._digit_keys = sorted((_digits_key(code), code) for code in names)
+        self._name_keys = sorted((name, code) for code, name in names.items())
+        self._initials = sorted((pinyin_initials(name), code) for code, name in names.items())
+        grams = {}
+        for code, name in names.items():
+            for gram in _name_grams(name):
+                grams.setdefault(gram, set()).add(code)
+        self._grams = grams
+
+    def upsert(self, student_code, student_name):
+        """增量添加或更新单个学员"""
+        student_code = student_code.upper()
+        student_name = student_name or ''
+        with self._lock:
+            old_name = self._names.get(student_code)
+            if old_name == student_name:
+                return
+            if old_name is not None:
+                self._remove_locked(student_code, old_name)
+            self._names[student_code] = student_name
+            insort(self._codes, student_code)
+            insort(self._digit_keys, (_digits_key(student_code), student_code))
+            insort(self._name_keys, (student_name, student_code))
+            insort(self._initials, (pinyin_initials(student_name), student_code))
+            for gram in _name_grams(student_name):
+                self._grams.setdefault(gram, set()).add(student_code)
+
+    def remove(self, student_code):
+        """从索引中删除学员"""
+        student_code = student_code.upper()
+        with self._lock:
+            old_name = self._names.pop(student_code, None)
+            if old_name is not None:
+                self._remove_locked(student_code, old_name)
+
+    def _remove_locked(self, student_code, old_name):
+        self._names.pop(student_code, None)
+        for items, key in ((self._codes, student_code),
+                           (self._digit_keys, (_digits_key(student_code), student_code)),
+                           (self._name_keys, (old_name, student_code)),
+                           (self._initials, (pinyin_initials(old_name), student_code))):
+            pos = bisect_left(items, key)
+            if pos < len(items) and items[pos] == key:
+                del items[pos]
+        for gram in _name_grams(old_name):
+            codes = self._grams.get(gram)
+            if codes:
+                codes.discard(student_code)
+                if not codes:
+                    del self._grams[gram]
+
+    def start_auto_refresh(self, source, interval):
+        """启动后台线程，立即构建索引并每隔interval秒重建一次（interval为0时只构建一次）"""
+        def run():
+            while True:
+                try:
+                    count = self.refresh(source)
+                    logger.info("学员搜索索引已刷新，共 %d 名学员", count)
+                except Exception:
+                    logger.exception("刷新学员搜索索引失败")
+                if interval <= 0:
+                    break
+                time.sleep(interval)
+
+        self._refresh_thread = threading.Thread(target=run, name='student-index-refresh', daemon=True)
+        self._refresh_thread.start()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _prefix_scan(items, prefix, limit, seen, results):
+        """在排序数组中按前缀扫描，items元素为 (key, 学员编码) 或学员编码"""
+        pos = bisect_left(items, (prefix,) if items and isinstance(items[0], tuple) else prefix)
+        while pos < len(items) and len(results) < limit:
+            item = items[pos]
+            key, code = item if isinstance(item, tuple) else (item, item)
+            if not key.startswith(prefix):
+                break
+            if code not in seen:
+                seen.add(code)
+                results.append(code)
+            pos += 1
+
+    def search(self, query, limit=10):
+        """
+        搜索学员，返回 [{'student_code', 'student_name'}]
+
+        排序：编码前缀 > 姓名前缀 > 拼音首字母前缀 > 姓名包含
+        """
+        query = (query or '').strip()
+        if not query:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            if query.isascii():
+                upper = query.upper()
+                self._prefix_scan(self._codes, upper, limit, seen, results)
+                if upper.isdigit():
+                    self._prefix_scan(self._digit_keys, upper, limit, seen, results)
+                if query.isalpha():
+                    self._prefix_scan(self._initials, query.lower(), limit, seen, results)
+            else:
+                self._prefix_scan(self._name_keys, query, limit, seen, results)
+                if len(results) < limit:
+                    self._substring_scan(query, limit, seen, results)
+
+            return [{'student_code': code, 'student_name': self._names.get(code, '')} for code in results]
+
+    def _substring_scan(self, query, limit, seen, results):
+        """通过n-gram倒排索引查找姓名中包含query的学员"""
+        grams = [query] if len(query) <= 2 else [query[i:i + 2] for i in range(len(query) - 1)]
+        postings = []
+        for gram in grams:
+            codes = self._grams.get(gram)
+            if not codes:
+                return
+            postings.append(codes)
+        postings.sort(key=len)
+
+        for code in postings[0]:
+            if len(results) >= limit:
+                break
+            if code in seen:
+                continue
+            if all(code in codes for codes in postings[1:]) and query in self._names.get(code, ''):
+                seen.add(code)
+                results.append(code)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+学员数据源模块
+提供学员信息及可打印凭证的查询接口，支持：
+- FixtureStudentSource: 内置示例数据
+- SqlStudentSource: 通过连接池查询学员系统数据库
+- SqliteStudentSource: 本地SQLite替身，用于测试和演示
+- CachedStudentSource: 按学员编码缓存查询结果（含未找到结果的负缓存）
+"""
+
+import copy
+import json
+
+from sqlalchemy import create_engine, text
+
+from .cache import TTLCache
+
+# 内置示例数据
+# sOperator 和 dtCreate 与当前请求相关，由调用方在返回前填充
+FIXTURE_STUDENTS = {
+    'NC6080119755': {
+        'student_name': '王淳懿',
+        'gender': '未知',
+        'reports': [
+            {
+                'biz_type': 6,
+                'biz_name': '学员账户充值提现凭证',
+                'data': {
+                    "nSchoolId": 35,
+                    "sSchoolName": "南昌学校",
+                    "sTelePhone": "400-175-9898",
+                    "Title": "提现凭证",
+                    "PrintNumber": 1,
+                    "YNVIEWPrint": 1,
+                    "PrintDocument": "",
+                    "sStudentCode": "NC6080119755",
+                    "sStudentName": "王淳懿",
+                    "sGender": "未知",
+                    "sPay": "提现金额：¥1499.00",
+                    "dSumBalance": "余额：¥0.00",
+                    "sPayType": "提现方式：现金支付¥1499.00",
+                    "dtCreateDate": "2025-06-04 09:04:30",
+                    "sProofName": "提现凭证",
+                    "sBizType": "提现",
+                    "nBizId": 126560050,
+                    "sRegZoneName": "客服行政"
+                }
+            },
+        ]
+    },
+    'NC6080119756': {
+        'student_name': '张三',
+        'gender': '男',
+        'reports': [
+            {
+                'biz_type': 6,
+                'biz_name': '学员账户充值提现凭证',
+                'data': {
+                    "nSchoolId": 35,
+                    "sSchoolName": "南昌学校",
+                    "sTelePhone": "400-175-9898",
+                    "Title": "提现凭证",
+                    "PrintNumber": 1,
+                    "YNVIEWPrint": 1,
+                    "PrintDocument": "",
+                    "sStudentCode": "NC6080119756",
+                    "sStudentName": "张三",
+                    "sGender": "男",
+                    "sPay": "报名费用：¥3999.00",
+                    "dSumBalance": "余额：¥0.00",
+                    "sPayType": "支付方式：支付宝¥3999.00",
+                    "dtCreateDate": "2025-06-04 10:30:20",
+                    "sProofName": "学员账户充值提现凭证",
+                    "sBizType": "提现",
+                    "nBizId": 126560002,
+                    "sRegZoneName": "客服行政"
+                }
+            }
+        ]
+    }
+}
+
+
+class StudentDataSource:
+    """
+    学员数据源接口
+
+    get_student 返回 {'student_name', 'gender', 'reports': [{'biz_type', 'biz_name', 'data'}]}，
+    找不到学员时返回None
+    """
+
+    def get_student(self, student_code):
+        raise NotImplementedError
+
+    def iter_students(self):
+        """遍历所有学员，生成 (student_code, student_name)"""
+        raise NotImplementedError
+
+    def close(self):
+        """释放数据源占用的资源"""
+        pass
+
+
+class FixtureStudentSource(StudentDataSource):
+    """内置示例数据源"""
+
+    def __init__(self, students=None):
+        self.students = FIXTURE_STUDENTS if students is None else students
+
+    def get_student(self, student_code):
+        student = self.students.get(student_code)
+        return copy.deepcopy(student) if student is not None else None
+
+    def iter_students(self):
+        for student_code, student in self.students.items():
+            yield student_code, student['student_name']
+
+
+class SqlStudentSource(StudentDataSource):
+    """
+    基于SQL数据库的学员数据源，使用SQLAlchemy连接池
+
+    默认表结构：
+    - student(student_code, student_name, gender)
+    - student_report(student_code, biz_type, biz_name, data)，data 为凭证数据的JSON字符串
+    对接实际学员系统时可在子类中覆盖 STUDENT_SQL / REPORTS_SQL / LIST_SQL
+    """
+
+    STUDENT_SQL = "SELECT student_name, gender FROM student WHERE student_code = :code"
+    REPORTS_SQL = ("SELECT biz_type, biz_name, data FROM student_report "
+                   "WHERE student_code = :code ORDER BY biz_type")
+    LIST_SQL = "SELECT student_code, student_name FROM student"
+
+    def __init__(self, database_uri, pool_size=5, max_overflow=10, pool_recycle=3600):
+        engine_options = {'pool_pre_ping': True}
+        if not database_uri.startswith('sqlite'):
+            engine_options.update(pool_size=pool_size, max_overflow=max_overflow, pool_recycle=pool_recycle)
+        self.engine = create_engine(database_uri, **engine_options)
+
+    def get_student(self, student_code):
+        with self.engine.connect() as conn:
+            row = conn.execute(text(self.STUDENT_SQL), {'code': student_code}).first()
+            if row is None:
+                return None
+            reports = [
+                {
+                    'biz_type': report.biz_type,
+                    'biz_name': report.biz_name,
+                    'data': json.loads(report.data) if isinstance(report.data, str) else report.data
+                }
+                for report in conn.execute(text(self.REPORTS_SQL), {'code': student_code})
+            ]
+        return {
+            'student_name': row.student_name,
+            'gender': row.gender,
+            'reports': reports
+        }
+
+    def iter_students(self):
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(self.LIST_SQL))
+            for row in result:
+                yield row.student_code, row.student_name
+
+    def close(self):
+        self.engine.dispose()
+
+
+class SqliteStudentSource(SqlStudentSource):
+    """本地SQLite学员数据源，自动建表，可用示例数据初始化，用于测试和演示"""
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS student (
+            student_code VARCHAR(50) PRIMARY KEY,
+            student_name VARCHAR(100) NOT NULL,
+            gender VARCHAR(10)
+        )""",
+        """CREATE TABLE IF NOT EXISTS student_report (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_code VARCHAR(50) NOT NULL,
+            biz_type INTEGER NOT NULL,
+            biz_name VARCHAR(50) NOT NULL,
+            data TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_student_report_code ON student_report (student_code)",
+    ]
+
+    def __init__(self, database_path='students.db', seed=None):
+        super().__init__(f'sqlite:///{database_path}')
+        with self.engine.begin() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(text(statement))
+        if seed:
+            self.load(seed)
+
+    def load(self, students):
+        """写入学员数据，格式与 FIXTURE_STUDENTS 相同，已存在的学员会被覆盖"""
+        with self.engine.begin() as conn:
+            for student_code, student in students.items():
+                conn.execute(text("DELETE FROM student_report WHERE student_code = :code"), {'code': student_code})
+                conn.execute(
+                    text("INSERT OR REPLACE INTO student (student_code, student_name, gender) "
+                         "VALUES (:code, :name, :gender)"),
+                    {'code': student_code, 'name': student['student_name'], 'gender': student.get('gender')}
+                )
+                for report in student.get('reports', []):
+                    conn.execute(
+                        text("INSERT INTO student_report (student_code, biz_type, biz_name, data) "
+                             "VALUES (:code, :biz_type, :biz_name, :data)"),
+                        {
+                            'code': student_code,
+                            'biz_type': report['biz_type'],
+                            'biz_name': report['biz_name'],
+                            'data': json.dumps(report['data'], ensure_ascii=False)
+                        }
+                    )
+
+
+# 负缓存占位对象，表示该学员编码已确认不存在
+_NOT_FOUND = object()
+
+
+class CachedStudentSource(StudentDataSource):
+    """为数据源增加按学员编码的结果缓存"""
+
+    def __init__(self, source, ttl=60, negative_ttl=10, maxsize=10000):
+        """
+        ttl: 查询结果的缓存时间（秒）
+        negative_ttl: 未找到学员时的缓存时间（秒），避免反复查询不存在的编码
+        """
+        self.source = source
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get_student(self, student_code):
+        cached = self.cache.get(student_code)
+        if cached is _NOT_FOUND:
+            return None
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        student = self.source.get_student(student_code)
+        if student is None:
+            self.cache.set(student_code, _NOT_FOUND, ttl=self.negative_ttl)
+            return None
+        self.cache.set(student_code, student)
+        return copy.deepcopy(student)
+
+    def iter_students(self):
+        return self.source.iter_students()
+
+    def invalidate(self, student_code):
+        """学员数据变更后清除缓存"""
+        self.cache.invalidate(student_code)
+
+    def close(self):
+        self.source.close()
+
+
+def create_student_source(config):
+    """根据配置创建学员数据源"""
+    source_type = config.get('STUDENT_SOURCE', 'fixture')
+    if source_type == 'sql':
+        source = SqlStudentSource(
+            config['STUDENT_DB_URI'],
+            pool_size=config.get('STUDENT_DB_POOL_SIZE', 5),
+            max_overflow=config.get('STUDENT_DB_MAX_OVERFLOW', 10)
+        )
+    elif source_type == 'sqlite':
+        source = SqliteStudentSource(config.get('STUDENT_SQLITE_PATH', 'students.db'), seed=FIXTURE_STUDENTS)
+    elif source_type == 'fixture':
+        source = FixtureStudentSource()
+    else:
+        raise ValueError(f"不支持的学员数据源: {source_type}")
+
+    if config.get('STUDENT_CACHE_TTL', 0) > 0:
+        source = CachedStudentSource(
+            source,
+            ttl=config['STUDENT_CACHE_TTL'],
+            negative_ttl=config.get('STUDENT_CACHE_NEGATIVE_TTL', 10),
+            maxsize=config.get('STUDENT_CACHE_SIZE', 10000)
+        )
+    return source
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+模板文本表达式引擎
+在解析模板时把文本组件（如 "{ArrayList.sSchoolName}退费凭证"）切分为字面文本和数据字段，
+渲染时一次拼接完成替换，并按组件的TextFormat格式化金额、日期和数字
+
+字面文本中是否包含中文等非ASCII字符在编译时确定，渲染时只需检查替换进来的数据
+"""
+
+import re
+from collections.abc import Mapping
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+# 占位符，如 {ArrayList.sStudentName}、{ArrayList.Student.sMobile}、{PageNofM}
+_PLACEHOLDER_RE = re.compile(r'\{([^{}]*)\}')
+_DATA_SOURCE = 'ArrayList.'
+# 支持的系统变量，值由排版时的页面信息提供
+_SYSTEM_VARIABLES = ('PageNumber', 'TotalPageCount', 'PageNofM')
+
+_NUMBER_RE = re.compile(r'^[+-]?\d+(\.\d+)?$')
+
+# .NET 货币格式的正数/负数模式，$ 为货币符号，n 为数值
+_CURRENCY_POSITIVE_PATTERNS = ['$n', 'n$', '$ n', 'n $']
+_CURRENCY_NEGATIVE_PATTERNS = ['($n)', '-$n', '$-n', '$n-', '(n$)', '-n$', 'n-$', 'n$-',
+                               '-n $', '-$ n', 'n $-', '$ n-', '$ -n', 'n- $', '($ n)', '(n $)']
+_NUMBER_NEGATIVE_PATTERNS = ['(n)', '-n', '- n', 'n-', 'n -']
+
+# .NET 日期格式符号与strftime的对应关系
+_DATE_TOKEN_RE = re.compile(r'yyyy|yy|MM|M|dd|d|HH|H|hh|h|mm|m|ss|s|tt|\\.|\'[^\']*\'|"[^"]*"|.', re.S)
+_DATE_TOKENS = {
+    'yyyy': '%Y', 'yy': '%y', 'MM': '%m', 'dd': '%d', 'HH': '%H', 'hh': '%I',
+    'mm': '%M', 'ss': '%S', 'tt': '%p',
+}
+_DATE_INPUT_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                       '%Y/%m/%d %H:%M:%S', '%Y/%m/%d')
+
+
+def _element_text(element, tag, default=None):
+    child = element.find(f'./{tag}') if element is not None else None
+    return child.text if child is not None and child.text is not None else default
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_text_format(element):
+    """
+    解析组件的 <TextFormat> 元素，返回格式说明字典，无格式时返回None
+
+    支持 CurrencyFormat、NumberFormat、DateFormat
+    """
+    if element is None:
+        return None
+    format_type = element.get('type', '')
+    if format_type == 'CurrencyFormat':
+        return {
+            'type': 'currency',
+            'symbol': _element_text(element, 'Symbol'),
+            'decimals': _int(_element_text(element, 'DecimalDigits'), 2),
+            'group_separator': _element_text(element, 'GroupSeparator', ','),
+            'decimal_separator': _element_text(element, 'DecimalSeparator', '.'),
+            'positive_pattern': _int(_element_text(element, 'PositivePattern'), 0),
+            'negative_pattern': _int(_element_text(element, 'NegativePattern'), 1),
+        }
+    if format_type == 'NumberFormat':
+        return {
+            'type': 'number',
+            'decimals': _int(_element_text(element, 'DecimalDigits'), 2),
+            'group_separator': _element_text(element, 'GroupSeparator', ','),
+            'decimal_separator': _element_text(element, 'DecimalSeparator', '.'),
+            'negative_pattern': _int(_element_text(element, 'NegativePattern'), 1),
+        }
+    if format_type == 'DateFormat':
+        return {
+            'type': 'date',
+            'strftime': dotnet_date_format(_element_text(element, 'StringFormat', 'yyyy-MM-dd')),
+        }
+    return None
+
+
+def dotnet_date_format(pattern):
+    """把 .NET 日期格式（如 yyyy-MM-dd HH:mm）转换为strftime格式"""
+    parts = []
+    for token in _DATE_TOKEN_RE.findall(pattern):
+        if token in _DATE_TOKENS:
+            parts.append(_DATE_TOKENS[token])
+        elif token in ('M', 'd', 'H', 'h', 'm', 's'):
+            # 不补零的单字符格式，strftime没有可移植的写法，留作占位符在format_value中填充
+            parts.append('{%s}' % token)
+        else:
+            if token.startswith('\\'):
+                token = token[1:]
+            elif token[:1] in ('"', "'"):
+                token = token[1:-1]
+            parts.append(token.replace('%', '%%').replace('{', '{{').replace('}', '}}'))
+    return ''.join(parts)
+
+
+def _to_decimal(value):
+    """数值或纯数字字符串转换为Decimal，其他值返回None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value))
+    if isinstance(value, str) and _NUMBER_RE.match(value.strip()):
+        try:
+            return Decimal(value.strip())
+        except InvalidOperation:
+            return None
+    return None
+
+
+def _group_number(amount, spec):
+    """按小数位数四舍五入并插入千位分隔符，返回绝对值部分的字符串"""
+    quantized = abs(amount).quantize(Decimal(1).scaleb(-spec['decimals'])) if spec['decimals'] > 0 \
+        else abs(amount).quantize(Decimal(1))
+    integer, _, fraction = f"{quantized:f}".partition('.')
+    if spec['group_separator']:
+        groups = []
+        while len(integer) > 3:
+            groups.insert(0, integer[-3:])
+            integer = integer[:-3]
+        groups.insert(0, integer)
+        integer = spec['group_separator'].join(groups)
+    return integer + (spec['decimal_separator'] + fraction if fraction else '')
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str):
+        text = value.strip()
+        for input_format in _DATE_INPUT_FORMATS:
+            try:
+                return datetime.strptime(text, input_format)
+            except ValueError:
+                continue
+    return None
+
+
+def format_value(value, spec, currency_symbol='¥'):
+    """
+    按格式说明格式化数据值
+
+    数据已是格式化好的文本（如 "提现金额：¥1499.00"）时原样返回
+    """
+    if value is None:
+        return ''
+    if spec is None:
+        return str(value)
+
+    if spec['type'] in ('currency', 'number'):
+        amount = _to_decimal(value)
+        if amount is None:
+            return str(value)
+        number = _group_number(amount, spec)
+        if spec['type'] == 'currency':
+            symbol = spec['symbol'] or currency_symbol
+            if amount < 0:
+                pattern = _CURRENCY_NEGATIVE_PATTERNS[spec['negative_pattern'] % len(_CURRENCY_NEGATIVE_PATTERNS)]
+            else:
+                pattern = _CURRENCY_POSITIVE_PATTERNS[spec['positive_pattern'] % len(_CURRENCY_POSITIVE_PATTERNS)]
+            return pattern.replace('n', '\0').replace('$', symbol).replace('\0', number)
+        if amount < 0:
+            pattern = _NUMBER_NEGATIVE_PATTERNS[spec['negative_pattern'] % len(_NUMBER_NEGATIVE_PATTERNS)]
+            return pattern.replace('n', number)
+        return number
+
+    if spec['type'] == 'date':
+        moment = _to_datetime(value)
+        if moment is None:
+            return str(value)
+        text = moment.strftime(spec['strftime'])
+        if '{' in text:
+            text = text.format(M=moment.month, d=moment.day, H=moment.hour,
+                               h=moment.hour % 12 or 12, m=moment.minute, s=moment.second)
+        return text
+
+    return str(value)
+
+
+def resolve_field(data, path):
+    """
+    获取字段值：优先使用扁平键（如 "Student.sMobile"），其次按层级在嵌套字典中查找
+    找不到时返回None
+    """
+    if path in data:
+        return data[path]
+    if '.' not in path:
+        return None
+    value = data
+    for name in path.split('.'):
+        if not isinstance(value, Mapping) or name not in value:
+            return None
+        value = value[name]
+    return value
+
+
+def _non_ascii(text):
+    return not text.isascii()
+
+
+class CompiledText:
+    """
+    编译后的文本组件
+
+    parts为字面文本（str）和字段路径（tuple，仅含一个元素）交替组成的列表
+    """
+
+    def __init__(self, source, text_format=None):
+        self.source = source or ''
+        self.text_format = text_format
+        self.parts = []
+        self.fields = []
+        pos = 0
+        for match in _PLACEHOLDER_RE.finditer(self.source):
+            expression = match.group(1).strip()
+            if expression in _SYSTEM_VARIABLES:
+                field = expression
+            elif expression.startswith(_DATA_SOURCE):
+                field = expression[len(_DATA_SOURCE):]
+            else:
+                # 暂不支持的表达式保留原文
+                continue
+            self._add_literal(self.source[pos:match.start()])
+            self.parts.append((field,))
+            self.fields.append(field)
+            pos = match.end()
+        self._add_literal(self.source[pos:])
+
+        literals = [part for part in self.parts if isinstance(part, str)]
+        # 不含字段的文本在编译时就能得到最终结果
+        self.is_static = not self.fields
+        self.static_text = ''.join(literals) if self.is_static else None
+        # 字面文本是否含非ASCII字符（中文、¥等），决定是否需要中文字体
+        self.literal_non_ascii = any(_non_ascii(part) for part in literals)
+
+    def _add_literal(self, text):
+        if text:
+            # 模板中的人民币符号可能以HTML实体出现
+            self.parts.append(text.replace('&yen;', '¥'))
+
+    def render(self, data, currency_symbol='¥'):
+        """
+        替换数据字段，返回 (文本, 是否含非ASCII字符)
+
+        找不到的字段替换为空字符串
+        """
+        if self.is_static:
+            return self.static_text, self.literal_non_ascii
+
+        non_ascii = self.literal_non_ascii
+        pieces = []
+        for part in self.parts:
+            if isinstance(part, str):
+                pieces.append(part)
+                continue
+            value = format_value(resolve_field(data, part[0]), self.text_format, currency_symbol)
+            if '&' in value:
+                value = value.replace('&yen;', '¥')
+            if not non_ascii and _non_ascii(value):
+                non_ascii = True
+            pieces.append(value)
+        return ''.join(pieces), non_ascii
+
+
+def compile_text(text, text_format=None):
+    """编译文本组件"""
+    return CompiledText(text, text_format)
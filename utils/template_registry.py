@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+多校区模板注册表
+按 (学校ID, BizType) 查找凭证模板：学校目录中有同名模板时使用学校的模板，否则使用默认模板
+
+    properties/                  默认模板
+    properties/schools/35/       学校35的模板，只需放入与默认模板不同的文件
+
+模板在首次使用时解析，解析结果按模板文件缓存（多个学校共用默认模板时只解析一次），
+超过缓存容量时淘汰最久未使用的模板，校区增加时内存占用不会随之无限增长；
+模板文件更新后（修改时间变化）自动重新解析
+"""
+
+import os
+import re
+
+from .cache import LRUCache
+
+# 学校ID只能包含字母、数字、下划线和短横线，避免拼接出模板目录以外的路径
+_SCHOOL_ID_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class TemplateRegistry:
+    """
+    模板注册表
+
+    default_dir: 默认模板目录
+    mapping: BizType -> 模板文件名
+    loader: 解析模板文件的函数（参数为文件路径），如MrtParser
+    schools_dir: 各学校模板目录的上级目录，为空时所有学校使用默认模板
+    maxsize: 最多缓存的已解析模板数
+    """
+
+    def __init__(self, default_dir, mapping, loader, schools_dir=None, maxsize=32):
+        self.default_dir = default_dir
+        self.mapping = mapping
+        self.schools_dir = schools_dir
+        self._loader = loader
+        # 模板路径 -> (文件修改时间, 解析结果)
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def configure(self, schools_dir=None, maxsize=None):
+        """修改学校模板目录和缓存容量，已缓存的模板全部清除"""
+        self.schools_dir = schools_dir
+        if maxsize is not None:
+            self._cache = LRUCache(maxsize=maxsize)
+        else:
+            self._cache.clear()
+
+    def school_dir(self, school_id):
+        """学校的模板目录，未配置学校模板目录或学校ID无效时返回None"""
+        if not self.schools_dir or school_id is None:
+            return None
+        school_id = str(school_id).strip()
+        if not _SCHOOL_ID_RE.match(school_id):
+            return None
+        return os.path.join(self.schools_dir, school_id)
+
+    def find(self, school_id, template_name):
+        """查找模板文件：优先使用学校目录中的同名模板，其次为默认模板，都不存在时返回None"""
+        school_dir = self.school_dir(school_id)
+        if school_dir:
+            path = os.path.join(school_dir, template_name)
+            if os.path.isfile(path):
+                return path
+        path = os.path.join(self.default_dir, template_name)
+        return path if os.path.isfile(path) else None
+
+    def resolve(self, school_id, biz_type):
+        """(学校ID, BizType) 对应的模板文件，不支持的BizType或模板不存在时返回None"""
+        template_name = self.mapping.get(biz_type)
+        if not template_name:
+            return None
+        return self.find(school_id, template_name)
+
+    def load_path(self, template_path):
+        """获取解析后的模板，返回 (解析结果, 是否命中缓存)"""
+        mtime = os.path.getmtime(template_path)
+        cached = self._cache.get(template_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], True
+
+        parsed = self._loader(template_path)
+        self._cache.set(template_path, (mtime, parsed))
+        return parsed, False
+
+    def load(self, school_id, biz_type):
+        """(学校ID, BizType) 对应的已解析模板，返回 (解析结果, 是否命中缓存)，模板不存在时返回None"""
+        template_path = self.resolve(school_id, biz_type)
+        if template_path is None:
+            return None
+        return self.load_path(template_path)
+
+    def version(self, school_id, biz_type):
+        """模板文件的版本（修改时间），用于判断缓存的渲染结果是否仍然有效；模板不存在时返回None"""
+        template_path = self.resolve(school_id, biz_type)
+        if template_path is None:
+            return None
+        try:
+            return os.stat(template_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def clear(self):
+        """清空已解析模板的缓存"""
+        self._cache.clear()
+
+    def stats(self):
+        """缓存使用情况"""
+        return {'cached': len(self._cache), 'maxsize': self._cache.maxsize,
+                'hits': self._cache.hits, 'misses': self._cache.misses}
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文本测量缓存
+右对齐、居中文本在排版时需要测量宽度，学校名称、标签、固定金额等文本在大量凭证中重复出现，
+按 (字体, 文本) 缓存测量结果，每个进程中同一字体下的同一文本只测量一次
+"""
+
+from PIL import Image, ImageDraw
+
+from .cache import LRUCache
+
+# 仅用于测量的画布，textbbox不会修改画布内容
+_scratch_draw = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+def font_key(font):
+    """字体的缓存键：TrueType字体由文件、字号和字体索引确定，位图字体按类型区分"""
+    path = getattr(font, 'path', None)
+    if isinstance(path, (str, bytes)):
+        return (path, font.size, getattr(font, 'index', 0))
+    return (type(font).__name__, getattr(font, 'size', None))
+
+
+class TextMeasurer:
+    """带LRU缓存的文本宽度测量"""
+
+    def __init__(self, maxsize=4096):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    @staticmethod
+    def _measure(font, text):
+        bbox = _scratch_draw.textbbox((0, 0), text, font=font)
+        return bbox[2] - bbox[0]
+
+    def measure(self, font, text):
+        """测量单个文本的像素宽度"""
+        return self.measure_many([(font, text)])[0]
+
+    def measure_many(self, items):
+        """
+        批量测量 [(字体, 文本)]，返回与输入顺序一致的宽度列表
+
+        一次加锁取出所有已缓存的结果，批内重复的文本只测量一次
+        """
+        keys = [(font_key(font), text) for font, text in items]
+        widths = self._cache.get_many(set(keys))
+        measured = {}
+        for key, (font, text) in zip(keys, items):
+            if key not in widths and key not in measured:
+                measured[key] = self._measure(font, text)
+        if measured:
+            self._cache.set_many(measured)
+            widths.update(measured)
+        return [widths[key] for key in keys]
+
+    @property
+    def stats(self):
+        """缓存统计：条目数、命中次数、未命中次数"""
+        return {'size': len(self._cache), 'hits': self._cache.hits, 'misses': self._cache.misses}
+
+    def clear(self):
+        self._cache.clear()
+
+
+# 进程内共享的测量缓存
+text_measurer = TextMeasurer()
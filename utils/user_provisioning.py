@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量用户创建模块
+一次IN查询检查已存在的用户名，线程池并行计算密码哈希，分批插入数据库
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+# 未提供密码时使用的默认密码
+DEFAULT_PASSWORD = '123456'
+
+# IN查询每批包含的用户名数量，避免超出数据库参数个数限制
+LOOKUP_CHUNK_SIZE = 900
+
+
+def find_existing_usernames(model, usernames):
+    """返回已存在于数据库中的用户名集合"""
+    existing = set()
+    usernames = list(usernames)
+    for i in range(0, len(usernames), LOOKUP_CHUNK_SIZE):
+        chunk = usernames[i:i + LOOKUP_CHUNK_SIZE]
+        rows = model.query.with_entities(model.username).filter(model.username.in_(chunk)).all()
+        existing.update(row.username for row in rows)
+    return existing
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    并行计算密码哈希
+
+    pbkdf2计算时会释放GIL，线程池即可利用多核
+    """
+    passwords = list(passwords)
+    if len(passwords) <= 1:
+        return [generate_password_hash(p) for p in passwords]
+
+    workers = workers or min(len(passwords), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(generate_password_hash, passwords))
+
+
+def provision_users(db, model, entries, role='user', created_by=None, batch_size=200, workers=None):
+    """
+    批量创建用户
+
+    entries: (username, password) 列表，password为空时使用默认密码
+    返回 (created_users, errors)，created_users 为 {'username', 'password'} 字典列表
+    """
+    errors = []
+    pending = []
+    seen = set()
+    for username, password in entries:
+        username = (username or '').strip()
+        if not username:
+            continue
+        if username in seen:
+            errors.append(f'用户名 {username} 重复')
+            continue
+        seen.add(username)
+        pending.append((username, (password or '').strip() or DEFAULT_PASSWORD))
+
+    # 一次查询找出所有已存在的用户名
+    existing = find_existing_usernames(model, [username for username, _ in pending])
+    for username, _ in pending:
+        if username in existing:
+            errors.append(f'用户名 {username} 已存在')
+    pending = [(username, password) for username, password in pending if username not in existing]
+
+    if not pending:
+        return [], errors
+
+    password_hashes = hash_passwords([password for _, password in pending], workers=workers)
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            'username': username,
+            'password_hash': password_hash,
+            'role': role,
+            'is_enabled': True,
+            'created_at': now,
+            'created_by': created_by
+        }
+        for (username, _), password_hash in zip(pending, password_hashes)
+    ]
+
+    try:
+        for i in range(0, len(rows), batch_size):
+            db.session.execute(model.__table__.insert(), rows[i:i + batch_size])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    created_users = [{'username': username, 'password': password} for username, password in pending]
+    return created_users, errors